@@ -1,7 +1,5 @@
 import streamlit as st
-import requests
 import json
-import pandas as pd
 from pathlib import Path
 import tempfile
 import os
@@ -11,11 +9,10 @@ import sys
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
-# Import your pipeline functions
-from src.ingestion.load_data2 import load_excel_to_dfs, save_processed
-from src.preprocessing.clean_transform import process_sheet
-from src.llm.prompt_template2 import build_summary_prompt
-from src.llm.generate_insights import call_llm
+from src.utils.settings import get_settings
+
+# Pipeline functions (pandas, the LLM stack) are imported inside process_uploaded_file,
+# so the upload screen renders without loading them.
 
 # Page config
 st.set_page_config(
@@ -87,12 +84,19 @@ def process_uploaded_file(uploaded_file):
     """
     Process the uploaded Excel file through the complete pipeline
     
+    Identical uploads being analyzed at the same time (other sessions, double clicks)
+    share one pipeline + LLM run.
+    
     Args:
         uploaded_file: Streamlit uploaded file object
         
     Returns:
         dict: Analysis results or error
     """
+    from workflow.pipeline2_fixed import analyze_workbook
+    from src.llm.admission import QueueFull
+    from src.llm.health import CircuitOpen
+
     try:
         # Create temporary directory for processing
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -105,90 +109,47 @@ def process_uploaded_file(uploaded_file):
             
             st.info("📥 File uploaded successfully")
             
-            # Step 1: Load Excel sheets
-            with st.spinner("📊 Loading Excel sheets..."):
-                sheets = load_excel_to_dfs(input_path)
-                st.success(f"✅ Loaded {len(sheets)} sheets: {', '.join(sheets.keys())}")
-            
-            # Step 2: Save to processed directory
-            processed_dir = temp_dir / "processed"
-            processed_dir.mkdir(exist_ok=True)
-            
-            with st.spinner("💾 Processing sheets..."):
-                save_processed(sheets=sheets, output_dir=processed_dir)
-            
-            # Step 3: Clean and transform data
-            all_dfs = {}
-            output_dir = temp_dir / "output"
-            output_dir.mkdir(exist_ok=True)
-            
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            for idx, sheet_name in enumerate(sheets.keys()):
-                status_text.text(f"🔄 Cleaning {sheet_name}...")
-                
-                input_csv = processed_dir / f"{sheet_name.replace(' ', '_')}.csv"
-                output_csv = output_dir / f"cleaned_{sheet_name.replace(' ', '_')}.csv"
-                
-                # Clean the data
-                process_sheet(csv_path=input_csv, out_path=output_csv)
-                
-                # Load cleaned data (limit rows for performance)
-                df = pd.read_csv(output_csv).head(100)
-                all_dfs[sheet_name] = df
-                
-                progress_bar.progress((idx + 1) / len(sheets))
-            
-            status_text.text("✅ Data cleaning complete")
-            progress_bar.empty()
-            
-            # Step 4: Combine all sheets
-            with st.spinner("🔗 Combining data from all sheets..."):
-                combined_context = build_combined_context(all_dfs)
-                st.success(f"✅ Combined {len(all_dfs)} sheets ({len(combined_context)} characters)")
-            
-            # Step 5: Build prompt
-            with st.spinner("📝 Building analysis prompt..."):
-                final_prompt = build_summary_prompt(combined_context)
+            # Steps 1-6: load, clean, build the prompt and generate AI insights
+            with st.spinner("🤖 Processing sheets and generating AI insights (this may take 1-2 minutes)..."):
+                result = analyze_workbook(input_path)
             
-            # Step 6: Generate AI insights
-            with st.spinner("🤖 Generating AI insights (this may take 1-2 minutes)..."):
-                try:
-                    llm_response = call_llm(prompt=final_prompt, model='llama3.1:8b')
-                    
-                    # Try to parse as JSON
-                    try:
-                        analysis = json.loads(llm_response)
-                    except json.JSONDecodeError:
-                        analysis = {"raw_response": llm_response}
-                    
-                    st.success("✅ Analysis complete!")
-                    return analysis, None
-                    
-                except Exception as llm_error:
-                    return None, f"LLM Error: {str(llm_error)}"
+            st.success(f"✅ Analyzed {len(result['sheets'])} sheets: {', '.join(result['sheets'])}")
+            if result['shared']:
+                st.info("♻️ The same workbook was already being analyzed, reused that result")
+            st.success("✅ Analysis complete!")
+            return result['analysis'], None
     
+    except QueueFull as e:
+        return None, f"The analysis queue is busy, please try again in a minute ({e})"
+    except CircuitOpen as e:
+        return None, f"Ollama is not reachable: {e}. Start it with: ollama serve"
     except Exception as e:
-        return None, f"Processing Error: {str(e)}"
+        return None, f"Processing Error: {type(e).__name__}: {str(e)}"
 
 
-def build_combined_context(dataframes_dict):
-    """Combine all DataFrames into a single context string"""
-    all_context = []
-    
-    for sheet_name, df in dataframes_dict.items():
-        all_context.append("=" * 60)
-        all_context.append(f"Sheet: {sheet_name}")
-        all_context.append("=" * 60)
-        all_context.append(f"Rows: {len(df)}, Columns: {list(df.columns)}")
-        all_context.append("")
-        
-        csv_data = df.to_csv(index=False)
-        all_context.append(csv_data)
-        all_context.append("")
-    
-    return '\n'.join(all_context)
+@st.cache_resource(max_entries=4, show_spinner="📈 Loading sheets for the charts...")
+def load_chart_frames(data_key: str, _data: bytes) -> dict:
+    """Cleaned sheets of an uploaded workbook, kept per workbook hash across reruns"""
+    from src.ingestion.load_data2 import load_excel_to_dfs
+    from src.preprocessing.clean_transform import basic_cleaning
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_path = Path(temp_dir) / "input.xlsx"
+        input_path.write_bytes(_data)
+        sheets = load_excel_to_dfs(input_path)
+    # parse-cache frames are read-only
+    return {name: basic_cleaning(df.copy()) for name, df in sheets.items()}
+
+
+def display_metric_charts(uploaded_file):
+    """Time-series charts of every sheet, downsampled to the chart width before they reach the browser"""
+    from src.utils.charts import frame_charts
+    from src.utils.hashing import bytes_hash
+
+    st.markdown('<div class="section-header">📈 Metrics Over Time</div>', unsafe_allow_html=True)
+    data = uploaded_file.getvalue()
+    data_key = bytes_hash(data)
+    frame_charts(load_chart_frames(data_key, data), data_key, key='simple')
 
 
 def display_analysis(analysis):
@@ -274,15 +235,16 @@ def main():
     
     # Check Ollama status
     with st.expander("⚙️ System Status"):
-        try:
-            import httpx
-            response = httpx.get("http://localhost:11434/api/tags", timeout=3)
-            if response.status_code == 200:
-                st.markdown('<div class="success-msg">✅ Ollama is running</div>', unsafe_allow_html=True)
+        from src.llm.backends import get_backend_pool
+        for status in get_backend_pool().status()['backends']:
+            where = status['base_url']
+            if status['circuit']['state'] == 'open':
+                st.markdown(f'<div class="error-msg">❌ Ollama at {where} failed repeatedly, retrying in {status["circuit"]["retry_in"]:.0f}s. Start it with: <code>ollama serve</code></div>', unsafe_allow_html=True)
+            elif status['healthy']:
+                st.markdown(f'<div class="success-msg">✅ Ollama is running at {where}</div>', unsafe_allow_html=True)
+                st.caption(f"Loaded models: {', '.join(status['loaded']) or 'none'}, {status['outstanding']} request(s) in flight (checked {status['age']:.0f}s ago)")
             else:
-                st.markdown('<div class="error-msg">❌ Ollama is not responding</div>', unsafe_allow_html=True)
-        except:
-            st.markdown('<div class="error-msg">❌ Ollama is not running. Start it with: <code>ollama serve</code></div>', unsafe_allow_html=True)
+                st.markdown(f'<div class="error-msg">❌ Ollama is not running at {where}. Start it with: <code>ollama serve</code></div>', unsafe_allow_html=True)
     
     st.markdown("---")
     
@@ -313,11 +275,11 @@ def main():
                 
                 # Show helpful tips
                 if "Ollama" in error or "timeout" in error.lower():
-                    st.markdown("""
+                    st.markdown(f"""
                     ### 💡 Troubleshooting Tips:
                     1. Make sure Ollama is running: `ollama serve`
                     2. Verify the model is available: `ollama list`
-                    3. Pull the model if needed: `ollama pull llama3.1:8b`
+                    3. Pull the model if needed: `ollama pull {get_settings().llm.model}`
                     4. Try with a smaller file or fewer rows
                     """)
             else:
@@ -325,6 +287,10 @@ def main():
                 st.session_state['analysis_result'] = analysis
                 st.markdown('<div class="success-msg">✅ Analysis completed successfully!</div>', unsafe_allow_html=True)
     
+    if uploaded_file is not None:
+        with st.expander("📈 Metrics Over Time", expanded=False):
+            display_metric_charts(uploaded_file)
+    
     # Display results if available
     if 'analysis_result' in st.session_state:
         st.markdown("---")
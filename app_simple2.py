@@ -2,17 +2,19 @@ import streamlit as st
 import tempfile
 import os
 from pathlib import Path
-import pandas as pd
 import json
-
-from src.ingestion.load_data2 import load_excel_to_dfs, save_processed
-from src.preprocessing.clean_transform import process_sheet
-from workflow.pipeline2 import build_combined_df, build_summary_prompt
-from src.llm.generate_insights import call_llm
+from src.utils.hashing import bytes_hash
 
 st.markdown('app')
 
 def processing_uploaded_file(uploaded_file):
+    # heavy imports deferred until the user actually asks for insights
+    import pandas as pd
+    from src.ingestion.load_data2 import load_excel_to_dfs, save_processed
+    from src.preprocessing.clean_transform import process_sheet
+    from workflow.pipeline2 import build_combined_df, build_summary_prompt
+    from src.llm.generate_insights import call_llm
+
     try:
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_dir = Path(temp_dir)
@@ -34,7 +36,7 @@ def processing_uploaded_file(uploaded_file):
             processed_dir.mkdir(exist_ok=True)
             st.write(processed_dir)
             with st.spinner('Processing sheets'):
-                save_processed(sheets=sheets, output_dir=processed_dir)
+                processed_paths = save_processed(sheets=sheets, output_dir=processed_dir)
             st.info("sheets are saved")
             # checking all files inside of processed_dir to see if it is correct or not
             # process_files = list(processed_dir.iterdir())
@@ -47,12 +49,14 @@ def processing_uploaded_file(uploaded_file):
             output_dir.mkdir(exist_ok=True)
 
             for sheet_name in sheets:
-                input_csv = processed_dir / f"{sheet_name.replace(' ','_')}.csv"
+                input_csv = processed_paths[sheet_name]  # .csv, .csv.zst or .parquet per artifact_format
                 output_csv = output_dir / f"processed_{sheet_name.replace(' ','_')}.csv"
                 process_sheet(csv_path=input_csv, out_path=output_csv)
                 df = pd.read_csv(output_csv)
                 all_dfs[sheet_name] = df
-            st.write(all_dfs)
+            # charted in main() from the session, so zooming (a rerun) doesn't need the button again;
+            # st.write(all_dfs) sent every row to the browser
+            st.session_state['all_dfs'] = all_dfs
             st.info('dataframe is created successfully')
 
             # now passing this dataframe to build combined context and then making a prompt
@@ -86,9 +90,15 @@ def main():
         st.write('file is uploaded successfully')
         
         if st.button('Generate insights'):
+            st.session_state['data_key'] = bytes_hash(uploaded_files.getvalue())
             output_files = processing_uploaded_file(uploaded_file=uploaded_files)
             st.write('main function run successfully')
 
+    if 'all_dfs' in st.session_state:
+        from src.utils.charts import frame_charts
+        st.markdown('### metrics')
+        frame_charts(st.session_state['all_dfs'], st.session_state['data_key'], key='app2')
+
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
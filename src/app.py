@@ -1,19 +1,61 @@
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, UploadFile, File
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from pydantic import BaseModel
 import json
-import uvicorn
+import shutil
+import tempfile
+import threading
 from src.utils.logger import get_logger
+from src.utils.settings import get_settings, reload_settings, resolve_path
+from src.llm.model_manager import get_model_manager
+from src.llm.health import CircuitOpen
+from src.llm.backends import get_backend_pool
+from src.utils.hashing import text_hash
+from src.preprocessing.rollups import CUBE_FILE, GRANULARITIES, list_metrics, query_rollups, sheet_key
 
 logger = get_logger('api endpoints')
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # warm the model in the background so the first /summary request doesn't pay the load time
+    manager = get_model_manager()
+    manager.start(models=[get_settings().llm.model])
+    pool = get_backend_pool()
+    worker = None
+    if get_settings().jobs.backend == 'memory':
+        # the in-memory queue only exists in this process, so it needs a worker here
+        from workflow.worker import Worker
+        worker = Worker(name='api-worker')
+        threading.Thread(target=worker.run, name='job-worker', daemon=True).start()
+    yield
+    if worker is not None:
+        worker.stop()
+    manager.stop()
+    for backend in pool.backends:
+        backend.monitor.stop()
+
+
 app = FastAPI(
     title="Financial Summary app",
     description="It will provide financial data summary",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
+# gzip for clients sending Accept-Encoding: gzip; streamed responses are compressed chunk by chunk
+app.add_middleware(GZipMiddleware, minimum_size=get_settings().api.gzip_min_bytes)
+
+# a page is spooled in memory up to this size, then on disk
+DATA_SPOOL_BYTES = 16 << 20
+
+
+def outputs_dir() -> Path:
+    # read on every request so a settings reload moves the API without a restart
+    return resolve_path(get_settings().paths.outputs_dir)
 
-OUTPUTS = Path('data/outputs')
 
 @app.get('/')
 async def root():
@@ -24,30 +66,279 @@ async def root():
     }
 
 @app.get('/health')
-async def health_check():
+def health_check():
     return {"STATUS":"healthy",
-            "output":str(OUTPUTS.exists())
+            "output":str(outputs_dir().exists()),
+            "ollama": get_backend_pool().status()
             }
 
 
+@app.get('/models')
+def models_endpoint():
+    """warm-pool status: pinned models, idle time and what Ollama currently has loaded"""
+    manager = get_model_manager()
+    status = manager.status()
+    # from the health monitors' last polls instead of a request to Ollama per call
+    status["loaded"] = {b['base_url']: b['loaded'] for b in get_backend_pool().status()['backends']}
+    return status
+
+
+@app.get('/llm/queue')
+def llm_queue_endpoint():
+    """LLM admission queue: slots in use, waiting calls and queue wait vs inference time per priority class"""
+    from src.llm.admission import get_admission
+    return get_admission().status()
+
+
+@app.get('/settings')
+async def settings_endpoint():
+    """current runtime settings (configs/setting.yaml + FIN_* environment overrides)"""
+    return get_settings().to_dict()
+
+
+@app.post('/settings/reload')
+def reload_settings_endpoint():
+    """re-read configs/setting.yaml and the environment; components pick the new values up through reload hooks"""
+    settings = reload_settings()
+    return {"STATUS": "reloaded", "settings": settings.to_dict()}
+
+
 @app.get('/summary')
 async def summary_endpoint():
     """if llm_output.json file has something inside of it then this function will return the same if not then it will run pipeline2 first and return the output from that file"""
-    llm_file_output = OUTPUTS / "llm_output.json"
+    llm_file_output = outputs_dir() / "llm_output.json"
     if llm_file_output.exists():
         try:
             with open(llm_file_output, 'r') as file:
                 data = json.load(file)
                 return JSONResponse(content=data)
         except Exception as e:
-            logger.info('Error is : {e}')
+            logger.error('Error is : %s', e)
             # raise FileNotFoundError()
             raise HTTPException(status_code=500, detail=f"Error is {e}")
     else:
         raise HTTPException(status_code=404, detail=f'No summaries found')
     
 
+@app.get('/kpis')
+def kpis_endpoint(sheet: str = None, metric: str = None, granularity: str = 'month',
+                  start: str = Query(None, alias='from'), end: str = Query(None, alias='to')):
+    """rollups from the precomputed kpi_cube.sqlite; without sheet/metric it lists what the cube holds"""
+    cube = outputs_dir() / CUBE_FILE
+    if not cube.exists():
+        raise HTTPException(status_code=404, detail='No KPI cube found, run the pipeline first')
+    if not sheet or not metric:
+        return {"granularities": list(GRANULARITIES), "metrics": list_metrics(cube)}
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=422, detail=f'granularity must be one of {list(GRANULARITIES)}')
+    rows = query_rollups(cube, sheet, metric, granularity, start, end)
+    # no rows can also mean an empty date range; only an unknown sheet/metric pair is a 404
+    if not rows and not any(m['sheet'] == sheet_key(sheet) and m['metric'] == metric for m in list_metrics(cube)):
+        raise HTTPException(status_code=404, detail=f'No metric {metric!r} for sheet {sheet!r}')
+    return {"sheet": sheet, "metric": metric, "granularity": granularity, "rows": rows}
+
+
+@app.get('/data')
+def data_sheets():
+    """processed sheets GET /data/{sheet} serves, with their columns and date column"""
+    from src.ingestion.data_stream import describe_sheets
+    return describe_sheets(resolve_path(get_settings().paths.processed_dir))
+
+
+@app.get('/data/{sheet}')
+def data_endpoint(request: Request, sheet: str, format: str = 'ndjson', columns: str = None,
+                  start: str = Query(None, alias='from'), end: str = Query(None, alias='to'),
+                  date_column: str = None, limit: int = None, cursor: str = None):
+    """
+    one page of a processed sheet as Arrow IPC stream, NDJSON or CSV
+
+    columns is comma-separated; from/to filter on the date column. The page is written to a
+    spooled temp file first, so X-Next-Cursor (and a Link rel="next") can be sent as headers.
+    Pass that cursor to get the next page; there is none on the last page.
+    """
+    from src.ingestion.data_stream import FORMATS, CursorError, find_sheet, write_page
+
+    api_settings = get_settings().api
+    limit = limit or api_settings.data_page_rows
+    if not 1 <= limit <= api_settings.data_max_page_rows:
+        raise HTTPException(status_code=422, detail=f'limit must be between 1 and {api_settings.data_max_page_rows}')
+    if format not in FORMATS:
+        raise HTTPException(status_code=422, detail=f'format must be one of {list(FORMATS)}')
+    path = find_sheet(resolve_path(get_settings().paths.processed_dir), sheet)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f'No processed sheet {sheet!r}, run the pipeline first')
+    spool = tempfile.SpooledTemporaryFile(max_size=DATA_SPOOL_BYTES)
+    try:
+        page = write_page(path, spool, fmt=format, columns=[c.strip() for c in columns.split(',')] if columns else None,
+                          start=start, end=end, limit=limit, cursor=cursor, date_column=date_column)
+    except CursorError as e:
+        spool.close()
+        raise HTTPException(status_code=400, detail=str(e))
+    except (KeyError, ValueError) as e:
+        spool.close()
+        raise HTTPException(status_code=422, detail=str(e).strip('"'))
+    except BaseException:
+        spool.close()
+        raise
+    size = spool.tell()
+    spool.seek(0)
+
+    def body():
+        try:
+            while chunk := spool.read(1 << 20):
+                yield chunk
+        finally:
+            spool.close()
+
+    headers = {"X-Row-Count": str(page['rows']), "Content-Length": str(size)}
+    if page['next_cursor']:
+        headers["X-Next-Cursor"] = page['next_cursor']
+        headers["Link"] = f'<{request.url.include_query_params(cursor=page["next_cursor"])}>; rel="next"'
+    return StreamingResponse(body(), media_type=FORMATS[format], headers=headers)
+
+
+@app.get('/series/{sheet}')
+def series_endpoint(sheet: str, metrics: str = None, start: str = Query(None, alias='from'),
+                    end: str = Query(None, alias='to'), width: int = 1200, method: str = 'lttb'):
+    """
+    chart-ready points of a processed sheet: at most width points per metric (LTTB or min/max buckets)
+
+    Without metrics it describes the sheet (date range, rows, metric names). Loaded sheets
+    and downsampled windows are cached until the file changes.
+    """
+    from src.ingestion.data_stream import find_sheet
+    from src.preprocessing.downsample import METHODS, get_series_cache
+
+    if method not in METHODS:
+        raise HTTPException(status_code=422, detail=f'method must be one of {list(METHODS)}')
+    if not 3 <= width <= 10_000:
+        raise HTTPException(status_code=422, detail='width must be between 3 and 10000')
+    path = find_sheet(resolve_path(get_settings().paths.processed_dir), sheet)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f'No processed sheet {sheet!r}, run the pipeline first')
+    cache = get_series_cache()
+    try:
+        if not metrics:
+            return {"sheet": sheet, **cache.series(path).describe()}
+        points, rows = cache.points(path, tuple(m.strip() for m in metrics.split(',')), start, end, width, method)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=str(e).strip('"'))
+    return {"sheet": sheet, "method": method, "rows": rows,
+            "points": json.loads(points.to_json(orient='records', date_format='iso', date_unit='s'))}
+
+
+@app.post('/analyze')
+def analyze_endpoint(file: UploadFile = File(...), digest_sheets: bool = False, latency_budget: float = None):
+    """analyze an uploaded workbook; identical uploads in flight at the same time share one pipeline + LLM run"""
+    from workflow.pipeline2_fixed import analyze_workbook
+    from src.llm.admission import QueueFull
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        workbook = Path(temp_dir) / 'input.xlsx'
+        with open(workbook, 'wb') as out:
+            shutil.copyfileobj(file.file, out)
+        try:
+            return analyze_workbook(workbook, digest_sheets=digest_sheets, latency_budget=latency_budget)
+        except (QueueFull, CircuitOpen) as e:
+            headers = {"Retry-After": str(int(e.retry_after))} if e.retry_after else None
+            raise HTTPException(status_code=503, detail=str(e), headers=headers)
+        except Exception as e:
+            logger.exception('analysis of %s failed', file.filename)
+            raise HTTPException(status_code=500, detail=f"{type(e).__name__}: {e}")
+
+
+@app.post('/jobs')
+def enqueue_job(file: UploadFile = File(...), digest_sheets: bool = False, latency_budget: float = None):
+    """queue an analysis for the workers (python -m workflow.worker); poll GET /jobs/{job_id} for the result"""
+    import uuid
+    from workflow.job_queue import get_job_queue
+    from workflow.worker import job_dir
+
+    job_id = uuid.uuid4().hex
+    workbook = job_dir(job_id) / 'input.xlsx'
+    workbook.parent.mkdir(parents=True, exist_ok=True)
+    with open(workbook, 'wb') as out:
+        shutil.copyfileobj(file.file, out)
+    get_job_queue().enqueue('analyze', {"workbook": str(workbook), "filename": file.filename,
+                                        "digest_sheets": digest_sheets, "latency_budget": latency_budget},
+                            job_id=job_id)
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get('/jobs')
+def jobs_overview():
+    """number of jobs per status"""
+    from workflow.job_queue import get_job_queue
+    return get_job_queue().counts()
+
+
+@app.get('/jobs/{job_id}')
+def job_status(job_id: str):
+    from workflow.job_queue import get_job_queue
+
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f'No job {job_id}')
+    return job.to_dict()
+
+
+class BatchRequest(BaseModel):
+    source: str                      # directory or glob of workbooks
+    resume: bool = True
+    latency_budget: float = None
+
+
+# run_id -> {"status": ..., "output": ..., "result": ...}
+_batch_runs = {}
+_batch_lock = threading.Lock()
+
+
+@app.post('/batch')
+def start_batch(request: BatchRequest):
+    """start a batch run in the background; the same source always maps to the same run_id/output dir, so re-posting resumes it"""
+    from workflow.batch import run_batch
+
+    run_id = text_hash(request.source)[:12]
+    output = outputs_dir() / 'batch' / run_id
+    with _batch_lock:
+        if _batch_runs.get(run_id, {}).get('status') == 'running':
+            return {"run_id": run_id, **_batch_runs[run_id]}
+        _batch_runs[run_id] = {"status": "running", "source": request.source, "output": str(output), "result": None}
+
+    def _run():
+        try:
+            result = run_batch(request.source, output, resume=request.resume, latency_budget=request.latency_budget)
+            state = {"status": "finished", "result": result}
+        except Exception as e:
+            logger.exception('batch %s failed', run_id)
+            state = {"status": "failed", "result": {"error": str(e)}}
+        with _batch_lock:
+            _batch_runs[run_id].update(state)
+
+    threading.Thread(target=_run, name=f'batch-{run_id}', daemon=True).start()
+    return {"run_id": run_id, **_batch_runs[run_id]}
+
+
+@app.get('/batch/{run_id}')
+def batch_status(run_id: str):
+    """progress of a batch run, counted from its checkpoint file"""
+    from workflow.batch import load_checkpoint
+
+    output = outputs_dir() / 'batch' / run_id
+    if run_id not in _batch_runs and not output.exists():
+        raise HTTPException(status_code=404, detail=f'No batch run {run_id}')
+    completed = load_checkpoint(output)
+    statuses = [r.get('status') for r in completed.values()]
+    return {
+        "run_id": run_id,
+        **_batch_runs.get(run_id, {"status": "unknown", "output": str(output), "result": None}),
+        "succeeded": statuses.count('success'),
+        "failed": statuses.count('failed'),
+    }
+
+
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(
         "src.app:app",
         host='0.0.0.0',
@@ -0,0 +1,196 @@
+import json
+import os
+import threading
+from collections.abc import Sequence
+from pathlib import Path
+import pandas as pd
+from src.utils.logger import get_logger
+from src.utils.settings import get_settings, resolve_path
+from src.utils.hashing import file_hash, text_hash
+
+logger = get_logger('catalog')
+
+INDEX_VERSION = 1
+DATA_SUFFIXES = ('.xlsx', '.csv')
+
+
+def _sheet_key(file_name: str, sheet: str) -> str:
+    return f'{file_name}::{sheet}'
+
+
+def _date_ranges(df: pd.DataFrame) -> dict:
+    """min/max of every datetime column (and of 'date'-named columns that parse as dates)"""
+    ranges = {}
+    for col in df.columns:
+        series = df[col]
+        if not pd.api.types.is_datetime64_any_dtype(series):
+            if 'date' not in str(col).lower():
+                continue
+            series = pd.to_datetime(series, errors='coerce')
+        series = series.dropna()
+        if not series.empty:
+            ranges[str(col)] = [series.min().isoformat(), series.max().isoformat()]
+    return ranges
+
+
+def _describe(df: pd.DataFrame) -> dict:
+    return {
+        "rows": int(len(df)),
+        "columns": [str(c) for c in df.columns],
+        "dtypes": {str(c): str(t) for c, t in df.dtypes.items()},
+        "date_ranges": _date_ranges(df),
+    }
+
+
+class DatasetCatalog:
+    """
+    Index of every sheet in a data directory, built once and persisted
+
+    scan() only parses files whose mtime/size (and then content hash) changed since
+    the last scan; load() reads a single sheet on demand.
+    """
+
+    def __init__(self, root: Path = None, index_path: Path = None):
+        self.root = Path(root) if root is not None else Path(__file__).resolve().parents[2] / 'data' / 'raw'
+        # one index per data directory
+        self.index_path = Path(index_path) if index_path is not None else \
+            resolve_path(get_settings().cache.dir) / f'catalog_{text_hash(self.root.resolve())[:8]}.json'
+        self._files = {}    # file name -> {"mtime", "size", "hash", "sheets": [sheet keys]}
+        self._sheets = {}   # sheet key -> metadata
+        self._lock = threading.Lock()
+        self._read_index()
+
+    def _read_index(self):
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f'ignoring unreadable catalog index {self.index_path}: {e}')
+            return
+        if index.get('version') != INDEX_VERSION or index.get('root') != str(self.root.resolve()):
+            return
+        self._files = index.get('files', {})
+        self._sheets = index.get('sheets', {})
+
+    def _write_index(self):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({"version": INDEX_VERSION, "root": str(self.root.resolve()),
+                       "files": self._files, "sheets": self._sheets}, file, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _index_file(self, path: Path, stat, digest: str):
+        """Parse one file once and record metadata for each of its sheets"""
+        logger.info(f'indexing {path.name}')
+        sheets = {}
+        if path.suffix == '.xlsx':
+            xls = pd.ExcelFile(path)
+            for sheet in xls.sheet_names:
+                sheets[sheet] = _describe(xls.parse(sheet))
+        else:
+            sheets[path.stem] = _describe(pd.read_csv(path))
+
+        keys = []
+        for sheet, meta in sheets.items():
+            key = _sheet_key(path.name, sheet)
+            self._sheets[key] = {"file": path.name, "sheet": sheet, "hash": digest,
+                                 "mtime": stat.st_mtime, **meta}
+            keys.append(key)
+        self._files[path.name] = {"mtime": stat.st_mtime, "size": stat.st_size, "hash": digest, "sheets": keys}
+
+    def scan(self) -> 'DatasetCatalog':
+        """Bring the index up to date with the directory and persist it"""
+        with self._lock:
+            changed = False
+            present = set()
+            for path in sorted(self.root.iterdir()):
+                if path.suffix not in DATA_SUFFIXES or path.name.startswith('~$'):
+                    continue
+                present.add(path.name)
+                stat = path.stat()
+                known = self._files.get(path.name)
+                if known and known['mtime'] == stat.st_mtime and known['size'] == stat.st_size:
+                    continue
+                digest = file_hash(path)
+                if known and known['hash'] == digest:
+                    # touched but identical, no need to parse again
+                    known['mtime'] = stat.st_mtime
+                    changed = True
+                    continue
+                if known:
+                    for key in known['sheets']:
+                        self._sheets.pop(key, None)
+                self._index_file(path, stat, digest)
+                changed = True
+
+            for name in set(self._files) - present:
+                for key in self._files.pop(name)['sheets']:
+                    self._sheets.pop(key, None)
+                changed = True
+            if changed:
+                self._write_index()
+        return self
+
+    def names(self) -> list:
+        """Sheet keys ("<file>::<sheet>") in file order, then workbook sheet order"""
+        return [key for name in sorted(self._files) for key in self._files[name]['sheets']]
+
+    def get(self, name: str) -> dict:
+        """Metadata for a sheet key, or for a bare sheet name if it is unique"""
+        if name in self._sheets:
+            return self._sheets[name]
+        matches = [meta for meta in self._sheets.values() if meta['sheet'] == name]
+        if len(matches) == 1:
+            return matches[0]
+        if not matches:
+            raise KeyError(f'no sheet named {name!r} in catalog')
+        raise KeyError(f'sheet name {name!r} is ambiguous, use one of {[_sheet_key(m["file"], m["sheet"]) for m in matches]}')
+
+    def load(self, name: str, columns: list = None) -> pd.DataFrame:
+        """Read just one sheet (optionally just some columns)"""
+        meta = self.get(name)
+        path = self.root / meta['file']
+        logger.info(f"loading {meta['file']}::{meta['sheet']} ({meta['rows']} rows)")
+        if path.suffix == '.xlsx':
+            return pd.read_excel(path, sheet_name=meta['sheet'], usecols=columns)
+        return pd.read_csv(path, usecols=columns)
+
+
+class LazySheetList(Sequence):
+    """List-like view of a catalog; a sheet is only parsed when it is indexed"""
+
+    def __init__(self, catalog: DatasetCatalog):
+        self.catalog = catalog
+        self._names = catalog.names()
+        self._loaded = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        name = self._names[index]
+        if name not in self._loaded:
+            self._loaded[name] = self.catalog.load(name)
+        return self._loaded[name]
+
+    def names(self) -> list:
+        return list(self._names)
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(root: Path = None) -> DatasetCatalog:
+    """Scanned catalog for a data directory, shared per process"""
+    catalog_root = Path(root) if root is not None else Path(__file__).resolve().parents[2] / 'data' / 'raw'
+    with _catalogs_lock:
+        catalog = _catalogs.get(catalog_root)
+        if catalog is None:
+            catalog = _catalogs[catalog_root] = DatasetCatalog(catalog_root)
+    return catalog.scan()
@@ -0,0 +1,358 @@
+"""
+Paged, column-projected reads of processed sheets for GET /data/{sheet}
+
+A page is read chunk by chunk, so memory stays bounded by the chunk size, not the page
+or file size:
+- csv: the file is cut into CHUNK_BYTES pieces at row boundaries (newlines outside
+  quotes). Arrow parses each piece. A cursor holds the byte offset of the piece it
+  stopped in, so the next page seeks straight there.
+- parquet: whole row groups are skipped using the footer metadata. The rest is read in
+  record batches.
+- csv.zst: a compressed stream can't seek, so later pages re-read up to their first row.
+  They still stream, they are just slower the deeper they go.
+
+Cursors also carry the file's size and mtime. Once the sheet is rewritten, old cursors
+are rejected instead of silently pointing into different data.
+"""
+import base64
+import json
+import threading
+from pathlib import Path
+from src.utils.logger import get_logger
+from src.ingestion.load_data2 import list_processed, sheet_stem
+
+logger = get_logger('data stream')
+
+CHUNK_BYTES = 4 << 20
+FORMATS = {'arrow': 'application/vnd.apache.arrow.stream', 'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+_schemas = {}
+_schemas_lock = threading.Lock()
+
+
+class CursorError(ValueError):
+    """Malformed cursor, or one issued for an earlier version of the sheet"""
+
+
+def find_sheet(directory: Path, sheet: str):
+    """Processed file of a sheet ('P&L Statement' or 'P&L_Statement'); None if there is none"""
+    wanted = {sheet, sheet.replace(' ', '_')}
+    if not Path(directory).is_dir():
+        return None
+    for path in list_processed(directory):
+        if sheet_stem(path) in wanted:
+            return path
+    return None
+
+
+def _kind(path: Path) -> str:
+    name = path.name
+    return 'parquet' if name.endswith('.parquet') else 'csv.zst' if name.endswith('.csv.zst') else 'csv'
+
+
+def _fingerprint(path: Path) -> str:
+    stat = path.stat()
+    return f'{stat.st_size:x}.{stat.st_mtime_ns:x}'
+
+
+def encode_cursor(path: Path, offset: int, row: int) -> str:
+    raw = json.dumps({"f": _fingerprint(path), "o": offset, "r": row}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(path: Path, cursor: str) -> tuple:
+    """(byte offset, rows to skip after it) of a cursor; (0, 0) without one"""
+    if not cursor:
+        return 0, 0
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        fingerprint, offset, row = data['f'], int(data['o']), int(data['r'])
+    except (ValueError, KeyError, TypeError) as e:
+        raise CursorError('malformed cursor') from e
+    if fingerprint != _fingerprint(path):
+        raise CursorError('the sheet was rewritten since this cursor was issued, start again without a cursor')
+    return offset, row
+
+
+def _row_boundary(buffer: bytes):
+    """Position just after the last newline that is not inside a quoted value; None if there is none"""
+    end = buffer.rfind(b'\n')
+    if b'"' not in buffer:
+        return end + 1 if end >= 0 else None
+    # the buffer starts on a row boundary, so an even number of quotes before a newline means it ends a row
+    while end >= 0:
+        if buffer.count(b'"', 0, end) % 2 == 0:
+            return end + 1
+        end = buffer.rfind(b'\n', 0, end)
+    return None
+
+
+def _csv_chunks(path: Path, offset: int = 0):
+    """(file offset, header + rows) pieces of a CSV from offset (0 = first data row) on"""
+    with open(path, 'rb') as file:
+        header = file.readline()
+        position = max(offset, len(header))
+        file.seek(position)
+        carry = b''
+        while True:
+            data = file.read(CHUNK_BYTES)
+            buffer = carry + data
+            if not data:
+                if buffer.strip():
+                    yield position, header + buffer
+                return
+            cut = _row_boundary(buffer)
+            if cut is None:
+                # one row longer than a chunk: keep reading until it ends
+                carry = buffer
+                continue
+            yield position, header + buffer[:cut]
+            position += cut
+            carry = buffer[cut:]
+
+
+def _csv_options(schema=None, columns=None):
+    import pyarrow.csv as pacsv
+    read_options = pacsv.ReadOptions(block_size=CHUNK_BYTES + (1 << 20))
+    convert_options = pacsv.ConvertOptions(column_types=schema, include_columns=columns)
+    return read_options, convert_options
+
+
+def _open_zst(path: Path, schema=None, columns=None):
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    stream = pa.CompressedInputStream(pa.OSFile(str(path)), 'zstd')
+    read_options, convert_options = _csv_options(schema, columns)
+    return pacsv.open_csv(stream, read_options=read_options, convert_options=convert_options)
+
+
+def sheet_schema(path: Path):
+    """
+    Arrow schema every page of the sheet is served with
+
+    CSV types are inferred from the first chunk. A CSV can't tell 2 from 2.0, so integer
+    columns are widened to float64; a later chunk with decimals then still fits.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+
+    path = Path(path)
+    key = (str(path), _fingerprint(path))
+    with _schemas_lock:
+        if key in _schemas:
+            return _schemas[key]
+    kind = _kind(path)
+    if kind == 'parquet':
+        schema = pq.read_schema(path)
+    else:
+        if kind == 'csv':
+            first = next(_csv_chunks(path), None)
+            if first is None:
+                with open(path, 'rb') as file:
+                    first = (0, file.readline())
+            schema = pacsv.read_csv(pa.py_buffer(first[1]), read_options=_csv_options()[0]).schema
+        else:
+            schema = _open_zst(path).schema
+        schema = pa.schema([pa.field(f.name, pa.float64()) if pa.types.is_integer(f.type) else f for f in schema])
+    with _schemas_lock:
+        # keep only the latest version of each file
+        for stale in [k for k in _schemas if k[0] == key[0]]:
+            del _schemas[stale]
+        _schemas[key] = schema
+    return schema
+
+
+def find_date_field(schema):
+    """First date/timestamp column, else the first column with 'date' in its name (like find_date_column)"""
+    import pyarrow as pa
+    for f in schema:
+        if pa.types.is_timestamp(f.type) or pa.types.is_date(f.type):
+            return f.name
+    for f in schema:
+        if 'date' in f.name.lower():
+            return f.name
+    return None
+
+
+def _scan(path: Path, schema, columns: list, offset: int, row: int):
+    """
+    Raw rows of a sheet from a cursor position, as Arrow tables
+
+    Yields:
+        (table, offset, row): row is the position of the table's first row counted from offset,
+            i.e. what encode_cursor needs to resume at that row
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+    from src.utils.settings import get_settings
+
+    kind = _kind(path)
+    types = {name: schema.field(name).type for name in columns}
+    if kind == 'csv':
+        skip = row
+        for position, chunk in _csv_chunks(path, offset):
+            read_options, convert_options = _csv_options(types, columns)
+            table = pacsv.read_csv(pa.py_buffer(chunk), read_options=read_options, convert_options=convert_options)
+            if skip >= table.num_rows:
+                # the cursor was issued at the end of this chunk
+                skip -= table.num_rows
+                continue
+            yield table.slice(skip), position, skip
+            skip = 0
+    elif kind == 'parquet':
+        parquet = pq.ParquetFile(path)
+        groups, start = [], None
+        first_row = 0
+        for i in range(parquet.metadata.num_row_groups):
+            rows = parquet.metadata.row_group(i).num_rows
+            if first_row + rows > row:
+                groups.append(i)
+                start = first_row if start is None else start
+            first_row += rows
+        if not groups:
+            return
+        position = start
+        for batch in parquet.iter_batches(batch_size=get_settings().pipeline.chunk_rows, row_groups=groups,
+                                          columns=columns):
+            table = pa.Table.from_batches([batch])
+            if position + table.num_rows > row:
+                skip = max(0, row - position)
+                yield table.slice(skip), 0, position + skip
+            position += table.num_rows
+    else:
+        position = 0
+        for batch in _open_zst(path, types, columns):
+            table = pa.Table.from_batches([batch])
+            if position + table.num_rows > row:
+                skip = max(0, row - position)
+                yield table.slice(skip), 0, position + skip
+            position += table.num_rows
+
+
+def _parse_bound(value: str, end: bool):
+    """from/to query value -> datetime; a date-only 'to' covers that whole day"""
+    import pandas as pd
+    try:
+        bound = pd.Timestamp(value)
+    except ValueError as e:
+        raise ValueError(f'invalid date {value!r}') from e
+    if end and len(value.strip()) <= 10:
+        bound += pd.Timedelta(days=1)
+    return bound.to_pydatetime().replace(tzinfo=None)
+
+
+def _date_mask(column, start, end):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    values = pc.cast(column, pa.timestamp('us'))
+    mask = None
+    if start is not None:
+        mask = pc.greater_equal(values, pa.scalar(start, pa.timestamp('us')))
+    if end is not None:
+        before = pc.less(values, pa.scalar(end, pa.timestamp('us')))
+        mask = before if mask is None else pc.and_(mask, before)
+    return pc.fill_null(mask, False)
+
+
+class _PageWriter:
+    """Writes tables of one schema to a binary sink as Arrow IPC stream, NDJSON or CSV"""
+
+    def __init__(self, fmt: str, sink, schema):
+        import pyarrow.csv as pacsv
+        import pyarrow.ipc as ipc
+        self.fmt, self.sink = fmt, sink
+        if fmt == 'arrow':
+            self.writer = ipc.new_stream(sink, schema)
+        elif fmt == 'csv':
+            self.writer = pacsv.CSVWriter(sink, schema)
+        else:
+            self.writer = None
+
+    def write(self, table):
+        if self.writer is not None:
+            self.writer.write_table(table)
+            return
+        # pandas' C JSON writer; NaN becomes null, dates ISO 8601
+        lines = table.to_pandas().to_json(orient='records', lines=True, date_format='iso', date_unit='s')
+        self.sink.write(lines.encode('utf-8'))
+        if lines and not lines.endswith('\n'):
+            self.sink.write(b'\n')
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def write_page(path: Path, sink, fmt: str = 'ndjson', columns: list = None, start: str = None, end: str = None,
+               limit: int = 100_000, cursor: str = None, date_column: str = None) -> dict:
+    """
+    Write one page of a processed sheet to a binary sink
+
+    Args:
+        path: Processed sheet file (find_sheet)
+        sink: Binary file-like object
+        fmt: arrow | ndjson | csv
+        columns: Columns to return, in this order (default: all)
+        start: Keep rows dated on/after this (ISO date or datetime)
+        end: Keep rows dated on/before this; a date-only value includes that whole day
+        limit: Rows in the page
+        cursor: next_cursor of the previous page (None = first page)
+        date_column: Column the date filters apply to (default: find_date_field)
+
+    Returns:
+        dict: rows (written), next_cursor (None on the last page), columns
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if fmt not in FORMATS:
+        raise ValueError(f'format must be one of {list(FORMATS)}, got {fmt!r}')
+    path = Path(path)
+    offset, row = decode_cursor(path, cursor)
+    schema = sheet_schema(path)
+    columns = list(columns) if columns else schema.names
+    unknown = [c for c in columns if c not in schema.names]
+    if unknown:
+        raise KeyError(f'unknown columns {unknown}, the sheet has {schema.names}')
+    start = _parse_bound(start, end=False) if start else None
+    end = _parse_bound(end, end=True) if end else None
+    filter_column = None
+    if start is not None or end is not None:
+        filter_column = date_column or find_date_field(schema)
+        if filter_column not in schema.names:
+            raise KeyError(f'no date column {filter_column!r} to filter on' if filter_column else
+                           'the sheet has no date column, pass date_column')
+    read_columns = columns + ([filter_column] if filter_column and filter_column not in columns else [])
+
+    writer = _PageWriter(fmt, sink, pa.schema([schema.field(c) for c in columns]))
+    written, next_cursor = 0, None
+    try:
+        for table, table_offset, table_row in _scan(path, schema, read_columns, offset, row):
+            if filter_column is None:
+                keep = pa.array(range(min(table.num_rows, limit - written)), pa.int64())
+            else:
+                keep = pc.indices_nonzero(_date_mask(table[filter_column], start, end))[:limit - written]
+            if len(keep):
+                writer.write(table.select(columns).take(keep))
+                written += len(keep)
+            if written >= limit:
+                # the next page starts after the last row taken; it may turn out empty
+                next_cursor = encode_cursor(path, table_offset, table_row + keep[-1].as_py() + 1)
+                break
+    finally:
+        writer.close()
+    return {"rows": written, "next_cursor": next_cursor, "columns": columns}
+
+
+def describe_sheets(directory: Path) -> list:
+    """Sheets GET /data can serve: name, format, size and columns"""
+    if not Path(directory).is_dir():
+        return []
+    sheets = []
+    for path in list_processed(directory):
+        schema = sheet_schema(path)
+        sheets.append({"sheet": sheet_stem(path), "format": _kind(path), "bytes": path.stat().st_size,
+                       "columns": {f.name: str(f.type) for f in schema}, "date_column": find_date_field(schema)})
+    return sheets
@@ -0,0 +1,314 @@
+"""
+Seeded synthetic workbooks at any scale, for reproducing production-size loads locally
+
+Rows are (entity, day) pairs: `days` consecutive dates for as many business units as it
+takes to reach `rows`, so 10M rows is ~3.3k entities x 3000 days instead of dates past
+the year 2262. Every sheet is generated block by block with NumPy and written as it goes,
+so memory stays at one block whatever the total size.
+
+The same seed, rows, days and chunk_rows always give identical output. The sheets satisfy
+the accounting identities across each other:
+
+    Gross_Profit = Revenue - COGS
+    Operating_Income = Gross_Profit - Operating_Expenses
+    Net_Income = Operating_Income - Interest_Expense - Taxes   (P&L and Cashflow agree)
+    EBITDA = Operating_Income + Depreciation                   (Depreciation as in Cashflow)
+    Operating_Cash_Flow = Net_Income + Depreciation + Change_in_Working_Capital
+    Free_Cash_Flow = Operating_Cash_Flow - Capital_Expenditures
+    sum of Department Expenses per (entity, date) = Operating_Expenses
+"""
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.utils.logger import get_logger
+from src.utils.settings import get_settings
+
+logger = get_logger('synthetic data')
+
+SHEETS = {
+    'pnl': 'P&L Statement',
+    'cashflow': 'Cashflow statement',
+    'kpi': 'KPI summary',
+    'departments': 'Department Expenses',
+}
+DEPARTMENTS = np.array(['Finance', 'Sales', 'Operations', 'R&D', 'Marketing'])
+XLSX_MAX_ROWS = 1_048_575   # data rows per Excel sheet (one row is the header)
+FORMATS = ('xlsx', 'csv', 'parquet')
+
+
+def _entity_params(seed: int, entities: int) -> dict:
+    """Per-entity levels (size, margins, leverage) so each business unit has its own profile"""
+    rng = np.random.default_rng([seed, 0])
+    return {
+        'base_revenue': rng.lognormal(mean=np.log(250_000), sigma=0.6, size=entities),
+        'growth': rng.normal(0.06, 0.05, size=entities),          # per year
+        'season_phase': rng.uniform(0, 2 * np.pi, size=entities),
+        'cogs_ratio': rng.uniform(0.35, 0.6, size=entities),
+        'opex_ratio': rng.uniform(0.1, 0.25, size=entities),
+        'capex_ratio': rng.uniform(0.02, 0.08, size=entities),
+        'debt_to_equity': rng.uniform(0.3, 2.5, size=entities),
+        'equity_days': rng.uniform(200, 900, size=entities),      # equity as days of revenue
+        'current_ratio': rng.uniform(1.0, 2.6, size=entities),
+        'dept_weights': rng.dirichlet(np.full(len(DEPARTMENTS), 4.0), size=entities),
+        'entity_names': [f'BU-{i:0{len(str(entities - 1))}d}' for i in range(entities)],
+    }
+
+
+def generate_block(seed: int, block: int, start_row: int, n_rows: int, days: int, entities: int,
+                   params: dict, start_date: str = '2022-01-01', sheets: tuple = tuple(SHEETS)) -> dict:
+    """
+    One block of rows for every requested sheet
+
+    Args:
+        seed: Base seed
+        block: Block number (part of the block's RNG seed)
+        start_row: First global row of the block
+        n_rows: Rows in the block
+        days: Days per entity
+        entities: Total number of entities (an Entity column is added when > 1)
+        params: Output of _entity_params()
+        start_date: First date
+        sheets: Keys of SHEETS to build
+
+    Returns:
+        dict: sheet name -> DataFrame
+    """
+    rng = np.random.default_rng([seed, 1, block])
+    row = np.arange(start_row, start_row + n_rows, dtype=np.int64)
+    entity, day = row // days, row % days
+    dates = np.datetime64(start_date, 'D') + day
+    p = {name: values[entity] for name, values in params.items() if name != 'entity_names'}
+    years = day / 365.0
+
+    season = 1 + 0.15 * np.sin(2 * np.pi * years + p['season_phase'])
+    revenue = p['base_revenue'] * (1 + p['growth']) ** years * season * rng.lognormal(0, 0.25, n_rows)
+    cogs = revenue * p['cogs_ratio'] * rng.normal(1, 0.05, n_rows)
+    opex = revenue * p['opex_ratio'] * rng.normal(1, 0.08, n_rows)
+    depreciation = revenue * p['capex_ratio'] * 0.6 * rng.normal(1, 0.05, n_rows)
+    equity = p['base_revenue'] * p['equity_days']
+    debt_to_equity = p['debt_to_equity'] * (1 + 0.1 * np.sin(2 * np.pi * years / 3 + p['season_phase'])) \
+        * rng.normal(1, 0.02, n_rows)
+    interest = equity * debt_to_equity * 0.05 / 365 * rng.normal(1, 0.05, n_rows)
+
+    # rounding the inputs first keeps the identities exact in integers
+    revenue, cogs, opex, depreciation, interest = (np.rint(a).astype(np.int64)
+                                                   for a in (revenue, cogs, opex, depreciation, interest))
+    gross_profit = revenue - cogs
+    operating_income = gross_profit - opex
+    taxes = np.rint(np.maximum(operating_income - interest, 0) * 0.25).astype(np.int64)
+    net_income = operating_income - interest - taxes
+
+    key_columns = {'Date': dates}
+    if entities > 1:
+        # categoricals over the full entity list: cheap to build and the same schema in every block
+        key_columns['Entity'] = pd.Categorical.from_codes(entity, categories=params['entity_names'])
+
+    frames = {}
+    if 'pnl' in sheets:
+        frames[SHEETS['pnl']] = pd.DataFrame({
+            **key_columns, 'Revenue': revenue, 'COGS': cogs, 'Operating_Expenses': opex,
+            'Interest_Expense': interest, 'Taxes': taxes, 'Gross_Profit': gross_profit,
+            'Operating_Income': operating_income, 'Net_Income': net_income,
+            'EBITDA': operating_income + depreciation,
+        })
+    if 'cashflow' in sheets:
+        working_capital = np.rint(revenue * rng.normal(0, 0.04, n_rows)).astype(np.int64)
+        capex = np.rint(revenue * p['capex_ratio'] * rng.lognormal(0, 0.3, n_rows)).astype(np.int64)
+        operating_cash_flow = net_income + depreciation + working_capital
+        frames[SHEETS['cashflow']] = pd.DataFrame({
+            **key_columns, 'Net_Income': net_income, 'Depreciation': depreciation,
+            'Change_in_Working_Capital': working_capital, 'Capital_Expenditures': capex,
+            'Investments': np.rint(revenue * rng.normal(0, 0.1, n_rows)).astype(np.int64),
+            'Operating_Cash_Flow': operating_cash_flow, 'Free_Cash_Flow': operating_cash_flow - capex,
+        })
+    if 'kpi' in sheets:
+        annual = 365 * 100   # daily amounts -> annualized percentages
+        frames[SHEETS['kpi']] = pd.DataFrame({
+            **key_columns,
+            'ROI': np.round(operating_income * annual / (equity * (1 + debt_to_equity)), 4),
+            'ROE': np.round(net_income * annual / equity, 4),
+            'ROA': np.round(net_income * annual / (equity * (1 + debt_to_equity) * 1.3), 4),
+            'Debt_to_Equity': np.round(debt_to_equity, 4),
+            'Current_Ratio': np.round(p['current_ratio'] * rng.normal(1, 0.05, n_rows), 4),
+        })
+    if 'departments' in sheets:
+        n_depts = len(DEPARTMENTS)
+        # noisy per-row shares around the entity's split; the last department takes the rounding
+        shares = rng.gamma(p['dept_weights'] * 200)
+        shares /= shares.sum(axis=1, keepdims=True)
+        expenses = np.floor(opex[:, None] * shares).astype(np.int64)
+        expenses[:, -1] = opex - expenses[:, :-1].sum(axis=1)
+        budget = np.rint(revenue[:, None] * p['opex_ratio'][:, None] * p['dept_weights']).astype(np.int64)
+        frames[SHEETS['departments']] = pd.DataFrame({
+            **{k: np.repeat(v, n_depts) for k, v in key_columns.items()},
+            'Department': pd.Categorical.from_codes(np.tile(np.arange(n_depts), n_rows), categories=DEPARTMENTS),
+            'Expenses': expenses.ravel(),
+            'Budget': budget.ravel(),
+            'Variance': (budget - expenses).ravel(),
+        })
+    return frames
+
+
+def _to_arrow(df: pd.DataFrame):
+    """Arrow table with Date as a plain date (pandas would write '2022-01-01 00:00:00')"""
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.date32()))
+    return table
+
+
+class _CsvSink:
+    def __init__(self, output_dir: Path):
+        import pyarrow.csv as pacsv
+        self._pacsv = pacsv
+        self.output_dir = output_dir
+        self.writers = {}
+        self.paths = {}
+
+    def write(self, sheet: str, df: pd.DataFrame):
+        table = _to_arrow(df)
+        if sheet not in self.writers:
+            path = self.output_dir / f"{sheet.replace(' ', '_')}.csv"
+            self.paths[sheet] = path
+            self.writers[sheet] = self._pacsv.CSVWriter(str(path), table.schema)
+        self.writers[sheet].write_table(table)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+class _ParquetSink:
+    def __init__(self, output_dir: Path):
+        import pyarrow.parquet as pq
+        self._pq = pq
+        self.output_dir = output_dir
+        self.writers = {}
+        self.paths = {}
+
+    def write(self, sheet: str, df: pd.DataFrame):
+        table = _to_arrow(df)
+        if sheet not in self.writers:
+            path = self.output_dir / f"{sheet.replace(' ', '_')}.parquet"
+            self.paths[sheet] = path
+            self.writers[sheet] = self._pq.ParquetWriter(str(path), table.schema, compression='zstd')
+        self.writers[sheet].write_table(table)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+class _XlsxSink:
+    """Streams rows with openpyxl's write-only mode; sheets past Excel's row limit continue in '<name> 2', ..."""
+
+    def __init__(self, path: Path):
+        import openpyxl
+        self.path = path
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.sheets = {}    # sheet -> [worksheet, rows written, part number]
+        self.paths = {}
+
+    def _new_part(self, sheet: str, part: int, columns: list):
+        title = sheet if part == 1 else f'{sheet[:28]} {part}'
+        worksheet = self.workbook.create_sheet(title=title)
+        worksheet.append(columns)
+        self.sheets[sheet] = [worksheet, 0, part]
+        if part > 1:
+            logger.warning(f'{sheet} exceeds the Excel row limit, continuing in sheet {title!r}')
+
+    def write(self, sheet: str, df: pd.DataFrame):
+        if sheet not in self.sheets:
+            self._new_part(sheet, 1, list(df.columns))
+            self.paths[sheet] = self.path
+        # tolist() gives Timestamps for datetime columns, which openpyxl takes as datetimes
+        columns = [df[c].tolist() for c in df.columns]
+        for values in zip(*columns):
+            worksheet, written, part = self.sheets[sheet]
+            if written >= XLSX_MAX_ROWS:
+                self._new_part(sheet, part + 1, list(df.columns))
+                worksheet = self.sheets[sheet][0]
+            worksheet.append(values)
+            self.sheets[sheet][1] += 1
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+def generate_workbook(output: Path, rows: int = 3000, days: int = 3000, seed: int = 42, fmt: str = 'xlsx',
+                      chunk_rows: int = None, sheets: tuple = tuple(SHEETS), start_date: str = '2022-01-01') -> dict:
+    """
+    Generate and write a synthetic workbook
+
+    Args:
+        output: .xlsx file for fmt='xlsx', otherwise a directory with one file per sheet
+            (named like save_processed output, so it can be used as a processed dir)
+        rows: Rows per sheet (Department Expenses has one row per department on top)
+        days: Consecutive days per entity; rows beyond that start a new entity
+        seed: RNG seed
+        fmt: xlsx | csv | parquet
+        chunk_rows: Rows generated and written per block (default: pipeline.chunk_rows setting)
+        sheets: Keys of SHEETS to build
+        start_date: First date of every entity
+
+    Returns:
+        dict: sheet name -> written path, plus rows, seconds and rows_per_second
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'format must be one of {FORMATS}')
+    unknown = set(sheets) - set(SHEETS)
+    if unknown:
+        raise ValueError(f'unknown sheets {sorted(unknown)}, choose from {list(SHEETS)}')
+    chunk_rows = chunk_rows or get_settings().pipeline.chunk_rows
+    days = min(days, rows)
+    entities = -(-rows // days)
+    output = Path(output)
+    if fmt == 'xlsx':
+        output.parent.mkdir(parents=True, exist_ok=True)
+        sink = _XlsxSink(output)
+    else:
+        output.mkdir(parents=True, exist_ok=True)
+        sink = _CsvSink(output) if fmt == 'csv' else _ParquetSink(output)
+
+    start = time.perf_counter()
+    params = _entity_params(seed, entities)
+    logger.info(f'generating {rows:,} rows ({entities} entities x {days} days) as {fmt} in blocks of {chunk_rows:,}')
+    try:
+        for block, start_row in enumerate(range(0, rows, chunk_rows)):
+            n_rows = min(chunk_rows, rows - start_row)
+            frames = generate_block(seed, block, start_row, n_rows, days, entities, params,
+                                    start_date=start_date, sheets=sheets)
+            for sheet, df in frames.items():
+                sink.write(sheet, df)
+            logger.info(f'block {block + 1}: rows {start_row + n_rows:,}/{rows:,}')
+    finally:
+        sink.close()
+    seconds = time.perf_counter() - start
+    logger.info(f'wrote {rows:,} rows per sheet in {seconds:.1f}s ({rows / seconds:,.0f} rows/s) to {output}')
+    return {**{sheet: str(path) for sheet, path in sink.paths.items()},
+            "rows": rows, "seconds": round(seconds, 3), "rows_per_second": round(rows / seconds)}
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description='generate a seeded synthetic financial workbook')
+    parser.add_argument('--output', type=str, default='data/raw/Financial_data_synthetic.xlsx',
+                        help='.xlsx file, or a directory for csv/parquet')
+    parser.add_argument('--rows', type=int, default=3000, help='rows per sheet')
+    parser.add_argument('--days', type=int, default=3000, help='days per entity (more rows = more entities)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--format', type=str, default='xlsx', choices=FORMATS)
+    parser.add_argument('--chunk-rows', type=int, default=None, help='rows per generated/written block')
+    parser.add_argument('--sheets', type=str, default=','.join(SHEETS),
+                        help=f'comma separated subset of {",".join(SHEETS)}')
+    parser.add_argument('--start-date', type=str, default='2022-01-01')
+    args = parser.parse_args()
+
+    result = generate_workbook(Path(args.output), rows=args.rows, days=args.days, seed=args.seed, fmt=args.format,
+                               chunk_rows=args.chunk_rows, sheets=tuple(args.sheets.split(',')),
+                               start_date=args.start_date)
+    print(json.dumps(result, indent=2))
@@ -1,21 +1,16 @@
 from pathlib import Path
 import os
-import pandas as pd
+from src.ingestion.catalog import get_catalog, LazySheetList
 
 
 def load_dataset():
+    """
+    Every sheet of every .xlsx/.csv in data/raw, as a lazy list
+
+    The files are indexed once by the catalog (src/ingestion/catalog.py); a sheet
+    is only parsed when it is accessed, e.g. load_dataset()[0].
+    """
     file_path = os.path.join((Path(__file__).resolve().parents[2]), 'data', 'raw')
-    files_list = []
-    for files in os.listdir(file_path):
-        # print(files)
-        if files.endswith('.xlsx'):
-            excel_file = pd.ExcelFile(os.path.join(file_path, files))
-            for sheet_names in excel_file.sheet_names:
-                df = pd.read_excel(excel_file, sheet_name=sheet_names)
-                files_list.append(df)
-        elif files.endswith('.csv'):
-            df = pd.read_csv(os.path.join(file_path, files))
-            files_list.append(df)
-    return files_list
+    return LazySheetList(get_catalog(Path(file_path)))
 
 # print(load_dataset())
\ No newline at end of file
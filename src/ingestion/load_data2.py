@@ -1,40 +1,187 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import pandas as pd
+from typing import TYPE_CHECKING
 import logging
 from src.utils.logger import get_logger
+from src.utils.settings import get_settings
+from src.ingestion.parse_cache import get_parse_cache
+from src.utils.profiling import profile_stage, add_profile_arguments, maybe_profile
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = get_logger('load_data')
 
-DEFAULT_RAW = Path('data/raw/Financial_data_final.xlsx')
-# print(DEFAULT_RAW)
+def load_excel_to_dfs(path: Path = None, use_cache: bool = None):
+    """
+    Read every sheet of a workbook, through the parse cache when enabled
+
+    Args:
+        path: Workbook path (default: paths.raw_path setting)
+        use_cache: Override the cache.parse_cache setting
 
-def load_excel_to_dfs(path: Path = None):
-    path = Path(path) if path is not None else DEFAULT_RAW
+    Returns:
+        dict: sheet_name -> DataFrame. Frames served from the cache are memory-mapped
+            and read-only; call .copy() before editing values in place.
+    """
+    path = Path(path) if path is not None else Path(get_settings().paths.raw_path)
     path = path.resolve()
     # print(f'printing path inside of function: {path}')
     if not path.exists():
         logger.error(f'Raw data is not found at {Path}')
         raise FileNotFoundError(path)
+    use_cache = get_settings().cache.parse_cache if use_cache is None else use_cache
+    if use_cache:
+        cache = get_parse_cache()
+        sheets = cache.get(path)
+        if sheets is not None:
+            logger.info(f'Loaded sheets from parse cache: {list(sheets.keys())}')
+            return sheets
     logger.info(f'Loading Excel from {path}')
+    # pandas is imported on first use, it is most of this module's import time
+    import pandas as pd
     xls = pd.ExcelFile(path)
     sheets = {sheet_name: xls.parse(sheet_name) for sheet_name in xls.sheet_names}
     logger.info(f'Loaded sheets: {list(sheets.keys())}') # this logger info is used for printing the message in terminal without using print statment and also it will print the output with time and file_information like from which file this part is coming in
     # can utilize this anywhere we needed to know the progress of something
+    if use_cache:
+        cache.put(path, sheets)
     return sheets
 
-def save_processed(sheets: dict, output_dir: Path):
+ARTIFACT_SUFFIXES = {'csv': '.csv', 'csv.zst': '.csv.zst', 'parquet': '.parquet'}
+
+
+def _to_arrow(df: 'pd.DataFrame'):
+    """
+    Arrow table; datetime columns holding only dates are written as dates, like df.to_csv does
+
+    Object columns mixing types (text and numbers in one Excel column) can't be converted as they
+    are, so their values are written as text, which is what df.to_csv wrote for them.
+    """
+    import pyarrow as pa
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        df = df.copy()
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type):
+            values = df.iloc[:, i]
+            if (values.dropna() == values.dropna().dt.normalize()).all():
+                table = table.set_column(i, field.name, table.column(i).cast(pa.date32()))
+    return table
+
+
+def write_sheet(df: 'pd.DataFrame', path: Path, fmt: str = 'csv') -> dict:
+    """
+    Write one sheet with Arrow (csv, zstd-compressed csv or parquet) to a temp file, then rename it into place
+
+    Returns:
+        dict: path, rows, bytes, seconds, mb_per_s
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+
+    start = time.perf_counter()
+    table = _to_arrow(df)
+    # unquoted header/values like df.to_csv wrote (arrow quotes every column name otherwise)
+    plain_header = not any(ch in str(name) for name in table.column_names for ch in ',"\r\n')
+    csv_options = pacsv.WriteOptions(quoting_style='needed', quoting_header='none' if plain_header else 'needed',
+                                     batch_size=64 * 1024)
+    tmp_path = path.with_name(path.name + '.tmp')
+    try:
+        if fmt == 'parquet':
+            pq.write_table(table, tmp_path, compression='zstd')
+        elif fmt == 'csv.zst':
+            with pa.CompressedOutputStream(str(tmp_path), 'zstd') as stream:
+                pacsv.write_csv(table, stream, csv_options)
+        else:
+            pacsv.write_csv(table, str(tmp_path), csv_options)
+        # readers never see a half-written file
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    seconds = time.perf_counter() - start
+    size = path.stat().st_size
+    return {"path": path, "rows": len(df), "bytes": size, "seconds": round(seconds, 3),
+            "mb_per_s": round(size / 1e6 / seconds, 1) if seconds else None}
+
+
+def save_processed(sheets: dict, output_dir: Path, fmt: str = None, workers: int = None) -> dict:
+    """
+    Write every sheet to output_dir concurrently
+
+    Args:
+        sheets: sheet_name -> DataFrame
+        output_dir: Target directory, files are named <sheet name with _ for spaces><suffix>
+        fmt: csv | csv.zst | parquet (default: pipeline.artifact_format setting)
+        workers: Sheets written in parallel (default: pipeline.workers setting)
+
+    Returns:
+        dict: sheet_name -> written Path
+    """
+    settings = get_settings()
+    fmt = fmt or settings.pipeline.artifact_format
+    if fmt not in ARTIFACT_SUFFIXES:
+        raise ValueError(f'artifact format must be one of {list(ARTIFACT_SUFFIXES)}, got {fmt!r}')
     out_dir = Path(output_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
-    for name, df in sheets.items():
-        fname = out_dir / f"{name.replace(' ','_')}.csv"
-        df.to_csv(fname, index=False)
-        logger.info(f'wrote {fname} ({len(df)}) rows')
+    start = time.perf_counter()
+    # Arrow encodes/compresses outside the GIL, so threads are enough here
+    with ThreadPoolExecutor(max_workers=workers or settings.pipeline.workers, thread_name_prefix='save') as pool:
+        futures = {name: pool.submit(write_sheet, df, out_dir / f"{name.replace(' ','_')}{ARTIFACT_SUFFIXES[fmt]}", fmt)
+                   for name, df in sheets.items()}
+        stats = {name: future.result() for name, future in futures.items()}
+    for name, stat in stats.items():
+        logger.info(f"wrote {stat['path']} ({stat['rows']}) rows, {stat['bytes'] / 1e6:.2f} MB "
+                    f"in {stat['seconds']}s ({stat['mb_per_s']} MB/s)")
+    total_bytes = sum(stat['bytes'] for stat in stats.values())
+    seconds = time.perf_counter() - start
+    logger.info(f'saved {len(stats)} sheets as {fmt}: {total_bytes / 1e6:.2f} MB in {seconds:.2f}s '
+                f'({total_bytes / 1e6 / seconds:.1f} MB/s)' if seconds else f'saved {len(stats)} sheets')
+    return {name: stat['path'] for name, stat in stats.items()}
+
+
+def read_sheet(path: Path) -> 'pd.DataFrame':
+    """Read a sheet written by save_processed in any artifact format"""
+    import pandas as pd
+    path = Path(path)
+    if path.suffix == '.parquet':
+        return pd.read_parquet(path)
+    # .csv.zst is decompressed by pandas through zstandard
+    return pd.read_csv(path)
+
+
+def list_processed(directory: Path) -> list:
+    """Sheet files in a processed directory, any artifact format"""
+    return sorted(p for p in Path(directory).iterdir()
+                  if p.is_file() and any(p.name.endswith(suffix) for suffix in ARTIFACT_SUFFIXES.values()))
+
+
+def sheet_stem(path: Path) -> str:
+    """'P&L_Statement.csv.zst' -> 'P&L_Statement'"""
+    name = Path(path).name
+    for suffix in sorted(ARTIFACT_SUFFIXES.values(), key=len, reverse=True):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return Path(path).stem
 
 if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser(description='load raw excel and save CSVs')
-    parser.add_argument('--raw', type=str, default=str(DEFAULT_RAW)) # this will be used as an input, to access this args.raw
-    parser.add_argument('--out', type=str, default='data/processed') # to access this args.out
+    parser.add_argument('--raw', type=str, default=get_settings().paths.raw_path) # this will be used as an input, to access this args.raw
+    parser.add_argument('--out', type=str, default=get_settings().paths.processed_dir) # to access this args.out
+    parser.add_argument('--format', type=str, default=None, choices=list(ARTIFACT_SUFFIXES),
+                        help='processed file format (default: pipeline.artifact_format setting)')
+    add_profile_arguments(parser)
     args = parser.parse_args()
-    sheets = load_excel_to_dfs(Path(args.raw))
-    save_processed(sheets=sheets, output_dir=Path(args.out))
+    with maybe_profile(args):
+        with profile_stage('load'):
+            sheets = load_excel_to_dfs(Path(args.raw))
+        with profile_stage('save_processed'):
+            save_processed(sheets=sheets, output_dir=Path(args.out), fmt=args.format)
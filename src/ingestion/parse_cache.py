@@ -0,0 +1,142 @@
+"""
+Parse cache for source workbooks
+
+Parsing an .xlsx means unzipping and walking its XML every time. The first load of a
+workbook stores each parsed sheet as an uncompressed Arrow IPC file under
+<cache dir>/parse/<content hash>/; later loads of the same bytes (any path, any process)
+memory-map those files instead. Entries are evicted least-recently-used first once the
+cache grows past cache.max_mb.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from src.utils.logger import get_logger
+from src.utils.settings import get_settings, resolve_path
+from src.utils.hashing import file_hash
+
+logger = get_logger('parse cache')
+
+CACHE_VERSION = 1
+MANIFEST = 'manifest.json'
+
+
+class ParseCache:
+    def __init__(self, cache_dir: Path = None, max_mb: int = None):
+        settings = get_settings()
+        self.cache_dir = Path(cache_dir) if cache_dir else resolve_path(settings.cache.dir) / 'parse'
+        self.max_bytes = (max_mb or settings.cache.max_mb) * 1024 * 1024
+        self._hashes = {}    # (path, mtime, size) -> content hash, so a hit doesn't re-read the file
+        self._lock = threading.Lock()
+
+    def _key(self, path: Path) -> str:
+        stat = path.stat()
+        memo_key = (str(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            digest = self._hashes.get(memo_key)
+        if digest is None:
+            digest = file_hash(path)
+            with self._lock:
+                self._hashes[memo_key] = digest
+        return digest
+
+    def get(self, path: Path):
+        """
+        Cached sheets of a workbook, memory-mapped
+
+        Returns:
+            dict: sheet_name -> DataFrame, or None on a miss
+        """
+        import pyarrow as pa
+
+        entry = self.cache_dir / self._key(Path(path))
+        manifest_path = entry / MANIFEST
+        if not manifest_path.exists():
+            return None
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+            if manifest.get('version') != CACHE_VERSION:
+                return None
+            sheets = {}
+            for sheet in manifest['sheets']:
+                # not closed here: the DataFrames keep referencing the mapping
+                source = pa.memory_map(str(entry / sheet['file']), 'r')
+                table = pa.ipc.open_file(source).read_all()
+                # split_blocks lets numeric columns stay views on the mapped file
+                sheets[sheet['name']] = table.to_pandas(split_blocks=True)
+        except (OSError, ValueError, KeyError, pa.ArrowException) as e:
+            logger.warning(f'dropping unreadable parse cache entry {entry.name}: {e}')
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+        # mtime of the manifest is the LRU clock
+        os.utime(manifest_path)
+        return sheets
+
+    def put(self, path: Path, sheets: dict):
+        """Store parsed sheets for a workbook; sheets Arrow can't represent make the whole workbook uncached"""
+        import pyarrow as pa
+
+        entry = self.cache_dir / self._key(Path(path))
+        if (entry / MANIFEST).exists():
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_entry = self.cache_dir / f'.tmp-{uuid.uuid4().hex}'
+        tmp_entry.mkdir()
+        try:
+            manifest = {"version": CACHE_VERSION, "source": Path(path).name, "sheets": []}
+            for i, (name, df) in enumerate(sheets.items()):
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                file_name = f'{i}.arrow'
+                # uncompressed on purpose: compressed buffers can't be memory-mapped zero-copy
+                with pa.OSFile(str(tmp_entry / file_name), 'wb') as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+                manifest['sheets'].append({"name": name, "file": file_name, "rows": table.num_rows})
+            with open(tmp_entry / MANIFEST, 'w', encoding='utf-8') as file:
+                json.dump(manifest, file)
+            try:
+                os.replace(tmp_entry, entry)
+            except OSError:
+                # another process cached the same workbook first
+                shutil.rmtree(tmp_entry, ignore_errors=True)
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            logger.info(f'not caching {Path(path).name}: {e}')
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for entry in self.cache_dir.iterdir():
+            manifest_path = entry / MANIFEST
+            if not manifest_path.exists():
+                # leftovers of a crashed put()
+                if entry.name.startswith('.tmp-') and time.time() - entry.stat().st_mtime > 3600:
+                    shutil.rmtree(entry, ignore_errors=True)
+                continue
+            size = sum(f.stat().st_size for f in entry.iterdir())
+            entries.append((manifest_path.stat().st_mtime, size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            logger.info(f'evicting parse cache entry {entry.name} ({size / 1e6:.1f} MB)')
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_parse_cache() -> ParseCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ParseCache()
+    return _cache
@@ -0,0 +1,237 @@
+"""
+Admission control in front of the LLM
+
+Every LLM call takes a slot before it reaches Ollama. There are llm.max_concurrency slots
+per backend in llm.backends, so the backend pool has a choice to balance. When all slots
+are busy, callers wait in one queue per priority class, and a free slot always goes to the
+oldest interactive caller before any batch caller. Each class queue holds at most
+llm.queue_depth callers. When it is full, interactive callers are rejected right away with
+QueueFull (the user can retry, which beats a request timing out after minutes in Ollama's
+own queue) and batch callers are deferred until there is room, entering the queue in the
+order they arrived. Time spent waiting for a slot is reported apart from the inference
+time. Work a caller stops waiting for but can't cancel (the losing request of a hedge) can
+keep its slot taken until it finishes (hold()).
+"""
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from src.utils.logger import get_logger
+from src.utils.settings import get_settings, on_reload
+
+logger = get_logger('admission')
+
+PRIORITIES = ('interactive', 'batch')     # highest first
+ON_FULL = {'interactive': 'reject', 'batch': 'defer'}
+
+
+class QueueFull(RuntimeError):
+    """The LLM queue for this priority class is full (or the wait for a slot timed out)"""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class Ticket:
+    priority: str
+    seq: int
+    enqueued: float = field(default_factory=time.perf_counter)
+    admitted: float = None
+    queue_wait: float = 0.0
+    inference: float = None
+    holds: int = 0              # the with-block plus work still running under this slot
+
+
+_local = threading.local()
+
+
+def last_timing() -> dict:
+    """Queue wait / inference seconds of the calling thread's last admitted LLM call"""
+    ticket = getattr(_local, 'ticket', None)
+    if ticket is None:
+        return {}
+    return {"priority": ticket.priority, "queue_wait": round(ticket.queue_wait, 3),
+            "inference": round(ticket.inference, 3) if ticket.inference is not None else None}
+
+
+def admission_slots(settings) -> int:
+    """llm.max_concurrency slots for each configured backend"""
+    from src.llm.backends import parse_backends
+    return max(1, settings.llm.max_concurrency) * len(parse_backends(settings))
+
+
+class AdmissionController:
+    def __init__(self, slots: int = 1, queue_depth: int = 8):
+        self.slots = max(1, slots)
+        self.queue_depth = max(0, queue_depth)
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting = {priority: deque() for priority in PRIORITIES}
+        # callers waiting for room in a full queue; the lowest seq goes first
+        self._deferred = {priority: deque() for priority in PRIORITIES}
+        self._seq = itertools.count()
+        self._stats = {priority: {"admitted": 0, "completed": 0, "rejected": 0, "deferred": 0, "timed_out": 0,
+                                  "queue_wait_total": 0.0, "queue_wait_max": 0.0, "inference_total": 0.0}
+                       for priority in PRIORITIES}
+
+    def apply_settings(self, settings):
+        self.resize(admission_slots(settings), settings.llm.queue_depth)
+
+    def resize(self, slots: int = None, queue_depth: int = None):
+        with self._cond:
+            if slots is not None:
+                self.slots = max(1, slots)
+            if queue_depth is not None:
+                self.queue_depth = max(0, queue_depth)
+            self._cond.notify_all()
+
+    def _next_up(self):
+        for priority in PRIORITIES:
+            if self._waiting[priority]:
+                return self._waiting[priority][0]
+        return None
+
+    def _has_room(self, priority: str) -> bool:
+        """A new caller of this class may join its queue (or take a free slot nobody waits for)"""
+        return (len(self._waiting[priority]) < self.queue_depth
+                or (self._running < self.slots and self._next_up() is None))
+
+    @contextmanager
+    def admit(self, priority: str = 'interactive', timeout: float = None):
+        """
+        Hold an LLM slot for the duration of the with-block
+
+        Args:
+            priority: 'interactive' or 'batch'
+            timeout: Max seconds to wait for a slot (None = no limit)
+
+        Returns:
+            Ticket: with queue_wait set on entry and inference set on exit
+
+        Raises:
+            QueueFull: queue full for an interactive caller, or no slot within timeout
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f'unknown priority {priority!r}, expected one of {PRIORITIES}')
+        ticket = Ticket(priority, next(self._seq))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        stats = self._stats[priority]
+        queue = self._waiting[priority]
+
+        def remaining():
+            return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+        with self._cond:
+            deferred = self._deferred[priority]
+            if deferred or not self._has_room(priority):
+                if ON_FULL[priority] == 'reject':
+                    stats['rejected'] += 1
+                    raise QueueFull(f'LLM queue is full ({len(queue)} {priority} requests waiting), try again shortly',
+                                    retry_after=self._retry_after())
+                stats['deferred'] += 1
+                logger.info(f'{priority} queue full ({len(queue)} waiting, {len(deferred)} deferred), deferring')
+                deferred.append(ticket)
+                # only the oldest deferred caller may take the room, so they enter the queue in order
+                has_room = self._cond.wait_for(
+                    lambda: min(deferred, key=lambda t: t.seq) is ticket and self._has_room(priority),
+                    timeout=remaining())
+                deferred.remove(ticket)
+                self._cond.notify_all()
+                if not has_room:
+                    stats['timed_out'] += 1
+                    raise QueueFull(f'no room in the {priority} LLM queue after {timeout}s')
+            queue.append(ticket)
+            admitted = self._cond.wait_for(lambda: self._running < self.slots and self._next_up() is ticket,
+                                           timeout=remaining())
+            queue.remove(ticket)
+            if not admitted:
+                stats['timed_out'] += 1
+                self._cond.notify_all()
+                raise QueueFull(f'no LLM slot free after {timeout}s', retry_after=self._retry_after())
+            self._running += 1
+            ticket.holds = 1
+            ticket.admitted = time.perf_counter()
+            ticket.queue_wait = ticket.admitted - ticket.enqueued
+            stats['admitted'] += 1
+            stats['queue_wait_total'] += ticket.queue_wait
+            stats['queue_wait_max'] = max(stats['queue_wait_max'], ticket.queue_wait)
+            # wake deferred callers now that the queue has room
+            self._cond.notify_all()
+
+        _local.ticket = ticket
+        try:
+            yield ticket
+        finally:
+            ticket.inference = time.perf_counter() - ticket.admitted
+            with self._cond:
+                stats['completed'] += 1
+                stats['inference_total'] += ticket.inference
+                self._release(ticket)
+
+    def _release(self, ticket: Ticket):
+        ticket.holds -= 1
+        if ticket.holds == 0:
+            self._running -= 1
+            self._cond.notify_all()
+
+    def hold(self, ticket: Ticket):
+        """
+        Keep an admitted ticket's slot taken past its with-block, until the returned function is called
+
+        Returns:
+            callable: frees the hold; extra arguments are ignored, so it can be a future's done-callback
+        """
+        with self._cond:
+            if ticket.holds <= 0:
+                raise RuntimeError('ticket has no slot to hold')
+            ticket.holds += 1
+        released = threading.Event()
+
+        def release(*_):
+            if released.is_set():
+                return
+            released.set()
+            with self._cond:
+                self._release(ticket)
+        return release
+
+    def _retry_after(self) -> float:
+        """Rough seconds until a slot frees up, from the average inference time so far"""
+        done = sum(s['completed'] for s in self._stats.values())
+        total = sum(s['inference_total'] for s in self._stats.values())
+        average = total / done if done > 0 else 30.0
+        return round(average * (1 + sum(len(q) for q in self._waiting.values())) / self.slots, 1)
+
+    def status(self) -> dict:
+        with self._cond:
+            classes = {}
+            for priority in PRIORITIES:
+                stats = dict(self._stats[priority])
+                stats['waiting'] = len(self._waiting[priority])
+                stats['waiting_deferred'] = len(self._deferred[priority])
+                stats['queue_wait_avg'] = round(stats['queue_wait_total'] / stats['admitted'], 3) if stats['admitted'] else None
+                stats['inference_avg'] = round(stats['inference_total'] / stats['completed'], 3) if stats['completed'] else None
+                for key in ('queue_wait_total', 'queue_wait_max', 'inference_total'):
+                    stats[key] = round(stats[key], 3)
+                classes[priority] = stats
+            return {"slots": self.slots, "running": self._running, "queue_depth": self.queue_depth,
+                    "classes": classes}
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission() -> AdmissionController:
+    """Process-wide admission controller shared by every call_llm"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+            _controller.apply_settings(get_settings())
+            on_reload(_controller.apply_settings)
+        return _controller
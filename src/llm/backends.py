@@ -0,0 +1,172 @@
+"""
+Pool of Ollama backends for call_llm
+
+llm.backends lists the Ollama instances to use (comma-separated URLs; empty means just
+llm.base_url). Each request goes to the available backend (circuit closed, last health poll
+not failed) with the lowest score. The score is the number of requests in flight there,
+plus llm.affinity_weight when that backend doesn't have the model loaded. So a backend
+that already holds the model is preferred unless it is busier by more than that weight.
+
+With llm.hedge_after set, an interactive request still unanswered after that many seconds is
+also sent to a second backend, and the first answer wins. The losing request can't be
+cancelled mid-generation: it keeps its backend busy until it finishes, which is the price
+of cutting the tail latency. complete() hands such a request to on_straggler, so call_llm
+keeps its admission slot taken until it is done.
+"""
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from src.utils.logger import get_logger
+from src.utils.settings import get_settings, on_reload
+from src.llm.health import CircuitOpen, OPEN, get_health_monitor
+
+logger = get_logger('ollama backends')
+
+
+def parse_backends(settings) -> list:
+    """Backend URLs from llm.backends, falling back to llm.base_url"""
+    urls = [url.strip().rstrip('/') for url in settings.llm.backends.split(',') if url.strip()]
+    return list(dict.fromkeys(urls)) or [settings.llm.base_url.rstrip('/')]
+
+
+class Backend:
+    def __init__(self, url: str):
+        self.url = url
+        self.monitor = get_health_monitor(url)
+        self.outstanding = 0
+        self.served = {}            # model -> monotonic time of the last response from this backend
+
+    @property
+    def breaker(self):
+        return self.monitor.breaker
+
+    def available(self) -> bool:
+        return self.breaker.state != OPEN and self.monitor.status()['healthy'] is not False
+
+    def has_model(self, model: str, keep_alive: float) -> bool:
+        """Loaded as of the last health poll, or answered by this backend within keep_alive"""
+        if model in self.monitor.status()['loaded']:
+            return True
+        last = self.served.get(model)
+        return last is not None and time.monotonic() - last < keep_alive
+
+
+class BackendPool:
+    def __init__(self, urls: list, affinity_weight: float = 2, hedge_after: float = None):
+        self.backends = [Backend(url) for url in urls]
+        self.affinity_weight = affinity_weight
+        self.hedge_after = hedge_after
+        self._lock = threading.Lock()
+        self._tiebreak = itertools.count()
+        self._hedge_threads = ThreadPoolExecutor(max_workers=8, thread_name_prefix='ollama-hedge')
+
+    def apply_settings(self, settings):
+        urls = parse_backends(settings)
+        with self._lock:
+            existing = {backend.url: backend for backend in self.backends}
+            self.backends = [existing.get(url) or Backend(url) for url in urls]
+        self.affinity_weight = settings.llm.affinity_weight
+        self.hedge_after = settings.llm.hedge_after
+
+    def pick(self, model: str, exclude: tuple = ()):
+        """
+        Least-loaded available backend, counting a missing model as affinity_weight requests
+
+        Raises:
+            CircuitOpen: no backend is available
+        """
+        from src.llm.model_manager import get_model_manager, parse_duration
+
+        keep_alive = parse_duration(get_model_manager().keep_alive)
+        with self._lock:
+            backends = list(self.backends)
+        candidates = [b for b in backends if b not in exclude and b.available()]
+        if not candidates:
+            retry = [b.breaker.status()['retry_in'] for b in backends if b not in exclude]
+            raise CircuitOpen(f'no Ollama backend available ({", ".join(b.url for b in backends)})',
+                              retry_after=min(retry) if retry else None)
+        turn = next(self._tiebreak)
+        with self._lock:
+            # rotating the tie-break spreads equal-score requests instead of always using the first backend
+            return min(candidates, key=lambda b: (
+                b.outstanding + (0 if b.has_model(model, keep_alive) else self.affinity_weight),
+                (backends.index(b) - turn) % len(backends)))
+
+    def _call(self, backend: Backend, fn, model: str):
+        with self._lock:
+            backend.outstanding += 1
+        try:
+            with backend.breaker.guard():
+                result = fn(backend.url)
+            backend.served[model] = time.monotonic()
+            return result
+        finally:
+            with self._lock:
+                backend.outstanding -= 1
+
+    def complete(self, fn, model: str, hedge: bool = False, on_straggler=None):
+        """
+        Run fn(base_url) on the best backend, hedging on a second one if asked and configured
+
+        Args:
+            fn: Makes the request against the given base URL and returns the response
+            model: Model the request uses (for affinity)
+            hedge: Allow a hedged second request after llm.hedge_after seconds
+            on_straggler: Called with the future of a request still running when the other one
+                answered (the hedge loser)
+
+        Returns:
+            tuple: (response, backend URL that answered)
+        """
+        primary = self.pick(model)
+        if not hedge or not self.hedge_after or len(self.backends) < 2:
+            return self._call(primary, fn, model), primary.url
+
+        futures = {self._hedge_threads.submit(self._call, primary, fn, model): primary}
+        done, _ = wait(futures, timeout=self.hedge_after)
+        if not done:
+            try:
+                secondary = self.pick(model, exclude=(primary,))
+            except CircuitOpen:
+                secondary = None
+            if secondary is not None:
+                logger.info(f'no answer from {primary.url} after {self.hedge_after}s, hedging on {secondary.url}')
+                futures[self._hedge_threads.submit(self._call, secondary, fn, model)] = secondary
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if len(futures) > 1:
+                        logger.info(f'hedged request answered by {futures[future].url}')
+                    if on_straggler is not None:
+                        for straggler in pending:
+                            on_straggler(straggler)
+                    return future.result(), futures[future].url
+                error = error or future.exception()
+        raise error
+
+    def status(self) -> dict:
+        with self._lock:
+            backends = list(self.backends)
+            outstanding = {b.url: b.outstanding for b in backends}
+        return {"hedge_after": self.hedge_after, "affinity_weight": self.affinity_weight,
+                "backends": [dict(b.monitor.status(), outstanding=outstanding[b.url]) for b in backends]}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_backend_pool() -> BackendPool:
+    """Process-wide pool of the configured Ollama backends"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            settings = get_settings()
+            _pool = BackendPool(parse_backends(settings), affinity_weight=settings.llm.affinity_weight,
+                                hedge_after=settings.llm.hedge_after)
+            on_reload(_pool.apply_settings)
+        return _pool
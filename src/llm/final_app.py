@@ -1,13 +1,21 @@
-from llama_index.llms.ollama import Ollama
+from src.llm.retrieval import answer_question
 
 
-def generate_insights():
-    model_name = 'llama3.1:8b'
-    question = str(input('write your question here: '))
-    llm = Ollama(model=model_name, request_timeout=120)
-    response = llm.complete(question)
+def generate_insights(question: str = None, top_k: int = None):
+    """answer a free-form question with the most relevant chunks of the processed data"""
+    if question is None:
+        question = str(input('write your question here: '))
+    return answer_question(question, top_k=top_k)
 
-    return response
 
-print(generate_insights())
-print('done')
\ No newline at end of file
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='ask a question about the financial data')
+    parser.add_argument('question', type=str, nargs='?', help='question (asked interactively if omitted)')
+    parser.add_argument('--top-k', type=int, default=None, help='number of data chunks to put in the prompt')
+    args = parser.parse_args()
+
+    result = generate_insights(args.question, top_k=args.top_k)
+    print(result['answer'])
+    print('\nsources:', ', '.join(s['source'] for s in result['sources']))
+    print('done')
@@ -2,8 +2,11 @@ import os
 import logging
 from src.utils.logger import get_logger
 from src.llm.prompt_template2 import build_summary_prompt
-from llama_index.llms.ollama import Ollama
-import pandas as pd
+from src.llm.model_manager import get_model_manager
+from src.llm.router import get_router, truncate_prompt
+from src.llm.admission import get_admission
+from src.llm.backends import get_backend_pool
+from src.utils.settings import get_settings
 import json
 from pathlib import Path
 
@@ -11,16 +14,53 @@ logger = get_logger('generating insights')
 
 response_json_file = Path(__file__).resolve().parent.parent.parent / 'data' / 'outputs' / 'output_data.json'
 
-def call_llm(prompt: str, model: str = "llama3.1:8b") -> dict:
-    logger.info('calling llm model')
-    llm = Ollama(model=model, request_timeout=1800)
-    logger.info('sending prompt to llm')
-    response = llm.complete(prompt)
+def call_llm(prompt: str, model: str = None, num_predict: int = None,
+             task: str = 'synthesis', latency_budget: float = None, timeout: float = None,
+             priority: str = 'interactive') -> dict:
+    logger.info('calling llm model (%s)', priority)
+    # imported here: llama_index takes seconds to import and most importers never call the LLM
+    from llama_index.llms.ollama import Ollama
+    settings = get_settings()
+    if latency_budget is None:
+        latency_budget = settings.llm.latency_budget
+    manager = get_model_manager()
+    router = get_router()
+    # pick the model and size the KV cache from the prompt instead of a fixed context window
+    route = router.route(prompt, task=task, latency_budget=latency_budget, model=model, num_predict=num_predict)
+    if route.max_prompt_tokens < route.prompt_tokens:
+        prompt = truncate_prompt(prompt, route.max_prompt_tokens)
+    if route.degraded:
+        logger.warning('degraded to fit %ss budget: %s', latency_budget, route.degraded)
+    logger.info('task=%s model=%s num_ctx=%s num_predict=%s (estimated %ss)',
+                task, route.model, route.num_ctx, route.num_predict, route.estimated_seconds)
+    pool = get_backend_pool()
+    timeout = timeout or settings.llm.request_timeout
+
+    def complete(base_url: str):
+        llm = Ollama(model=route.model, base_url=base_url, request_timeout=timeout,
+                     context_window=route.num_ctx, additional_kwargs={'num_predict': route.num_predict})
+        return llm.complete(prompt, keep_alive=manager.keep_alive)
+
+    # interactive callers give up on the queue after interactive_timeout instead of piling up behind batch work
+    queue_timeout = settings.llm.interactive_timeout if priority == 'interactive' else None
+    # fail fast while every backend is known to be down, before taking a place in the queue
+    pool.pick(route.model)
+    admission = get_admission()
+    with admission.admit(priority, timeout=queue_timeout) as ticket:
+        logger.info('sending prompt to llm (queued %.2fs)', ticket.queue_wait)
+        # a losing hedge request keeps its backend busy, so it keeps counting against the slots until it ends
+        response, backend = pool.complete(complete, route.model, hedge=priority == 'interactive',
+                                          on_straggler=lambda future: future.add_done_callback(admission.hold(ticket)))
+    logger.info('queue wait %.2fs, inference %.2fs on %s', ticket.queue_wait, ticket.inference, backend)
+    manager.mark_used(route.model)
+    router.record(route.model, getattr(response, 'raw', None))
     response_txt = str(response)
-    logger.info(f'received response: {response_txt}')
+    # the full response can be many KB; log its size at INFO and the text only at DEBUG (size-capped by the handler)
+    logger.info('received response: %d characters', len(response_txt))
+    logger.debug('response text: %s', response_txt)
     return response_txt
 
-def generate_summary(df, rows:int=20, model:str = "llama3.1:8b"):
+def generate_summary(df, rows:int=20, model:str = None):
     csv_snippet = df.head(rows).to_csv(index=False)
     prompt = build_summary_prompt(csv_snippet)
     result = call_llm(prompt=prompt, model=model)
@@ -35,6 +75,7 @@ def generate_summary(df, rows:int=20, model:str = "llama3.1:8b"):
         return {'raw_text':result}
 
 if __name__ == "__main__":
+    import pandas as pd
     logger.info('calling main function')
     test_df = pd.DataFrame({
         'Date': ['2024-01-01', '2024-02-01', '2024-03-01'],
@@ -3,29 +3,36 @@ import logging
 import httpx
 from src.utils.logger import get_logger
 from src.llm.prompt_template2 import build_summary_prompt
-from llama_index.llms.ollama import Ollama
-import pandas as pd
+from src.llm.model_manager import get_model_manager
+from src.llm.admission import get_admission
+from src.llm.health import OPEN
+from src.llm.backends import get_backend_pool
+from src.utils.settings import get_settings
 
 logger = get_logger(__name__)
 
 def check_ollama_running() -> bool:
-    """Check if Ollama service is running"""
-    try:
-        response = httpx.get("http://localhost:11434/api/tags", timeout=5)
-        response.raise_for_status()
+    """Check if any Ollama backend is running (cached by the background health monitors)"""
+    backends = get_backend_pool().backends
+    if any(backend.available() for backend in backends):
         return True
-    except (httpx.ConnectError, httpx.TimeoutException, httpx.HTTPStatusError) as e:
-        logger.error(f"Ollama check failed: {e}")
-        return False
+    # cached as down: look again in case one just came up (repeated failures open its circuit)
+    for backend in backends:
+        if backend.breaker.state != OPEN and backend.monitor.poll()['healthy']:
+            return True
+    errors = '; '.join(f"{backend.url}: {backend.monitor.status()['error']}" for backend in backends)
+    logger.error(f"Ollama check failed: {errors}")
+    return False
 
-def call_llm(prompt: str, model: str = "llama3.1:8b", timeout: int = 300) -> str:
+def call_llm(prompt: str, model: str = None, timeout: int = None, num_predict: int = None) -> str:
     """
     Call Ollama LLM with error handling
     
     Args:
         prompt: The prompt to send
-        model: Model name (default: llama3.1:8b)
-        timeout: Request timeout in seconds (increased to 300 for larger responses)
+        model: Model name (default: llm.model setting, llama3.1:8b)
+        timeout: Request timeout in seconds (default: llm.interactive_timeout setting, 300)
+        num_predict: Max tokens to generate (default: sized by the model manager)
     
     Returns:
         str: LLM response text
@@ -33,6 +40,10 @@ def call_llm(prompt: str, model: str = "llama3.1:8b", timeout: int = 300) -> str
     Raises:
         RuntimeError: If Ollama is not running or other errors occur
     """
+    settings = get_settings()
+    model = model or settings.llm.model
+    timeout = timeout or settings.llm.interactive_timeout
+
     # Check if Ollama is running
     if not check_ollama_running():
         error_msg = (
@@ -47,19 +58,33 @@ def call_llm(prompt: str, model: str = "llama3.1:8b", timeout: int = 300) -> str
         raise RuntimeError(error_msg)
     
     try:
-        logger.info(f'Calling LLM model: {model} with timeout={timeout}s')
-        logger.info(f'Prompt length: {len(prompt)} characters')
-        
-        # Initialize Ollama with increased timeout
-        llm = Ollama(model=model, request_timeout=timeout)
+        logger.info('Calling LLM model: %s with timeout=%ss', model, timeout)
+        logger.info('Prompt length: %d characters', len(prompt))
+        
+        # Initialize Ollama with a context window sized for this prompt
+        from llama_index.llms.ollama import Ollama
+        manager = get_model_manager()
+        options = manager.request_options(prompt, num_predict=num_predict)
+        logger.info('num_ctx=%s num_predict=%s', options['num_ctx'], options['num_predict'])
+
+        def complete(base_url: str):
+            llm = Ollama(model=model, base_url=base_url, request_timeout=timeout,
+                         context_window=options['num_ctx'], additional_kwargs={'num_predict': options['num_predict']})
+            return llm.complete(prompt, keep_alive=manager.keep_alive)
         
-        # Make the request
+        # Make the request (keep_alive keeps the model resident between calls)
         logger.info('Sending request to Ollama...')
-        response = llm.complete(prompt)
+        admission = get_admission()
+        with admission.admit('interactive', timeout=timeout) as ticket:
+            response, backend = get_backend_pool().complete(
+                complete, model, hedge=True,
+                on_straggler=lambda future: future.add_done_callback(admission.hold(ticket)))
+        logger.info('queue wait %.2fs, inference %.2fs on %s', ticket.queue_wait, ticket.inference, backend)
+        manager.mark_used(model)
         
         response_txt = str(response)
-        logger.info(f'✅ Received response: {len(response_txt)} characters')
-        logger.debug(f'Response preview: {response_txt[:200]}...')
+        logger.info('✅ Received response: %d characters', len(response_txt))
+        logger.debug('Response preview: %.200s...', response_txt)
         
         return response_txt
         
@@ -68,7 +93,8 @@ def call_llm(prompt: str, model: str = "llama3.1:8b", timeout: int = 300) -> str
             f"\n❌ Request timed out after {timeout} seconds!\n"
             "Possible solutions:\n"
             "1. Increase timeout (current: {timeout}s)\n"
-            "2. Use a smaller model (e.g., llama3.2:1b)\n"
+            "2. Use a smaller model (e.g., llama3.2:1b) or pass a latency budget to\n"
+            "   src.llm.generate_insights.call_llm so the router picks one for you\n"
             "3. Reduce the amount of data in the prompt\n"
             "4. Check if your system has enough resources"
         )
@@ -96,15 +122,15 @@ def call_llm(prompt: str, model: str = "llama3.1:8b", timeout: int = 300) -> str
         logger.error(f"Unexpected error: {e}")
         raise
 
-def generate_summary(df, rows: int = 20, model: str = "llama3.1:8b", timeout: int = 300) -> str:
+def generate_summary(df, rows: int = 20, model: str = None, timeout: int = None) -> str:
     """
     Generate financial summary from DataFrame
     
     Args:
         df: pandas DataFrame with financial data
         rows: Number of rows to include (default: 20)
-        model: Ollama model name (default: llama3.1:8b)
-        timeout: Request timeout in seconds (default: 300)
+        model: Ollama model name (default: llm.model setting)
+        timeout: Request timeout in seconds (default: llm.interactive_timeout setting)
         
     Returns:
         str: Generated summary from LLM
@@ -130,6 +156,7 @@ def generate_summary(df, rows: int = 20, model: str = "llama3.1:8b", timeout: in
         raise
 
 if __name__ == "__main__":
+    import pandas as pd
     print("\n" + "="*60)
     print("🚀 TESTING OLLAMA LLM INTEGRATION")
     print("="*60 + "\n")
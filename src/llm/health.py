@@ -0,0 +1,235 @@
+"""
+Ollama health monitoring and circuit breaking
+
+A background thread polls /api/tags (installed models) and /api/ps (loaded models) every
+llm.health_interval seconds and caches the result, so status checks read a dict instead of
+making an HTTP request. The circuit breaker counts connection errors and timeouts from both
+the polls and the real LLM calls. After llm.breaker_failures of them in a row it opens, and
+for llm.breaker_cooldown seconds every call fails at once with CircuitOpen. After the
+cooldown one trial call (or a successful poll) decides whether it closes again.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from src.utils.logger import get_logger
+from src.utils.settings import get_settings, on_reload
+
+logger = get_logger('ollama health')
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpen(RuntimeError):
+    """The backend failed repeatedly; calls are refused until the cooldown ends"""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_connection_error(exc: BaseException) -> bool:
+    """Errors that say the backend is down or stuck (not that the request was bad)"""
+    try:
+        import httpx
+        if isinstance(exc, httpx.TransportError):
+            return True
+    except ImportError:
+        pass
+    return isinstance(exc, (ConnectionError, TimeoutError))
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 30):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                return HALF_OPEN
+            return self._state
+
+    def check(self):
+        """Raise CircuitOpen while the cooldown runs, without claiming the half-open trial call"""
+        with self._lock:
+            remaining = self.cooldown - (time.monotonic() - self._opened_at)
+            if self._state == OPEN and remaining > 0:
+                raise CircuitOpen(f'{self.name} is unavailable ({self._failures} failures), '
+                                  f'retrying in {remaining:.0f}s', retry_after=remaining)
+
+    def allow(self):
+        """Raise CircuitOpen unless a call may go through now"""
+        with self._lock:
+            if self._state == CLOSED:
+                return
+        self.check()
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            # cooldown over: let exactly one trial call through
+            if self._trial_running:
+                raise CircuitOpen(f'{self.name} is being re-checked, try again shortly', retry_after=1.0)
+            self._state = HALF_OPEN
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f'{self.name}: circuit closed')
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                logger.warning(f'{self.name}: circuit open for {self.cooldown:.0f}s after {self._failures} failures')
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            elif self._state == OPEN:
+                self._opened_at = time.monotonic()
+
+    @contextmanager
+    def guard(self):
+        """allow() before the call; connection errors/timeouts count as failures, anything else as success"""
+        self.allow()
+        try:
+            yield
+        except BaseException as e:
+            if is_connection_error(e):
+                self.record_failure()
+            else:
+                # the backend answered; a bad request or a parse error says nothing about its health
+                self.record_success()
+            raise
+        self.record_success()
+
+    def status(self) -> dict:
+        state = self.state
+        with self._lock:
+            retry_in = max(0.0, self.cooldown - (time.monotonic() - self._opened_at)) if state == OPEN else 0.0
+            return {"state": state, "failures": self._failures, "retry_in": round(retry_in, 1)}
+
+
+class HealthMonitor:
+    """Polls one Ollama backend in the background and caches its health and model lists"""
+
+    def __init__(self, base_url: str, interval: float = 10, timeout: float = 2,
+                 failure_threshold: int = 3, cooldown: float = 30):
+        self.base_url = base_url.rstrip('/')
+        self.interval = interval
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(f'ollama at {self.base_url}', failure_threshold, cooldown)
+        self._status = {"healthy": None, "checked_at": None, "latency_ms": None,
+                        "models": [], "loaded": [], "error": None}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def apply_settings(self, settings):
+        self.interval = settings.llm.health_interval
+        self.breaker.failure_threshold = max(1, settings.llm.breaker_failures)
+        self.breaker.cooldown = settings.llm.breaker_cooldown
+
+    def poll(self) -> dict:
+        """Check the backend now and update the cached status"""
+        import httpx
+        start = time.perf_counter()
+        status = {"checked_at": time.time()}
+        try:
+            with httpx.Client(base_url=self.base_url, timeout=self.timeout) as client:
+                tags = client.get('/api/tags')
+                tags.raise_for_status()
+                ps = client.get('/api/ps')
+                ps.raise_for_status()
+            status.update(healthy=True, error=None,
+                          latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                          models=[m.get('name') for m in tags.json().get('models', [])],
+                          loaded=[m.get('name') or m.get('model') for m in ps.json().get('models', [])])
+            self.breaker.record_success()
+        except (httpx.HTTPError, OSError, ValueError) as e:
+            status.update(healthy=False, error=f'{type(e).__name__}: {e}', latency_ms=None)
+            if is_connection_error(e):
+                self.breaker.record_failure()
+        with self._lock:
+            was_healthy = self._status['healthy']
+            self._status.update(status)
+        if was_healthy is not status['healthy']:
+            log = logger.info if status['healthy'] else logger.warning
+            log(f"{self.base_url}: {'healthy' if status['healthy'] else 'unhealthy'} {status.get('error') or ''}")
+        return self.status()
+
+    def status(self) -> dict:
+        """Last polled status plus the breaker state; polls once if nothing is cached yet"""
+        with self._lock:
+            cached = dict(self._status)
+        if cached['checked_at'] is None:
+            return self.poll()
+        cached['age'] = round(time.time() - cached['checked_at'], 1)
+        cached['base_url'] = self.base_url
+        cached['circuit'] = self.breaker.status()
+        return cached
+
+    @property
+    def healthy(self) -> bool:
+        """Cached health; False while the circuit is open"""
+        return bool(self.status()['healthy']) and self.breaker.state != OPEN
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f'health poll of {self.base_url} failed: {e}')
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self):
+        """Start polling in a daemon thread (no-op if already running)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='ollama-health', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+_monitors = {}
+_monitor_lock = threading.Lock()
+
+
+def _apply_settings_to_all(settings):
+    with _monitor_lock:
+        monitors = list(_monitors.values())
+    for monitor in monitors:
+        monitor.apply_settings(settings)
+
+
+def get_health_monitor(base_url: str = None, start: bool = True) -> HealthMonitor:
+    """Process-wide monitor for one Ollama backend (default: llm.base_url), polling in the background"""
+    llm = get_settings().llm
+    base_url = (base_url or llm.base_url).rstrip('/')
+    with _monitor_lock:
+        monitor = _monitors.get(base_url)
+        if monitor is None:
+            monitor = HealthMonitor(base_url, interval=llm.health_interval,
+                                    failure_threshold=llm.breaker_failures, cooldown=llm.breaker_cooldown)
+            _monitors[base_url] = monitor
+            on_reload(_apply_settings_to_all)
+        if start:
+            monitor.start()
+        return monitor
@@ -0,0 +1,254 @@
+import threading
+import time
+from src.utils.logger import get_logger
+from src.utils.settings import get_settings, on_reload
+
+logger = get_logger('model manager')
+
+DEFAULT_BASE_URL = 'http://localhost:11434'
+DEFAULT_MODEL = 'llama3.1:8b'
+DEFAULT_KEEP_ALIVE = '30m'
+
+CHARS_PER_TOKEN = 4          # rough estimate for llama tokenizers on English/CSV text
+MIN_NUM_CTX = 2048
+MAX_NUM_CTX = 32768
+DEFAULT_NUM_PREDICT = 1024   # enough for the JSON summary the prompts ask for
+CTX_MARGIN_TOKENS = 128
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used to size the KV cache, no tokenizer needed"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def size_context(prompt: str, num_predict: int = None, max_ctx: int = MAX_NUM_CTX, min_ctx: int = MIN_NUM_CTX) -> dict:
+    """
+    Work out num_ctx / num_predict for a single request from the prompt length
+
+    num_ctx is rounded up to a power of two so requests of similar size share the
+    same value - Ollama reloads the model whenever num_ctx changes, so a handful
+    of buckets is much cheaper than an exact size per request.
+
+    Args:
+        prompt: The prompt that will be sent
+        num_predict: Max tokens to generate (default: DEFAULT_NUM_PREDICT)
+        max_ctx: Upper bound for num_ctx
+        min_ctx: Smallest num_ctx bucket
+
+    Returns:
+        dict: {"num_ctx": int, "num_predict": int, "prompt_tokens": int}
+    """
+    return size_for_tokens(estimate_tokens(prompt), num_predict=num_predict, max_ctx=max_ctx, min_ctx=min_ctx)
+
+
+def size_for_tokens(prompt_tokens: int, num_predict: int = None, max_ctx: int = MAX_NUM_CTX,
+                    min_ctx: int = MIN_NUM_CTX) -> dict:
+    """Same as size_context() for an already estimated prompt token count"""
+    num_predict = num_predict or DEFAULT_NUM_PREDICT
+    needed = prompt_tokens + num_predict + CTX_MARGIN_TOKENS
+    num_ctx = min_ctx
+    while num_ctx < needed and num_ctx < max_ctx:
+        num_ctx *= 2
+    num_ctx = min(num_ctx, max_ctx)
+    if needed > num_ctx:
+        logger.warning('prompt needs ~%d tokens but num_ctx is capped at %d, input will be truncated by Ollama', needed, num_ctx)
+    return {"num_ctx": num_ctx, "num_predict": num_predict, "prompt_tokens": prompt_tokens}
+
+
+def parse_duration(value) -> float:
+    """Seconds for an Ollama-style duration ('30m', '1h', '300s', 600)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip()
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+def available_memory_mb():
+    """Available system memory in MB, or None if it can't be read on this platform"""
+    try:
+        import psutil
+        return psutil.virtual_memory().available / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open('/proc/meminfo', 'r') as file:
+            for line in file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class ModelManager:
+    """
+    Keeps Ollama models warm so requests don't pay the model load time
+
+    - warm(): loads a model and pins it in memory with keep_alive
+    - a background thread refreshes keep_alive for pinned models and, when free
+      memory drops below min_free_memory_mb, unloads models idle for longer
+      than idle_unload_after seconds
+    """
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, keep_alive: str = DEFAULT_KEEP_ALIVE,
+                 refresh_interval: float = 600, idle_unload_after: float = 900,
+                 min_free_memory_mb: float = 2048, max_ctx: int = MAX_NUM_CTX,
+                 min_ctx: int = MIN_NUM_CTX, num_predict: int = DEFAULT_NUM_PREDICT):
+        self.base_url = base_url.rstrip('/')
+        self.keep_alive = keep_alive
+        self.refresh_interval = refresh_interval
+        self.idle_unload_after = idle_unload_after
+        self.min_free_memory_mb = min_free_memory_mb
+        self.max_ctx = max_ctx
+        self.min_ctx = min_ctx
+        self.num_predict = num_predict
+        self._pinned = set()
+        self._last_used = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _post_generate(self, payload: dict, timeout: float) -> bool:
+        import httpx
+        try:
+            response = httpx.post(f'{self.base_url}/api/generate', json=payload, timeout=timeout)
+            response.raise_for_status()
+            return True
+        except (httpx.HTTPError, OSError) as e:
+            logger.warning(f"Ollama request for {payload.get('model')} failed: {e}")
+            return False
+
+    def warm(self, model: str, pin: bool = True, timeout: float = 600) -> bool:
+        """Load a model (empty prompt) and keep it resident for keep_alive"""
+        logger.info(f'warming model {model} (keep_alive={self.keep_alive})')
+        start = time.perf_counter()
+        ok = self._post_generate({"model": model, "keep_alive": self.keep_alive}, timeout=timeout)
+        if ok:
+            with self._lock:
+                if pin:
+                    self._pinned.add(model)
+                self._last_used[model] = time.monotonic()
+            logger.info(f'model {model} warm in {time.perf_counter() - start:.1f}s')
+        return ok
+
+    def unload(self, model: str) -> bool:
+        """Ask Ollama to drop a model from memory right away"""
+        logger.info(f'unloading model {model}')
+        ok = self._post_generate({"model": model, "keep_alive": 0}, timeout=30)
+        if ok:
+            with self._lock:
+                self._pinned.discard(model)
+                self._last_used.pop(model, None)
+        return ok
+
+    def loaded_models(self) -> list:
+        """Models currently resident in Ollama (GET /api/ps)"""
+        import httpx
+        try:
+            response = httpx.get(f'{self.base_url}/api/ps', timeout=5)
+            response.raise_for_status()
+            return response.json().get('models', [])
+        except (httpx.HTTPError, OSError, ValueError) as e:
+            logger.warning(f'could not list loaded models: {e}')
+            return []
+
+    def mark_used(self, model: str):
+        with self._lock:
+            self._last_used[model] = time.monotonic()
+
+    def is_warm(self, model: str) -> bool:
+        """True if we used/warmed the model recently enough that keep_alive still holds it"""
+        with self._lock:
+            last = self._last_used.get(model)
+        return last is not None and time.monotonic() - last < parse_duration(self.keep_alive)
+
+    def request_options(self, prompt: str, num_predict: int = None) -> dict:
+        return size_context(prompt, num_predict=num_predict or self.num_predict,
+                            max_ctx=self.max_ctx, min_ctx=self.min_ctx)
+
+    def apply_settings(self, settings):
+        """Pick up llm/token settings (called on start-up and on settings reload)"""
+        self.base_url = settings.llm.base_url.rstrip('/')
+        self.keep_alive = settings.llm.keep_alive
+        self.min_ctx = settings.tokens.min_num_ctx
+        self.max_ctx = settings.tokens.max_num_ctx
+        self.num_predict = settings.tokens.num_predict
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "base_url": self.base_url,
+                "keep_alive": self.keep_alive,
+                "pinned": sorted(self._pinned),
+                "idle_seconds": {m: round(now - t, 1) for m, t in self._last_used.items()},
+            }
+
+    def unload_idle(self):
+        """Unload idle models when the machine is short on memory"""
+        free_mb = available_memory_mb()
+        if free_mb is None or free_mb >= self.min_free_memory_mb:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            last_used = dict(self._last_used)
+            pinned = set(self._pinned)
+        loaded = [m.get('name') or m.get('model') for m in self.loaded_models()]
+        # models we never used count as idle; pinned ones stay loaded (the refresh would reload them anyway)
+        idle = [m for m in loaded
+                if m not in pinned and now - last_used.get(m, float('-inf')) > self.idle_unload_after]
+        unloaded = []
+        for model in idle:
+            logger.info(f'memory pressure ({free_mb:.0f} MB free), unloading idle model {model}')
+            if self.unload(model):
+                unloaded.append(model)
+        return unloaded
+
+    def _refresh_pinned(self):
+        with self._lock:
+            pinned = list(self._pinned)
+        for model in pinned:
+            self._post_generate({"model": model, "keep_alive": self.keep_alive}, timeout=600)
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            self.unload_idle()
+            self._refresh_pinned()
+
+    def start(self, models: list = None):
+        """Warm the given models and start the keep-alive/eviction thread (non-blocking)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def _warm_then_run():
+            for model in models or []:
+                self.warm(model)
+            self._run()
+
+        self._thread = threading.Thread(target=_warm_then_run, name='ollama-model-manager', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_model_manager() -> ModelManager:
+    """Process-wide ModelManager shared by call_llm and the API"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ModelManager()
+            _manager.apply_settings(get_settings())
+            on_reload(_manager.apply_settings)
+        return _manager
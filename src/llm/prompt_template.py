@@ -1,7 +1,4 @@
-from langchain_core.prompts import PromptTemplate
-
-prompt = PromptTemplate(
-    template = """
+PROMPT_TEXT = """
 You are a financial analyst. Analyze the following company metrics:
 
 {data}
@@ -13,6 +10,21 @@ Generate:
 4. Summary in bullet points
 
 Output must be structured JSON.
-""", input_variables=['data'], validate_template=True)
+"""
+
+
+def build_prompt(data: str) -> str:
+    """plain string formatting, no langchain import needed"""
+    return PROMPT_TEXT.format(data=data)
+
+
+def __getattr__(name):
+    # the langchain PromptTemplate is only built (and langchain imported) when someone asks for it
+    if name == 'prompt':
+        from langchain_core.prompts import PromptTemplate
+        template = PromptTemplate(template=PROMPT_TEXT, input_variables=['data'], validate_template=True)
+        globals()['prompt'] = template
+        return template
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # print(prompt)
\ No newline at end of file
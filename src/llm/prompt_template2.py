@@ -1,3 +1,4 @@
+import json
 from typing import Dict
 
 SUMMARY_PROMPT = """
@@ -12,13 +13,79 @@ Data:
 {data_table}
 
 
-Respond in JSON with fields: executive_summary, risks (list), opportunities (list), actions (list of objects with title and rationale).
+Respond in JSON with fields: executive_summary, risks (list), opportunities (list), actions (list of objects with title and rationale){extra_fields}.
 """
 
 PROMPT_TEMPLATE_SHORT = SUMMARY_PROMPT
 
-def build_summary_prompt(table_csv: str) -> str:
-    return PROMPT_TEMPLATE_SHORT.format(data_table=table_csv)
+CROSS_SHEET_SECTION = """
+Cross-sheet metrics (already computed from the full P&L, Cashflow and KPI sheets aligned on Date; use these instead of correlating the sheets yourself):
+{cross_sheet}
+"""
+
+SHEET_DIGEST_PROMPT = """
+You are a financial analyst. Summarize the sheet "{sheet_name}" below in at most 6 bullet points.
+Cover the trend of each key metric, notable highs/lows with their dates, and anything unusual.
+Use numbers from the data, no preamble.
+
+
+Data:
+{data_table}
+"""
+
+QUESTION_PROMPT = """
+You are a financial analyst. Answer the question using only the data excerpts below.
+Quote the figures and dates you rely on. If the excerpts do not contain the answer, say so.
+
+
+Data excerpts:
+{excerpts}
+
+
+Question: {question}
+"""
+
+UPDATE_PROMPT = """
+You are a helpful financial analyst. Update an existing analysis with a new period of data.
+
+Existing analysis (covers {covered_start} to {covered_end}):
+{previous}
+
+New period {start} to {end}: metrics whose average moved by {min_change:g}% or more against the same number of rows before it (the others held steady):
+{changes}
+
+Rewrite the analysis so it covers {covered_start} to {end}:
+- executive_summary: 3 sentences, reflecting the latest period
+- risks and opportunities: the top 3 overall; drop items the new period resolves, add new ones that outweigh them
+- actions: two strategic actions with rationale
+Keep the other fields unless the new period contradicts them.
+
+Respond in JSON with the same fields as the existing analysis: {fields}.
+"""
+
+def build_summary_prompt(table_csv: str, cross_sheet: str = None) -> str:
+    """summary prompt; with cross_sheet metrics the model is also asked for cross_sheet_insights"""
+    if cross_sheet:
+        data_table = table_csv + "\n" + CROSS_SHEET_SECTION.format(cross_sheet=cross_sheet)
+        extra_fields = ", cross_sheet_insights (2-3 sentences on how profit, cash flow and KPIs relate)"
+    else:
+        data_table, extra_fields = table_csv, ""
+    return PROMPT_TEMPLATE_SHORT.format(data_table=data_table, extra_fields=extra_fields)
+
+def build_digest_prompt(sheet_name: str, table_csv: str) -> str:
+    """prompt for a short per-sheet digest, cheap enough for the small model"""
+    return SHEET_DIGEST_PROMPT.format(sheet_name=sheet_name, data_table=table_csv)
+
+def build_question_prompt(question: str, excerpts: list) -> str:
+    """prompt for an ad-hoc question over retrieved chunks"""
+    return QUESTION_PROMPT.format(question=question, excerpts='\n---\n'.join(excerpts) or '(no matching data)')
+
+def build_update_prompt(previous: dict, changes: str, covered_start: str, covered_end: str, start: str, end: str,
+                        min_change: float) -> str:
+    """prompt folding a new period's changed metrics into the stored analysis (incremental mode), keeping its fields"""
+    return UPDATE_PROMPT.format(previous=json.dumps(previous, ensure_ascii=False, separators=(',', ':')), changes=changes,
+                                covered_start=covered_start, covered_end=covered_end, start=start, end=end,
+                                min_change=min_change, fields=', '.join(previous))
 
 
 # for testing
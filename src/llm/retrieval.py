@@ -0,0 +1,394 @@
+"""
+Local retrieval index for ad-hoc questions about the financial data
+
+Processed sheets are cut into small row-range chunks (plus monthly overview chunks
+per sheet and year), LLM summaries/digests into paragraphs. Chunks are embedded with a local
+sentence-transformers model when it is installed and already downloaded, otherwise with
+hashed TF-IDF vectors that need nothing but NumPy (kept sparse: a chunk touches a few
+hundred of the HASH_DIM buckets). Embeddings are cached on disk by chunk hash, so re-indexing
+after a data change only embeds the chunks that changed, and an index whose source files
+haven't changed isn't rebuilt at all.
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+import numpy as np
+from src.utils.logger import get_logger
+from src.utils.settings import get_settings, resolve_path
+from src.utils.hashing import text_hash
+
+logger = get_logger('retrieval')
+
+HASH_DIM = 2 ** 14
+MONTHS = {name: f'{i:02d}' for i, name in enumerate(
+    ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august',
+     'september', 'october', 'november', 'december'], 1)}
+TOKEN_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}|\d{4}-\d{2}|[a-z]+(?:_[a-z]+)*|\d{4}')
+MONTH_YEAR_PATTERN = re.compile(r'\b(' + '|'.join(MONTHS) + r')\s+(\d{4})\b')
+
+
+def tokenize(text: str) -> list:
+    """Lowercase words plus date tokens; a date also yields its year and year-month"""
+    text = MONTH_YEAR_PATTERN.sub(lambda m: f'{m.group(2)}-{MONTHS[m.group(1)]}', text.lower())
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text):
+        tokens.append(token)
+        if '-' in token:
+            tokens.append(token[:4])
+            if len(token) == 10:
+                tokens.append(token[:7])
+        elif '_' in token:
+            # Net_Income should also match "net income"
+            tokens.extend(token.split('_'))
+    return tokens
+
+
+class HashingEmbedder:
+    """
+    Offline fallback: term counts hashed into HASH_DIM buckets, IDF applied at search time
+
+    Vectors are sparse (bucket indices, weights) pairs; a dense row would be 64 KB per chunk.
+    """
+
+    name = f'hashing-{HASH_DIM}'
+    uses_idf = True
+    sparse = True
+
+    def embed(self, texts: list) -> list:
+        vectors = []
+        for text in texts:
+            weights = Counter()
+            for token, count in Counter(tokenize(text)).items():
+                # sublinear tf, so a chunk repeating "Revenue" 30 times isn't 30x more relevant
+                weights[int(text_hash(token)[:8], 16) % HASH_DIM] += 1 + np.log(count)
+            buckets = np.array(sorted(weights), dtype=np.int32)
+            vectors.append((buckets, np.array([weights[b] for b in buckets], dtype=np.float32)))
+        return vectors
+
+
+class SentenceTransformerEmbedder:
+    """Local embedding model; only used if the weights are already on disk (never downloads)"""
+
+    uses_idf = False
+    sparse = False
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, local_files_only=True)
+        self.name = f"st-{model_name.replace('/', '_')}"
+
+    def embed(self, texts: list) -> np.ndarray:
+        return self.model.encode(texts, batch_size=32, normalize_embeddings=True,
+                                 show_progress_bar=False).astype(np.float32)
+
+
+def get_embedder():
+    """sentence-transformers model from settings if available locally, else the hashing embedder"""
+    model_name = get_settings().retrieval.embedding_model
+    if model_name:
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except Exception as e:
+            logger.info(f'embedding model {model_name} not available ({type(e).__name__}), using hashed TF-IDF')
+    return HashingEmbedder()
+
+
+def chunk_sheet(sheet_name: str, df, rows_per_chunk: int = 30) -> list:
+    """
+    Row-range chunks of one sheet, each carrying the sheet name, row span and date span,
+    plus monthly overview chunks (one per year) when the sheet has a date column
+
+    Returns:
+        list: {"source", "text"} dicts
+    """
+    import pandas as pd
+    from src.preprocessing.cross_sheet import find_date_column
+
+    chunks = []
+    date_col = find_date_column(df)
+    for start in range(0, len(df), rows_per_chunk):
+        part = df.iloc[start:start + rows_per_chunk]
+        span = ''
+        if date_col is not None:
+            span = f', {part[date_col].iloc[0]} to {part[date_col].iloc[-1]}'
+        header = f'Sheet: {sheet_name}, rows {start + 1}-{start + len(part)}{span}'
+        chunks.append({"source": f'{sheet_name}:{start + 1}', "text": header + '\n' + part.to_csv(index=False)})
+
+    if date_col is not None:
+        numeric = df.select_dtypes(include='number').set_index(pd.to_datetime(df[date_col], errors='coerce'))
+        monthly = numeric[numeric.index.notna()].resample('MS').agg(['sum', 'mean']).round(2)
+        if not monthly.empty:
+            monthly.columns = [f'{col}_{agg}' for col, agg in monthly.columns]
+            monthly.index = monthly.index.strftime('%Y-%m')
+            # one chunk per year keeps overview chunks about the size of the row chunks
+            for year, group in monthly.groupby(monthly.index.str[:4]):
+                chunks.append({"source": f'{sheet_name}:monthly:{year}',
+                               "text": f'Sheet: {sheet_name}, monthly totals and averages for {year}\n'
+                                       + group.to_csv(index_label='Month')})
+    return chunks
+
+
+def chunk_text(source: str, text: str, max_chars: int = 1500) -> list:
+    """Split summaries/digests on blank lines into chunks of at most ~max_chars"""
+    chunks, current = [], ''
+    for paragraph in re.split(r'\n\s*\n', text):
+        if current and len(current) + len(paragraph) > max_chars:
+            chunks.append(current)
+            current = ''
+        current = f'{current}\n\n{paragraph}' if current else paragraph
+    if current.strip():
+        chunks.append(current)
+    return [{"source": f'{source}:{i + 1}', "text": chunk} for i, chunk in enumerate(chunks)]
+
+
+OUTPUT_DOCUMENTS = ('llm_output.json', 'sheet_digests.json')
+
+
+def _source_dirs(processed_dir: Path = None, outputs_dir: Path = None) -> tuple:
+    settings = get_settings()
+    return (Path(processed_dir) if processed_dir else resolve_path(settings.paths.processed_dir),
+            Path(outputs_dir) if outputs_dir else resolve_path(settings.paths.outputs_dir))
+
+
+def source_versions(processed_dir: Path = None, outputs_dir: Path = None) -> str:
+    """Key of the files collect_documents reads (paths, sizes, mtimes) and the chunking settings"""
+    from src.ingestion.load_data2 import list_processed
+
+    processed_dir, outputs_dir = _source_dirs(processed_dir, outputs_dir)
+    paths = list_processed(processed_dir) if processed_dir.exists() else []
+    paths += [outputs_dir / name for name in OUTPUT_DOCUMENTS if (outputs_dir / name).exists()]
+    stats = [(str(path), path.stat().st_size, path.stat().st_mtime_ns) for path in paths]
+    return text_hash('documents', get_settings().retrieval.chunk_rows, stats)
+
+
+def collect_documents(processed_dir: Path = None, outputs_dir: Path = None) -> list:
+    """Chunks for every processed sheet plus the saved LLM summary and sheet digests"""
+    from src.ingestion.load_data2 import list_processed, read_sheet, sheet_stem
+
+    settings = get_settings()
+    processed_dir, outputs_dir = _source_dirs(processed_dir, outputs_dir)
+    chunks = []
+    for path in list_processed(processed_dir):
+        chunks.extend(chunk_sheet(sheet_stem(path), read_sheet(path), settings.retrieval.chunk_rows))
+    for name in OUTPUT_DOCUMENTS:
+        path = outputs_dir / name
+        if not path.exists():
+            continue
+        with open(path, 'r', encoding='utf-8') as file:
+            content = json.load(file)
+        if isinstance(content, dict) and all(isinstance(v, str) for v in content.values()):
+            text = '\n\n'.join(f'{key}: {value}' for key, value in content.items())
+        else:
+            text = json.dumps(content, indent=2, ensure_ascii=False)
+        chunks.extend(chunk_text(path.stem, text))
+    return chunks
+
+
+class RetrievalIndex:
+    """
+    On-disk vector index under <cache dir>/retrieval/<embedder name>/
+
+    chunks.json holds the current chunks, embeddings.npz their embeddings keyed by chunk
+    hash (sparse embedders store indptr/indices/values instead of a dense matrix), and
+    sources.json the source_versions() key the chunks were built from.
+    """
+
+    def __init__(self, embedder=None, index_dir: Path = None):
+        self.embedder = embedder or get_embedder()
+        self.index_dir = Path(index_dir) if index_dir else \
+            resolve_path(get_settings().cache.dir) / 'retrieval' / self.embedder.name
+        self.chunks = []
+        self.sources = None
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self._idf = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        chunks_path = self.index_dir / 'chunks.json'
+        embeddings_path = self.index_dir / 'embeddings.npz'
+        if not (chunks_path.exists() and embeddings_path.exists()):
+            return
+        with open(chunks_path, 'r', encoding='utf-8') as file:
+            chunks = json.load(file)
+        cache = self._read_embeddings(embeddings_path)
+        if all(c['hash'] in cache for c in chunks):
+            self._set(chunks, cache)
+            sources_path = self.index_dir / 'sources.json'
+            if sources_path.exists():
+                self.sources = json.loads(sources_path.read_text(encoding='utf-8'))
+
+    def _read_embeddings(self, path: Path) -> dict:
+        if not path.exists():
+            return {}
+        with np.load(path) as data:
+            hashes = data['hashes'].tolist()
+            if not getattr(self.embedder, 'sparse', False):
+                return dict(zip(hashes, data['vectors']))
+            if 'indptr' not in data:
+                # dense file from before vectors were sparse: embed again
+                return {}
+            indptr, indices, values = data['indptr'], data['indices'], data['values']
+        return {h: (indices[indptr[i]:indptr[i + 1]], values[indptr[i]:indptr[i + 1]]) for i, h in enumerate(hashes)}
+
+    def _write_embeddings(self, path: Path, cache: dict):
+        tmp_embeddings = path.with_name('embeddings.tmp.npz')
+        hashes = np.array(list(cache), dtype=str)
+        if getattr(self.embedder, 'sparse', False):
+            rows = list(cache.values())
+            indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+            indptr[1:] = np.cumsum([len(indices) for indices, _ in rows])
+            np.savez(tmp_embeddings, hashes=hashes, indptr=indptr,
+                     indices=np.concatenate([r[0] for r in rows]) if rows else np.zeros(0, dtype=np.int32),
+                     values=np.concatenate([r[1] for r in rows]) if rows else np.zeros(0, dtype=np.float32))
+        else:
+            np.savez(tmp_embeddings, hashes=hashes,
+                     vectors=np.stack(list(cache.values())) if cache else np.zeros((0, 0), dtype=np.float32))
+        os.replace(tmp_embeddings, path)
+
+    def _set(self, chunks: list, cache: dict):
+        self.chunks = chunks
+        self._idf = None
+        if not getattr(self.embedder, 'sparse', False):
+            self.vectors = np.stack([cache[c['hash']] for c in chunks]) if chunks else np.zeros((0, 0), dtype=np.float32)
+            return
+        # nonzeros sorted by bucket, so a query reads only the buckets it has
+        rows = [cache[c['hash']] for c in chunks]
+        row_ids = np.repeat(np.arange(len(rows)), [len(indices) for indices, _ in rows])
+        buckets = np.concatenate([r[0] for r in rows]) if rows else np.zeros(0, dtype=np.int32)
+        values = np.concatenate([r[1] for r in rows]) if rows else np.zeros(0, dtype=np.float32)
+        order = np.argsort(buckets, kind='stable')
+        self._rows, self._buckets, self._values = row_ids[order], buckets[order], values[order]
+        doc_freq = np.bincount(buckets, minlength=HASH_DIM)
+        self._idf = np.log((1 + len(chunks)) / (1 + doc_freq)).astype(np.float32) + 1
+        self._norms = np.sqrt(np.bincount(self._rows, weights=(self._values * self._idf[self._buckets]) ** 2,
+                                          minlength=len(chunks)))
+
+    def update(self, documents: list, sources: str = None) -> dict:
+        """
+        Make the index hold exactly `documents`, embedding only chunks not seen before
+
+        Args:
+            documents: {"source", "text"} dicts, e.g. from collect_documents()
+            sources: source_versions() key of the documents, lets get_index skip unchanged data
+
+        Returns:
+            dict: chunk counts (total, embedded, reused)
+        """
+        with self._lock:
+            embeddings_path = self.index_dir / 'embeddings.npz'
+            cache = self._read_embeddings(embeddings_path)
+            chunks = [dict(doc, hash=text_hash(self.embedder.name, doc['text'])) for doc in documents]
+            missing = list({c['hash']: c for c in chunks if c['hash'] not in cache}.values())
+            if missing:
+                logger.info(f'embedding {len(missing)} new chunks with {self.embedder.name}')
+                for chunk, vector in zip(missing, self.embedder.embed([c['text'] for c in missing])):
+                    cache[chunk['hash']] = vector
+            current = {c['hash'] for c in chunks}
+            stale = len(cache) != len(current)
+            cache = {h: v for h, v in cache.items() if h in current}
+
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            # embeddings only change when a chunk was added or removed
+            if missing or stale or not embeddings_path.exists():
+                self._write_embeddings(embeddings_path, cache)
+            if chunks != self.chunks:
+                tmp_chunks = self.index_dir / 'chunks.tmp.json'
+                with open(tmp_chunks, 'w', encoding='utf-8') as file:
+                    json.dump(chunks, file)
+                os.replace(tmp_chunks, self.index_dir / 'chunks.json')
+            if sources is not None:
+                (self.index_dir / 'sources.json').write_text(json.dumps(sources), encoding='utf-8')
+            self._set(chunks, cache)
+            self.sources = sources
+        return {"total": len(chunks), "embedded": len(missing), "reused": len(chunks) - len(missing)}
+
+    def search(self, query: str, top_k: int = 5) -> list:
+        """
+        The top_k chunks most similar to the query (cosine similarity)
+
+        Returns:
+            list: chunk dicts with an added "score", best first
+        """
+        if not self.chunks:
+            return []
+        if getattr(self.embedder, 'sparse', False):
+            scores = self._sparse_scores(*self.embedder.embed([query])[0])
+        else:
+            query_vector = self.embedder.embed([query])[0]
+            norms = np.linalg.norm(self.vectors, axis=1) * (np.linalg.norm(query_vector) or 1)
+            scores = (self.vectors @ query_vector) / np.where(norms == 0, 1, norms)
+        top = np.argsort(-scores)[:top_k]
+        return [dict(self.chunks[i], score=round(float(scores[i]), 4)) for i in top if scores[i] > 0]
+
+    def _sparse_scores(self, query_buckets: np.ndarray, query_values: np.ndarray) -> np.ndarray:
+        """Cosine similarity of the IDF-weighted query against every chunk, touching only the query's buckets"""
+        query_weights = query_values * self._idf[query_buckets]
+        starts = np.searchsorted(self._buckets, query_buckets, side='left')
+        ends = np.searchsorted(self._buckets, query_buckets, side='right')
+        picks = [np.arange(start, end) for start, end in zip(starts, ends)]
+        if not picks:
+            return np.zeros(len(self.chunks))
+        picked = np.concatenate(picks)
+        weights = np.repeat(query_weights * self._idf[query_buckets], ends - starts) * self._values[picked]
+        dots = np.bincount(self._rows[picked], weights=weights, minlength=len(self.chunks))
+        norms = self._norms * (np.linalg.norm(query_weights) or 1)
+        return dots / np.where(norms == 0, 1, norms)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index(refresh: bool = True) -> RetrievalIndex:
+    """
+    Process-wide index; refresh=True brings it up to date with the data first
+
+    The refresh is skipped when no processed sheet or saved summary changed (by size and
+    mtime) since the index was built, so a question doesn't re-read every sheet.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = RetrievalIndex()
+    if refresh:
+        sources = source_versions()
+        if sources == _index.sources:
+            return _index
+        stats = _index.update(collect_documents(), sources=sources)
+        logger.info(f"retrieval index: {stats['total']} chunks ({stats['embedded']} embedded, {stats['reused']} cached)")
+    return _index
+
+
+def answer_question(question: str, top_k: int = None, model: str = None) -> dict:
+    """
+    Answer a free-form question from the top_k most relevant chunks of the data
+
+    Returns:
+        dict: answer text and the sources used
+    """
+    from src.llm.generate_insights import call_llm
+    from src.llm.prompt_template2 import build_question_prompt
+
+    settings = get_settings()
+    hits = get_index().search(question, top_k or settings.retrieval.top_k)
+    logger.info(f"retrieved {len(hits)} chunks: {[h['source'] for h in hits]}")
+    prompt = build_question_prompt(question, [h['text'] for h in hits])
+    answer = call_llm(prompt=prompt, model=model, task='synthesis', timeout=settings.llm.interactive_timeout)
+    return {"answer": answer, "sources": [{"source": h['source'], "score": h['score']} for h in hits]}
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='build the retrieval index and show the chunks a question retrieves')
+    parser.add_argument('question', type=str, nargs='?', help='question to search for (omit to only index)')
+    parser.add_argument('--top-k', type=int, default=None)
+    args = parser.parse_args()
+
+    index = get_index()
+    if args.question:
+        for hit in index.search(args.question, args.top_k or get_settings().retrieval.top_k):
+            print(f"[{hit['score']}] {hit['source']}\n{hit['text'][:300]}\n")
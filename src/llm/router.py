@@ -0,0 +1,190 @@
+import threading
+from dataclasses import dataclass, field
+from src.utils.logger import get_logger
+from src.llm.model_manager import get_model_manager, size_for_tokens, estimate_tokens, CHARS_PER_TOKEN
+from src.utils.settings import get_settings, on_reload
+
+logger = get_logger('model router')
+
+LARGE_MODEL = 'llama3.1:8b'
+SMALL_MODEL = 'llama3.2:1b'
+
+# which model each kind of call should start from
+TASK_MODELS = {
+    'test': SMALL_MODEL,
+    'digest': SMALL_MODEL,      # per-sheet digests
+    'draft': SMALL_MODEL,       # section drafts
+    'synthesis': LARGE_MODEL,   # final multi-sheet summary
+}
+
+# largest -> smallest, degradation walks down this list
+MODEL_LADDER = [LARGE_MODEL, SMALL_MODEL]
+
+# starting throughput guesses (CPU-class box), replaced by measurements as calls complete
+DEFAULT_SPEEDS = {
+    LARGE_MODEL: {'prompt_tps': 150.0, 'gen_tps': 8.0, 'load_s': 20.0},
+    SMALL_MODEL: {'prompt_tps': 800.0, 'gen_tps': 40.0, 'load_s': 4.0},
+}
+UNKNOWN_MODEL_SPEED = {'prompt_tps': 150.0, 'gen_tps': 8.0, 'load_s': 20.0}
+
+EWMA_ALPHA = 0.3
+MIN_KEEP_RATIO = 0.5        # never cut the prompt below half its size to meet a budget
+TAIL_CHARS = 600            # output-format instructions live at the end of our prompts
+
+
+@dataclass
+class RouteDecision:
+    model: str
+    num_ctx: int
+    num_predict: int
+    prompt_tokens: int
+    max_prompt_tokens: int
+    estimated_seconds: float
+    degraded: list = field(default_factory=list)
+
+
+def truncate_prompt(prompt: str, max_tokens: int) -> str:
+    """
+    Shorten a prompt to about max_tokens by cutting the middle (the data table)
+
+    The instructions at the top and the response format at the bottom are kept.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(prompt) <= max_chars:
+        return prompt
+    tail = prompt[-TAIL_CHARS:] if len(prompt) > TAIL_CHARS else ''
+    head = prompt[:max(max_chars - len(tail), 0)]
+    omitted = len(prompt) - len(head) - len(tail)
+    return f"{head}\n... [{omitted} characters omitted to fit the latency budget] ...\n{tail}"
+
+
+class ModelRouter:
+    """
+    Picks a model and context size for each LLM call
+
+    Cheap tasks start on the small model, synthesis starts on the large one.
+    With a latency budget the router first walks down to smaller models and then
+    shortens the prompt until the estimated latency fits.
+    """
+
+    def __init__(self, task_models: dict = None, ladder: list = None, speeds: dict = None):
+        self.task_models = dict(task_models or TASK_MODELS)
+        self.ladder = list(ladder or MODEL_LADDER)
+        self._speeds = {m: dict(v) for m, v in (speeds or DEFAULT_SPEEDS).items()}
+        self._lock = threading.Lock()
+
+    def apply_settings(self, settings):
+        """Map task tiers onto the configured small/large models"""
+        large, small = settings.llm.model, settings.llm.small_model
+        self.task_models = {task: (small if model == SMALL_MODEL else large)
+                            for task, model in TASK_MODELS.items()}
+        self.ladder = [large] if large == small else [large, small]
+
+    def _speed(self, model: str) -> dict:
+        with self._lock:
+            return dict(self._speeds.get(model, UNKNOWN_MODEL_SPEED))
+
+    def estimate(self, model: str, prompt_tokens: int, num_predict: int) -> float:
+        """Estimated wall-clock seconds for a call (load + prompt eval + generation)"""
+        speed = self._speed(model)
+        load = 0.0 if get_model_manager().is_warm(model) else speed['load_s']
+        return load + prompt_tokens / speed['prompt_tps'] + num_predict / speed['gen_tps']
+
+    def record(self, model: str, raw: dict):
+        """Update throughput estimates from Ollama's response timings (durations are in ns)"""
+        if not raw:
+            return
+        with self._lock:
+            speed = self._speeds.setdefault(model, dict(UNKNOWN_MODEL_SPEED))
+            observations = (
+                ('prompt_tps', raw.get('prompt_eval_count'), raw.get('prompt_eval_duration')),
+                ('gen_tps', raw.get('eval_count'), raw.get('eval_duration')),
+            )
+            for key, count, duration in observations:
+                if count and duration:
+                    measured = count / (duration / 1e9)
+                    speed[key] = (1 - EWMA_ALPHA) * speed[key] + EWMA_ALPHA * measured
+            load_ns = raw.get('load_duration')
+            if load_ns and load_ns > 1e9:   # sub-second loads mean the model was already resident
+                speed['load_s'] = (1 - EWMA_ALPHA) * speed['load_s'] + EWMA_ALPHA * load_ns / 1e9
+
+    def _candidates(self, task: str, model: str = None) -> list:
+        start = model or self.task_models.get(task, self.ladder[0])
+        if start not in self.ladder:
+            return [start]
+        return self.ladder[self.ladder.index(start):]
+
+    def _max_prompt_tokens(self, model: str, budget: float, num_predict: int) -> int:
+        speed = self._speed(model)
+        load = 0.0 if get_model_manager().is_warm(model) else speed['load_s']
+        spare = budget - load - num_predict / speed['gen_tps']
+        return int(spare * speed['prompt_tps']) if spare > 0 else 0
+
+    def route(self, prompt: str, task: str = 'synthesis', latency_budget: float = None,
+              model: str = None, num_predict: int = None) -> RouteDecision:
+        """
+        Choose model/num_ctx for a prompt
+
+        Args:
+            prompt: The prompt to send
+            task: One of TASK_MODELS ('test', 'digest', 'draft', 'synthesis')
+            latency_budget: Seconds the caller is willing to wait (None = no limit)
+            model: Start from this model instead of the task default
+            num_predict: Max tokens to generate
+
+        Returns:
+            RouteDecision: chosen model and sizing; max_prompt_tokens < prompt_tokens
+            means the prompt has to be truncated with truncate_prompt()
+        """
+        manager = get_model_manager()
+        prompt_tokens = estimate_tokens(prompt)
+        candidates = self._candidates(task, model)
+        num_predict = num_predict or manager.num_predict
+
+        def decision(name, max_tokens, degraded):
+            sized = size_for_tokens(min(prompt_tokens, max_tokens), num_predict=num_predict,
+                                    max_ctx=manager.max_ctx, min_ctx=manager.min_ctx)
+            estimated = self.estimate(name, sized['prompt_tokens'], num_predict)
+            return RouteDecision(model=name, num_ctx=sized['num_ctx'], num_predict=sized['num_predict'],
+                                 prompt_tokens=prompt_tokens, max_prompt_tokens=max_tokens,
+                                 estimated_seconds=round(estimated, 1), degraded=degraded)
+
+        if latency_budget is None:
+            return decision(candidates[0], prompt_tokens, [])
+
+        # pass 1: full prompt, walking down to smaller models
+        for name in candidates:
+            if self.estimate(name, prompt_tokens, num_predict) <= latency_budget:
+                degraded = [f'model {candidates[0]} -> {name}'] if name != candidates[0] else []
+                return decision(name, prompt_tokens, degraded)
+
+        # pass 2: shorter context, as long as we keep most of the data
+        for name in candidates:
+            max_tokens = self._max_prompt_tokens(name, latency_budget, num_predict)
+            if max_tokens >= prompt_tokens * MIN_KEEP_RATIO:
+                degraded = [f'context {prompt_tokens} -> {max_tokens} tokens']
+                if name != candidates[0]:
+                    degraded.insert(0, f'model {candidates[0]} -> {name}')
+                return decision(name, max_tokens, degraded)
+
+        # nothing fits: smallest model, shortest context we allow
+        name = candidates[-1]
+        max_tokens = int(prompt_tokens * MIN_KEEP_RATIO)
+        logger.warning(f'latency budget {latency_budget}s cannot be met, using {name} with {max_tokens} prompt tokens')
+        return decision(name, max_tokens, [f'model {candidates[0]} -> {name}',
+                                           f'context {prompt_tokens} -> {max_tokens} tokens',
+                                           'budget not met'])
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+            _router.apply_settings(get_settings())
+            on_reload(_router.apply_settings)
+        return _router
@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+from src.preprocessing.cross_sheet import date_span, find_date_column
+from src.llm.serialize import serialize_frame, compact_number, UNIT_LEGEND
+from src.utils.logger import get_logger
+
+logger = get_logger('anomalies')
+
+"""finding the few periods worth the LLM's attention: rolling z-score, IQR and change-point flags over all columns at once"""
+
+Z_THRESHOLD = 3.0
+IQR_FENCE = 1.5
+CHANGE_THRESHOLD = 2.0
+# score of a deviation from a perfectly flat baseline (zero std or IQR): infinite, ranked first but kept finite
+MAX_SCORE = 1e3
+
+
+def _window_stats(values: np.ndarray, window: int, forward: bool = False):
+    """
+    Mean/std of the `window` rows before each row (or from each row on, if forward)
+    for every column at once, via cumulative sums; NaNs are ignored
+
+    Returns:
+        tuple: (mean, std, count) arrays shaped like values
+    """
+    n = values.shape[0]
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    zeros = np.zeros((1, values.shape[1]))
+    s1 = np.vstack([zeros, np.cumsum(filled, axis=0)])
+    s2 = np.vstack([zeros, np.cumsum(filled * filled, axis=0)])
+    cnt = np.vstack([zeros, np.cumsum(valid, axis=0)])
+    rows = np.arange(n)
+    if forward:
+        lo, hi = rows, np.minimum(rows + window, n)
+    else:
+        lo, hi = np.maximum(rows - window, 0), rows
+    count = cnt[hi] - cnt[lo]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (s1[hi] - s1[lo]) / count
+        var = (s2[hi] - s2[lo]) / count - mean * mean
+    std = np.sqrt(np.clip(var, 0, None))
+    return mean, std, count
+
+
+def score_anomalies(values: np.ndarray, window: int = 30) -> dict:
+    """
+    Per-cell anomaly scores for a (rows x columns) matrix, all columns in one pass
+
+    - zscore: distance from the trailing `window`-row mean in trailing stds
+    - iqr: how far outside the Q1 - 1.5*IQR / Q3 + 1.5*IQR fences, in IQRs (0 inside)
+    - change: shift between the trailing and the leading window means, in pooled stds
+
+    Each score is divided by its threshold, so >= 1 means "flagged" for all three. A deviation from
+    a flat baseline (std or IQR of 0) scores MAX_SCORE.
+
+    Returns:
+        dict: name -> array shaped like values, plus 'score' (the max of the three)
+    """
+    values = values.astype(np.float64)
+    # centering keeps the cumulative sums of squares accurate for large amounts
+    values = values - np.nanmean(values, axis=0)
+    window = max(2, min(window, values.shape[0] // 2 or 2))
+
+    mean_before, std_before, count_before = _window_stats(values, window)
+    mean_after, std_after, count_after = _window_stats(values, window, forward=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        zscore = np.abs(values - mean_before) / std_before
+        pooled = np.sqrt((std_before ** 2 + std_after ** 2) / 2)
+        change = np.abs(mean_after - mean_before) / pooled
+    # too little history is not evidence of anything
+    zscore[count_before < max(5, window // 3)] = 0
+    change[(count_before < window) | (count_after < window)] = 0
+
+    q1, q3 = np.nanpercentile(values, [25, 75], axis=0)
+    iqr = q3 - q1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        outside = np.maximum(q1 - IQR_FENCE * iqr - values, values - (q3 + IQR_FENCE * iqr))
+        iqr_score = np.where(outside > 0, 1 + outside / iqr, 0)
+
+    scores = {
+        'zscore': np.minimum(np.nan_to_num(zscore / Z_THRESHOLD, nan=0, posinf=MAX_SCORE), MAX_SCORE),
+        'iqr': np.minimum(np.nan_to_num(iqr_score, nan=0, posinf=MAX_SCORE), MAX_SCORE),
+        'change': np.minimum(np.nan_to_num(change / CHANGE_THRESHOLD, nan=0, posinf=MAX_SCORE), MAX_SCORE),
+    }
+    scores['score'] = np.maximum.reduce([scores['zscore'], scores['iqr'], scores['change']])
+    return scores
+
+
+def top_anomalies(df: pd.DataFrame, top_n: int = 5, window: int = 30, context_rows: int = 2) -> list:
+    """
+    The top_n most anomalous rows of a sheet, at least context_rows apart
+
+    Args:
+        df: Cleaned sheet, ideally with a date column
+        top_n: Number of periods to return
+        window: Rolling window in rows
+        context_rows: Rows before/after each pick to include as context
+
+    Returns:
+        list: dicts with row, date, score, reasons (per flagged column) and context DataFrame
+    """
+    date_col = find_date_column(df)
+    if date_col is not None:
+        df = df.assign(**{date_col: pd.to_datetime(df[date_col], errors='coerce')})
+        df = df.sort_values(date_col, kind='stable')
+    # rows are positions from here on, whatever the index was
+    df = df.reset_index(drop=True)
+    numeric = df.select_dtypes(include='number')
+    if numeric.empty or len(numeric) < 3:
+        return []
+    values = numeric.to_numpy(dtype=np.float64)
+    scores = score_anomalies(values, window=window)
+    row_score = scores['score'].max(axis=1)
+
+    picks = []
+    taken = np.zeros(len(row_score), dtype=bool)
+    for row in np.argsort(-row_score, kind='stable'):
+        if len(picks) >= top_n or row_score[row] < 1:
+            break
+        if taken[row]:
+            continue
+        # suppress the neighbours so one event doesn't fill every slot
+        taken[max(0, row - context_rows):row + context_rows + 1] = True
+        flagged = np.nonzero(scores['score'][row] >= 1)[0]
+        flagged = flagged[np.argsort(-scores['score'][row][flagged])][:3]
+        reasons = []
+        for col in flagged:
+            kinds = [k for k in ('zscore', 'iqr', 'change') if scores[k][row, col] >= 1]
+            reasons.append({"column": numeric.columns[col], "value": values[row, col], "flags": kinds,
+                            "score": round(float(scores['score'][row, col]), 2)})
+        context_cols = ([date_col] if date_col is not None else []) + [r['column'] for r in reasons]
+        picks.append({
+            "row": int(row),
+            "date": df[date_col].iloc[row] if date_col is not None else None,
+            "score": round(float(row_score[row]), 2),
+            "reasons": reasons,
+            "context": df.iloc[max(0, row - context_rows):row + context_rows + 1][context_cols],
+        })
+    return picks
+
+
+def summarize_anomalies(dataframes_dict: dict, top_n: int = 5, window: int = 30, context_rows: int = 2,
+                        sig_figs: int = None) -> str:
+    """
+    Prompt context with each sheet's shape plus its top anomalous periods and their neighbourhood
+
+    Args:
+        dataframes_dict: sheet_name -> cleaned DataFrame (all rows)
+        top_n: Periods per sheet
+        window: Rolling window in rows
+        context_rows: Rows shown before/after each period
+        sig_figs: Serialize the context rows compactly with this many significant figures
+            (None = CSV with 4 significant figures)
+
+    Returns:
+        str: Combined context string
+    """
+    all_context = [UNIT_LEGEND, ""] if sig_figs else []
+    for sheet_name, df in dataframes_dict.items():
+        picks = top_anomalies(df, top_n=top_n, window=window, context_rows=context_rows)
+        all_context.append("=" * 60)
+        all_context.append(f"Sheet: {sheet_name} ({len(df)} rows{date_span(df)}), columns: {list(df.columns)}")
+        all_context.append("=" * 60)
+        if not picks:
+            all_context.append("No anomalous periods found.")
+        for rank, pick in enumerate(picks, 1):
+            when = f"{pick['date']:%Y-%m-%d}" if pick['date'] is not None and pd.notna(pick['date']) else f"row {pick['row']}"
+            reasons = '; '.join(f"{r['column']}={compact_number(r['value'], sig_figs) if sig_figs else format(r['value'], '.4g')} "
+                                f"({'/'.join(r['flags'])})" for r in pick['reasons'])
+            all_context.append(f"#{rank} {when} score {pick['score']}: {reasons}")
+            if sig_figs:
+                all_context.append(serialize_frame(pick['context'], sig=sig_figs))
+            else:
+                all_context.append(pick['context'].to_csv(index=False, date_format='%Y-%m-%d', float_format='%.4g').strip())
+        all_context.append("")
+    combined_text = '\n'.join(all_context)
+    logger.info(f'Anomaly context created: {len(combined_text)} characters')
+    return combined_text
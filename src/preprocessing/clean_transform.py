@@ -2,6 +2,7 @@ from pathlib import Path
 import pandas as pd
 import numpy as np
 from src.utils.logger import get_logger
+from src.ingestion.load_data2 import read_sheet
 
 logger = get_logger('clean transform')
 
@@ -19,7 +20,7 @@ def basic_cleaning(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def process_sheet(csv_path: Path, out_path: Path):
-    df = pd.read_csv(csv_path)
+    df = read_sheet(csv_path)  # csv, csv.zst or parquet from save_processed
     logger.info(f'processing {csv_path} ({len(df)}) rows')
     df = basic_cleaning(df)
     out_path.parent.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,190 @@
+import re
+import numpy as np
+import pandas as pd
+from src.utils.logger import get_logger
+
+logger = get_logger('cross sheet')
+
+"""aligning P&L, Cashflow and KPI sheets on their Date axis and computing cross-sheet ratios"""
+
+# pandas frequency aliases from finest to coarsest
+FREQ_ORDER = ['D', 'W', 'MS', 'QS', 'YS']
+PERIOD_NAMES = {'D': 'day', 'W': 'week', 'MS': 'month', 'QS': 'quarter', 'YS': 'year'}
+
+# columns averaged (levels/ratios) instead of summed (flows) when resampling
+LEVEL_PATTERN = re.compile(r'ratio|roi|roe|roa|margin|_to_|pct|_ma_|rate', re.IGNORECASE)
+
+# ratio name -> (numerator metric, denominator metric); metrics are looked up across all sheets
+CROSS_SHEET_RATIOS = {
+    'fcf_to_net_income': ('Free_Cash_Flow', 'Net_Income'),
+    'ebitda_margin': ('EBITDA', 'Revenue'),
+    'capex_intensity': ('Capital_Expenditures', 'Revenue'),
+    'cash_conversion': ('Operating_Cash_Flow', 'Net_Income'),
+}
+
+
+def find_date_column(df: pd.DataFrame):
+    """First datetime column, else the first column with 'date' in its name"""
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            return col
+    for col in df.columns:
+        if 'date' in str(col).lower():
+            return col
+    return None
+
+
+def date_span(df: pd.DataFrame) -> str:
+    """', 2024-01-01 to 2024-12-31' for a sheet's date column; '' without one or without any parseable date"""
+    date_col = find_date_column(df)
+    if date_col is None:
+        return ''
+    # the name fallback can pick a text column ('Updated_By'), which parses to all NaT
+    dates = pd.to_datetime(df[date_col], errors='coerce').dropna()
+    if dates.empty:
+        return ''
+    return f", {dates.min():%Y-%m-%d} to {dates.max():%Y-%m-%d}"
+
+
+def infer_frequency(index: pd.DatetimeIndex) -> str:
+    """Rough calendar of a date index from the median gap between rows"""
+    if len(index) < 2:
+        return 'D'
+    gap_days = np.median(np.diff(index.values).astype('timedelta64[s]').astype(np.float64)) / 86400
+    for freq, max_gap in (('D', 1.5), ('W', 8), ('MS', 32), ('QS', 95)):
+        if gap_days <= max_gap:
+            return freq
+    return 'YS'
+
+
+def sheet_prefix(sheet_name: str) -> str:
+    """Short column prefix: 'P&L Statement' -> 'pl', 'Cashflow statement' -> 'cashflow', 'KPI summary' -> 'kpi'"""
+    words = re.split(r'[\s_]+', sheet_name.strip())
+    first_word = words[0] if words[0] else sheet_name
+    return re.sub(r'[^a-z0-9]', '', first_word.lower()) or 'sheet'
+
+
+def _resample(df: pd.DataFrame, freq: str) -> pd.DataFrame:
+    levels = [c for c in df.columns if LEVEL_PATTERN.search(str(c))]
+    flows = [c for c in df.columns if c not in levels]
+    parts = []
+    if flows:
+        parts.append(df[flows].resample(freq).sum(min_count=1))
+    if levels:
+        parts.append(df[levels].resample(freq).mean())
+    return pd.concat(parts, axis=1)[list(df.columns)]
+
+
+def align_sheets(sheets: dict, freq: str = None) -> pd.DataFrame:
+    """
+    Join all sheets that have a date column into one date-indexed frame
+
+    Sheets on different calendars (daily vs monthly, gaps, different start dates) are
+    resampled to the coarsest calendar among them, or to `freq` if given. Flow columns
+    are summed per period, ratio/level columns averaged. Columns are prefixed with the
+    sheet ("pl.Revenue", "cashflow.Net_Income") so same-named metrics don't collide.
+
+    Args:
+        sheets: sheet_name -> DataFrame
+        freq: Target pandas frequency ('D', 'W', 'MS', 'QS', 'YS'), default: coarsest found
+
+    Returns:
+        pd.DataFrame: outer-joined frame indexed by period start
+    """
+    frames = {}
+    freqs = []
+    for sheet_name, df in sheets.items():
+        date_col = find_date_column(df)
+        if date_col is None:
+            logger.info(f'skipping {sheet_name}: no date column')
+            continue
+        dates = pd.to_datetime(df[date_col], errors='coerce').dt.normalize()
+        numeric = df.drop(columns=[date_col]).select_dtypes(include='number')
+        numeric = numeric.set_index(dates)
+        numeric = numeric[numeric.index.notna()].sort_index()
+        if numeric.empty:
+            continue
+        frames[sheet_name] = numeric
+        freqs.append(infer_frequency(numeric.index.unique()))
+
+    if not frames:
+        return pd.DataFrame()
+    target = freq or max(freqs, key=FREQ_ORDER.index)
+    prefixes = {}
+    aligned = []
+    for sheet_name, numeric in frames.items():
+        prefix = sheet_prefix(sheet_name)
+        if prefix in prefixes.values():
+            prefix = re.sub(r'[^a-z0-9]+', '_', sheet_name.lower()).strip('_')
+        prefixes[sheet_name] = prefix
+        resampled = _resample(numeric, target)
+        aligned.append(resampled.add_prefix(f'{prefix}.'))
+    result = pd.concat(aligned, axis=1, join='outer').sort_index()
+    result.index.name = 'period'
+    logger.info(f'aligned {len(frames)} sheets on a {PERIOD_NAMES.get(target, target)} calendar: '
+                f'{len(result)} periods, {result.shape[1]} columns')
+    return result
+
+
+def find_metric(aligned: pd.DataFrame, metric: str):
+    """Column for a metric name, whichever sheet it came from (first sheet wins)"""
+    for col in aligned.columns:
+        if col.split('.', 1)[-1].lower() == metric.lower():
+            return col
+    return None
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    out = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=(denominator != 0) & ~np.isnan(denominator))
+    return out
+
+
+def cross_sheet_ratios(aligned: pd.DataFrame) -> pd.DataFrame:
+    """Vectorized cross-sheet ratios for every period; ratios whose inputs are missing are skipped"""
+    ratios = {}
+    for name, (num_metric, den_metric) in CROSS_SHEET_RATIOS.items():
+        num_col, den_col = find_metric(aligned, num_metric), find_metric(aligned, den_metric)
+        if num_col is None or den_col is None:
+            continue
+        ratios[name] = _safe_divide(aligned[num_col].to_numpy(dtype=np.float64),
+                                    aligned[den_col].to_numpy(dtype=np.float64))
+    return pd.DataFrame(ratios, index=aligned.index)
+
+
+def summarize_cross_sheet(sheets: dict, period: str = 'QS', last_n: int = 8) -> str:
+    """
+    Compact text block of cross-sheet ratios for the prompt
+
+    Ratios are computed from per-period totals (ratio of sums, not mean of daily
+    ratios), so a day with near-zero net income can't blow up the quarter.
+
+    Args:
+        sheets: sheet_name -> DataFrame (full data, not the row-limited sample)
+        period: Reporting period for the table ('MS' month, 'QS' quarter, 'YS' year)
+        last_n: Number of most recent periods to show
+
+    Returns:
+        str: Small table plus whole-range figures, or '' if nothing could be aligned
+    """
+    aligned = align_sheets(sheets)
+    if aligned.empty:
+        return ''
+    # never report finer than the data itself
+    data_freq = infer_frequency(aligned.index)
+    if FREQ_ORDER.index(period) < FREQ_ORDER.index(data_freq):
+        period = data_freq
+    per_period = _resample(aligned, period)
+    ratios = cross_sheet_ratios(per_period)
+    if ratios.empty:
+        return ''
+    totals = aligned.sum(min_count=1).to_frame().T
+    overall = cross_sheet_ratios(totals).iloc[0]
+
+    label = PERIOD_NAMES.get(period, period)
+    table = ratios.tail(last_n).round(3)
+    table.index = table.index.strftime('%Y-%m-%d')
+    lines = [f"Cross-sheet ratios per {label} (last {len(table)} of {len(ratios)}), from {aligned.index.min():%Y-%m-%d} to {aligned.index.max():%Y-%m-%d}:",
+             table.to_csv(index_label=label).strip(), "",
+             "Whole range: " + ', '.join(f'{name}={value:.3f}' for name, value in overall.items() if pd.notna(value))]
+    return '\n'.join(lines)
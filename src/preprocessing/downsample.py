@@ -0,0 +1,208 @@
+"""
+downsampling sheet metrics to chart width, so a multi-million-row history reaches the browser as ~1 point per pixel
+
+- lttb: Largest-Triangle-Three-Buckets, keeps the points that preserve the line's shape
+- minmax: the min and max of each bucket in time order, never hides a spike
+Both return real data points, never averages.
+"""
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.utils.logger import get_logger
+from src.preprocessing.cross_sheet import find_date_column
+
+logger = get_logger('downsample')
+
+METHODS = ('lttb', 'minmax')
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the n_out points Largest-Triangle-Three-Buckets keeps
+
+    The first and last points are always kept. Between them, each bucket keeps the point
+    forming the largest triangle with the previously kept point and the next bucket's mean.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    # n_out - 2 buckets over points 1..n-2; linspace steps are > 1 here, so no bucket is empty
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # the last bucket looks ahead to the final point
+    mean_x = np.append(mean_x[1:], x[-1])
+    mean_y = np.append(mean_y[1:], y[-1])
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - mean_x[i]) * (y[start:end] - ay) - (ax - x[start:end]) * (mean_y[i] - ay))
+        a = start + int(area.argmax())
+        kept[i + 1] = a
+    return kept
+
+
+def minmax(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of each bucket's min and max point (n_out // 2 buckets), in time order"""
+    n = len(x)
+    buckets = n_out // 2
+    if buckets < 1 or n <= n_out:
+        return np.arange(n)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    kept = np.empty(2 * buckets, dtype=np.int64)
+    for i in range(buckets):
+        start, end = edges[i], edges[i + 1]
+        values = y[start:end]
+        low, high = start + int(values.argmin()), start + int(values.argmax())
+        kept[2 * i], kept[2 * i + 1] = min(low, high), max(low, high)
+    return np.unique(kept)
+
+
+REDUCERS = {'lttb': lttb, 'minmax': minmax}
+
+
+class TimeSeries:
+    """A sheet's numeric columns sorted by date; zooming is a binary search, not a filter over every row"""
+
+    def __init__(self, df: pd.DataFrame, date_column: str = None):
+        date_column = date_column or find_date_column(df)
+        if date_column is None:
+            raise ValueError('no date column')
+        dates = pd.to_datetime(df[date_column], errors='coerce')
+        valid = dates.notna().to_numpy()
+        x = dates.to_numpy(dtype='datetime64[ns]')[valid].view(np.int64)
+        order = None if (np.diff(x) >= 0).all() else np.argsort(x, kind='stable')
+        self.date_column = date_column
+        self.x = x if order is None else x[order]
+        self.metrics = {}
+        for col in df.columns:
+            if col == date_column or not pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col]):
+                continue
+            values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)[valid]
+            self.metrics[str(col)] = values if order is None else values[order]
+
+    def __len__(self):
+        return len(self.x)
+
+    def describe(self) -> dict:
+        """date range, row count and metric names (what a chart's controls need)"""
+        if not len(self.x):
+            return {"date_column": self.date_column, "rows": 0, "start": None, "end": None, "metrics": list(self.metrics)}
+        return {"date_column": self.date_column, "rows": len(self.x),
+                "start": pd.Timestamp(self.x[0]).isoformat(), "end": pd.Timestamp(self.x[-1]).isoformat(),
+                "metrics": list(self.metrics)}
+
+    def window(self, start=None, end=None) -> slice:
+        """Rows dated start..end (both inclusive, either open); a date-only end string covers that whole day"""
+        low = 0 if start is None else int(np.searchsorted(self.x, pd.Timestamp(start).value, side='left'))
+        if end is None:
+            high = len(self.x)
+        elif isinstance(end, str) and len(end.strip()) <= 10:
+            high = int(np.searchsorted(self.x, (pd.Timestamp(end) + pd.Timedelta(days=1)).value, side='left'))
+        else:
+            high = int(np.searchsorted(self.x, pd.Timestamp(end).value, side='right'))
+        return slice(low, high)
+
+    def downsample(self, metrics, width: int, start=None, end=None, method: str = 'lttb') -> tuple:
+        """
+        At most width points per metric in the start..end window
+
+        Args:
+            metrics: Metric names (keys of self.metrics)
+            width: Chart width in pixels, the point budget per metric
+            start, end: Window bounds (anything pd.Timestamp accepts; None = open)
+            method: lttb | minmax
+
+        Returns:
+            tuple: (DataFrame with date, metric, value columns, rows in the window)
+        """
+        if method not in REDUCERS:
+            raise ValueError(f'method must be one of {list(METHODS)}, got {method!r}')
+        unknown = [m for m in metrics if m not in self.metrics]
+        if unknown:
+            raise KeyError(f'unknown metrics {unknown}, available: {list(self.metrics)}')
+        window = self.window(start, end)
+        x = self.x[window]
+        parts = []
+        for metric in metrics:
+            y = self.metrics[metric][window]
+            finite = np.isfinite(y)
+            xs, ys = (x, y) if finite.all() else (x[finite], y[finite])
+            kept = REDUCERS[method](xs, ys, width)
+            parts.append(pd.DataFrame({"date": xs[kept].view('datetime64[ns]'), "metric": metric, "value": ys[kept]}))
+        points = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['date', 'metric', 'value'])
+        return points, len(x)
+
+
+class SeriesCache:
+    """
+    TimeSeries per processed sheet file plus downsampled results per (sheet, metrics, window, width, method)
+
+    Both are keyed by the file's size and mtime, so a rewritten sheet is reloaded, and both
+    are LRU-bounded.
+    """
+
+    def __init__(self, max_series: int = 8, max_results: int = 128):
+        self.max_series = max_series
+        self.max_results = max_results
+        self._series = OrderedDict()
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _version(path: Path) -> tuple:
+        stat = Path(path).stat()
+        return str(path), stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def _put(cache: OrderedDict, key, value, limit: int):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > limit:
+            cache.popitem(last=False)
+
+    def series(self, path: Path) -> TimeSeries:
+        from src.ingestion.load_data2 import read_sheet
+        version = self._version(path)
+        with self._lock:
+            if version in self._series:
+                self._series.move_to_end(version)
+                return self._series[version]
+        series = TimeSeries(read_sheet(path))
+        logger.info(f'loaded {len(series)} rows of {Path(path).name} for charts')
+        with self._lock:
+            self._put(self._series, version, series, self.max_series)
+        return series
+
+    def points(self, path: Path, metrics: tuple, start=None, end=None, width: int = 1200, method: str = 'lttb') -> tuple:
+        """TimeSeries.downsample of a sheet file, cached"""
+        key = (self._version(path), tuple(metrics), start, end, width, method)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+        result = self.series(path).downsample(metrics, width, start=start, end=end, method=method)
+        with self._lock:
+            self._put(self._results, key, result, self.max_results)
+        return result
+
+
+_series_cache = None
+_series_cache_lock = threading.Lock()
+
+
+def get_series_cache() -> SeriesCache:
+    global _series_cache
+    with _series_cache_lock:
+        if _series_cache is None:
+            from src.utils.settings import get_settings
+            _series_cache = SeriesCache(max_results=get_settings().cache.max_entries)
+        return _series_cache
@@ -0,0 +1,185 @@
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from src.utils.logger import get_logger
+
+logger = get_logger('rollups')
+
+"""
+KPI rollup cube: every numeric metric of every sheet pre-aggregated per day/week/month/quarter/year
+into one SQLite file, so readers (GET /kpis) answer with an indexed lookup instead of
+reloading CSVs and resampling. pandas is only needed to build the cube, not to query it.
+"""
+
+CUBE_FILE = 'kpi_cube.sqlite'
+# granularity -> (pandas rule, resample kwargs); periods are labelled by their first day
+GRANULARITIES = {
+    'day': ('D', {}),
+    'week': ('W-MON', {'label': 'left', 'closed': 'left'}),
+    'month': ('MS', {}),
+    'quarter': ('QS', {}),
+    'year': ('YS', {}),
+}
+
+SCHEMA = """
+CREATE TABLE rollups (
+    sheet TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    period TEXT NOT NULL,
+    value REAL,
+    min REAL,
+    max REAL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (sheet, metric, granularity, period)
+) WITHOUT ROWID;
+CREATE TABLE metrics (
+    sheet TEXT NOT NULL,
+    sheet_name TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    aggregation TEXT NOT NULL,
+    first_date TEXT,
+    last_date TEXT,
+    PRIMARY KEY (sheet, metric)
+);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def sheet_key(sheet_name: str) -> str:
+    """'P&L Statement' and 'P&L_Statement' both -> 'p_l_statement'"""
+    return re.sub(r'[^a-z0-9]+', '_', sheet_name.lower()).strip('_')
+
+
+def build_rollups(sheets: dict, db_path: Path) -> Path:
+    """
+    Materialize the rollup cube for a set of cleaned sheets
+
+    Flow metrics (Revenue, Net_Income, ...) are summed per period, ratio/level metrics
+    (ROE, Debt_to_Equity, moving averages, ...) averaged; min/max/count are kept for both.
+    The cube is written to a temp file and swapped in, so readers never see half a build.
+
+    Args:
+        sheets: sheet_name -> DataFrame with a date column
+        db_path: Target SQLite file
+
+    Returns:
+        Path: db_path
+    """
+    import pandas as pd
+    from src.preprocessing.cross_sheet import find_date_column, LEVEL_PATTERN
+
+    start = time.perf_counter()
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = db_path.with_suffix('.tmp')
+    tmp_path.unlink(missing_ok=True)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.executescript(SCHEMA)
+    total_rows = 0
+    for sheet_name, df in sheets.items():
+        date_col = find_date_column(df)
+        if date_col is None:
+            logger.info(f'skipping {sheet_name}: no date column')
+            continue
+        key = sheet_key(sheet_name)
+        dates = pd.to_datetime(df[date_col], errors='coerce').dt.normalize()
+        numeric = df.drop(columns=[date_col]).select_dtypes(include='number').set_index(dates)
+        numeric = numeric[numeric.index.notna()].sort_index()
+        if numeric.empty:
+            continue
+        levels = {c for c in numeric.columns if LEVEL_PATTERN.search(str(c))}
+        first, last = numeric.index.min().strftime('%Y-%m-%d'), numeric.index.max().strftime('%Y-%m-%d')
+        conn.executemany('INSERT INTO metrics VALUES (?, ?, ?, ?, ?, ?)',
+                         [(key, sheet_name, str(c), 'mean' if c in levels else 'sum', first, last)
+                          for c in numeric.columns])
+
+        for granularity, (rule, kwargs) in GRANULARITIES.items():
+            resampler = numeric.resample(rule, **kwargs)
+            stats = {name: getattr(resampler, name)() for name in ('sum', 'mean', 'min', 'max', 'count')}
+            periods = stats['count'].index.strftime('%Y-%m-%d')
+            for col in numeric.columns:
+                count = stats['count'][col].to_numpy()
+                has_data = count > 0
+                value = stats['mean' if col in levels else 'sum'][col].to_numpy()
+                rows = zip([key] * int(has_data.sum()), [str(col)] * int(has_data.sum()),
+                           [granularity] * int(has_data.sum()), periods[has_data],
+                           value[has_data].tolist(), stats['min'][col].to_numpy()[has_data].tolist(),
+                           stats['max'][col].to_numpy()[has_data].tolist(), count[has_data].tolist())
+                conn.executemany('INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                total_rows += int(has_data.sum())
+
+    conn.executemany('INSERT INTO meta VALUES (?, ?)',
+                     [('built_at', time.strftime('%Y-%m-%dT%H:%M:%S')), ('sheets', str(len(sheets)))])
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, db_path)
+    logger.info(f'rollup cube written to {db_path}: {total_rows} rows in {time.perf_counter() - start:.2f}s')
+    return db_path
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    # read-only, so a query can never create an empty cube or lock the builder out
+    conn = sqlite3.connect(f'file:{Path(db_path).as_posix()}?mode=ro', uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def list_metrics(db_path: Path) -> list:
+    """Sheets and metrics available in the cube"""
+    with closing(_connect(db_path)) as conn:
+        rows = conn.execute('SELECT sheet, sheet_name, metric, aggregation, first_date, last_date '
+                            'FROM metrics ORDER BY sheet, rowid').fetchall()
+    return [dict(row) for row in rows]
+
+
+def query_rollups(db_path: Path, sheet: str, metric: str, granularity: str = 'month',
+                  start: str = None, end: str = None) -> list:
+    """
+    Rollup rows for one metric, oldest period first
+
+    Args:
+        db_path: Cube file written by build_rollups
+        sheet: Sheet name in any spelling ('P&L Statement', 'P&L_Statement', 'p_l_statement')
+        metric: Column name, e.g. 'Revenue'
+        granularity: day | week | month | quarter | year
+        start: First period to include, ISO date (inclusive)
+        end: Last period to include, ISO date (inclusive)
+
+    Returns:
+        list: {"period", "value", "min", "max", "count"} dicts
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'granularity must be one of {list(GRANULARITIES)}')
+    sql = ('SELECT period, value, min, max, count FROM rollups '
+           'WHERE sheet = ? AND metric = ? AND granularity = ?')
+    params = [sheet_key(sheet), metric, granularity]
+    if start:
+        sql += ' AND period >= ?'
+        params.append(start)
+    if end:
+        sql += ' AND period <= ?'
+        params.append(end)
+    with closing(_connect(db_path)) as conn:
+        rows = conn.execute(sql + ' ORDER BY period', params).fetchall()
+    return [dict(row) for row in rows]
+
+
+if __name__ == '__main__':
+    import argparse
+    from src.ingestion.load_data2 import list_processed, read_sheet, sheet_stem
+    from src.utils.settings import get_settings, resolve_path
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description='build the KPI rollup cube from processed sheets')
+    parser.add_argument('--input', type=str, default=settings.paths.processed_dir, help='directory of processed sheets')
+    parser.add_argument('--output', type=str, default=str(Path(settings.paths.outputs_dir) / CUBE_FILE))
+    args = parser.parse_args()
+
+    input_dir = resolve_path(args.input)
+    sheets = {sheet_stem(path): read_sheet(path) for path in list_processed(input_dir)}
+    build_rollups(sheets, resolve_path(args.output))
@@ -0,0 +1,82 @@
+"""streamlit time-series charts of sheet metrics, downsampled server-side to the chart width (shared by the dashboards)"""
+import pandas as pd
+import streamlit as st
+from src.preprocessing.downsample import METHODS, TimeSeries
+
+WIDTHS = [600, 900, 1200, 1600, 2400]
+METHOD_LABELS = {'lttb': 'LTTB (shape)', 'minmax': 'Min/max (spikes)'}
+
+
+def metric_charts(sheets: dict, downsample, key: str = 'charts'):
+    """
+    One tab per sheet with a metric picker, a date-range zoom and a line chart
+
+    Args:
+        sheets: sheet name -> TimeSeries.describe() (start, end, rows, metrics)
+        downsample: downsample(sheet, metrics, start, end, width, method) -> (points DataFrame, rows in range);
+            should be cached, it runs on every rerun
+        key: Widget key prefix, unique per page
+    """
+    import altair as alt
+
+    sheets = {name: info for name, info in sheets.items() if info['metrics'] and info['rows']}
+    if not sheets:
+        st.info('No sheet with a date column and numeric metrics')
+        return
+    col1, col2 = st.columns(2)
+    width = col1.select_slider('Chart width (px)', WIDTHS, value=1200, key=f'{key}-width',
+                               help='Points drawn per metric; about one per pixel looks the same as every row')
+    method = col2.radio('Downsampling', METHODS, format_func=METHOD_LABELS.get, horizontal=True, key=f'{key}-method')
+    for tab, (name, info) in zip(st.tabs(list(sheets)), sheets.items()):
+        with tab:
+            metrics = st.multiselect('Metrics', info['metrics'], default=info['metrics'][:2], key=f'{key}-{name}-metrics')
+            start, end = pd.Timestamp(info['start']).date(), pd.Timestamp(info['end']).date()
+            if start < end:
+                start, end = st.slider('Date range', min_value=start, max_value=end, value=(start, end),
+                                       key=f'{key}-{name}-range')
+            if not metrics:
+                st.info('Pick at least one metric')
+                continue
+            points, rows = downsample(name, tuple(metrics), start.isoformat(), end.isoformat(), width, method)
+            chart = alt.Chart(points).mark_line().encode(
+                x=alt.X('date:T', title=None),
+                y=alt.Y('value:Q', title=None),
+                color=alt.Color('metric:N', title=None),
+                tooltip=['date:T', 'metric:N', alt.Tooltip('value:Q', format=',.2f')],
+            ).properties(height=320)
+            st.altair_chart(chart, use_container_width=True)
+            st.caption(f'{rows:,} rows in range, {len(points):,} points drawn ({METHOD_LABELS[method]})')
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _series(data_key: str, sheet: str, _df: pd.DataFrame) -> TimeSeries:
+    return TimeSeries(_df)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _points(data_key: str, sheet: str, metrics: tuple, start: str, end: str, width: int, method: str,
+            _timeseries: TimeSeries) -> tuple:
+    return _timeseries.downsample(metrics, width, start=start, end=end, method=method)
+
+
+def frame_charts(frames: dict, data_key: str, key: str = 'charts'):
+    """
+    metric_charts over in-memory DataFrames
+
+    Args:
+        frames: sheet name -> DataFrame; sheets without a date column are skipped
+        data_key: Identifies the data (e.g. the workbook's hash); the sorted series and every
+            downsampled (sheet, metrics, range, width, method) are cached under it
+        key: Widget key prefix
+    """
+    series = {}
+    for name, df in frames.items():
+        try:
+            series[name] = _series(data_key, name, df)
+        except ValueError:
+            continue
+
+    def downsample(sheet, metrics, start, end, width, method):
+        return _points(data_key, sheet, metrics, start, end, width, method, _timeseries=series[sheet])
+
+    metric_charts({name: s.describe() for name, s in series.items()}, downsample, key=key)
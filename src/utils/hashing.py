@@ -0,0 +1,38 @@
+import hashlib
+from pathlib import Path
+
+CHUNK_SIZE = 1024 * 1024
+
+try:
+    import xxhash
+except ImportError:  # xxhash is in requirements.txt, hashlib keeps things working without it
+    xxhash = None
+
+
+def _new_hasher():
+    return xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+
+
+def file_hash(path: Path) -> str:
+    """Content hash of a file, read in 1 MB chunks (xxh3-128, blake2b fallback)"""
+    hasher = _new_hasher()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def bytes_hash(data: bytes) -> str:
+    """Content hash of in-memory bytes (an upload), same algorithm as file_hash"""
+    hasher = _new_hasher()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+def text_hash(*parts) -> str:
+    """Hash of a few strings/values, used to key caches on parameters"""
+    hasher = _new_hasher()
+    for part in parts:
+        hasher.update(str(part).encode('utf-8'))
+        hasher.update(b'\x00')
+    return hasher.hexdigest()
@@ -1,29 +1,170 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+# Environment knobs:
+#   LOG_LEVEL              default level for every logger (INFO)
+#   LOG_LEVELS             per-module overrides, e.g. "pipeline=DEBUG,generating insights=WARNING"
+#   LOG_FORMAT             "text" (default) or "json" for one structured record per line
+#   LOG_FILE               also write to this file (size-capped, rotated)
+#   LOG_MAX_MESSAGE_CHARS  longer messages (LLM responses, prompts) are cut to this size
+DEFAULT_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+MAX_MESSAGE_CHARS = int(os.environ.get('LOG_MAX_MESSAGE_CHARS', 2000))
+QUEUE_SIZE = 10000
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# attributes every LogRecord has; anything else came in through `extra=` and goes into the JSON record
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def _truncate(message: str, limit: int) -> str:
+    if limit and len(message) > limit:
+        return f'{message[:limit]}... [truncated {len(message) - limit} chars]'
+    return message
+
+
+class TextFormatter(logging.Formatter):
+    """The original console format, with the size cap applied"""
+
+    def __init__(self, max_chars: int = MAX_MESSAGE_CHARS):
+        super().__init__(TEXT_FORMAT)
+        self.max_chars = max_chars
+
+    def formatMessage(self, record):
+        record.message = _truncate(record.message, self.max_chars)
+        return super().formatMessage(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, source and any `extra=` fields"""
+
+    def __init__(self, max_chars: int = MAX_MESSAGE_CHARS):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def format(self, record):
+        payload = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': _truncate(record.getMessage(), self.max_chars),
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks the caller
+
+    Records are handed over unformatted (message formatting happens on the
+    listener thread) and dropped, not waited on, if the queue is full.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _parse_module_levels(spec: str) -> dict:
+    levels = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, level = item.rsplit('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+_lock = threading.Lock()
+_queue_handler = None
+_listener = None
+_module_levels = _parse_module_levels(os.environ.get('LOG_LEVELS', ''))
+
+
+def configure_logging(json_format: bool = None, log_file: str = None, module_levels: dict = None):
+    """
+    Start the background log listener (called automatically by get_logger)
+
+    Args:
+        json_format: Structured JSON records instead of text (default: LOG_FORMAT env)
+        log_file: Also write to a rotating, size-capped file (default: LOG_FILE env)
+        module_levels: {logger name: level} overrides on top of LOG_LEVELS
+    """
+    global _queue_handler, _listener
+    with _lock:
+        if module_levels:
+            _module_levels.update({k: v.upper() for k, v in module_levels.items()})
+            for name, level in module_levels.items():
+                logging.getLogger(name).setLevel(level.upper())
+        if _listener is not None:
+            return _queue_handler
+
+        if json_format is None:
+            json_format = os.environ.get('LOG_FORMAT', 'text').lower() == 'json'
+        log_file = log_file or os.environ.get('LOG_FILE')
+        formatter = JsonFormatter() if json_format else TextFormatter()
+
+        handlers = [logging.StreamHandler()]
+        if log_file:
+            handlers.append(logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding='utf-8'))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(maxsize=QUEUE_SIZE)
+        _queue_handler = NonBlockingQueueHandler(log_queue)
+        # respect_handler_level so a file handler could be given its own level later
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _queue_handler
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
 
 def get_logger(name: str):
     # Get a logger instance with the specified name.
     # If a logger with this name already exists, it returns the existing instance.
     logger = logging.getLogger(name)
 
-    # Check if the logger already has any handlers attached.
-    # This prevents adding duplicate handlers if get_logger is called multiple times for the same logger name.
-    if not logger.handlers:
-        # Create a StreamHandler to output log messages to the console (stderr by default).
-        handler = logging.StreamHandler()
-
-        # Define the format of the log messages.
-        # It includes timestamp, logger name, log level, and the message itself.
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-        # Set the formatter for the handler.
-        handler.setFormatter(formatter)
-
-        # Add the configured handler to the logger.
+    # Only configure a logger the first time it is requested, so repeated calls
+    # don't add duplicate handlers or reset a level someone changed at runtime.
+    if not getattr(logger, '_queue_configured', False):
+        handler = configure_logging()
+        # The logger only enqueues records; the listener thread does the actual I/O.
         logger.addHandler(handler)
-
-    # Set the logging level for the logger to INFO.
-    # This means only messages with severity INFO, WARNING, ERROR, and CRITICAL will be processed.
-    logger.setLevel(logging.INFO)
+        logger.setLevel(_module_levels.get(name, DEFAULT_LEVEL))
+        logger._queue_configured = True
 
     # Return the configured logger instance.
-    return logger
\ No newline at end of file
+    return logger
@@ -0,0 +1,231 @@
+"""
+Per-stage profiling for the pipeline CLIs (--profile)
+
+Code marks its stages with `with profile_stage('clean'):`. This costs nothing unless a
+Profiler is active. While one is active, each stage records:
+- wall-clock and CPU time
+- a cProfile profile, saved as <n>_<stage>.prof (open it with snakeviz or pstats)
+- tracemalloc peak memory and its top allocation sites
+Throughout the run, a sampling thread records the stacks of every thread. It writes them
+to stacks.collapsed ("stage;thread;frame;frame count" lines), which flamegraph.pl,
+speedscope or inferno can render. summary.txt / summary.json hold the per-stage table.
+
+    python -m workflow.pipeline2_fixed --profile
+    python -m src.ingestion.load_data2 --profile --profile-dir data/outputs/profile/load
+
+tracemalloc makes allocation-heavy code several times slower. Use --profile-mode cpu when
+the timings themselves matter.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from src.utils.logger import get_logger
+
+logger = get_logger('profiling')
+
+MODES = ('cpu', 'memory', 'all')
+_active = None
+# the profiler's own allocations are not part of any stage
+_OWN_TRACES = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, cProfile.__file__),
+               tracemalloc.Filter(False, pstats.__file__), tracemalloc.Filter(False, __file__)]
+
+
+def profile_stage(name: str):
+    """Context manager timing/profiling a pipeline stage; a no-op unless a Profiler is running"""
+    profiler = _active
+    if profiler is None:
+        return nullcontext()
+    return profiler.stage(name)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class StackSampler:
+    """Samples every thread's stack at a fixed interval into collapsed-stack counts"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.counts = {}
+        self.stage = 'other'
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stage = self.stage
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                key = ';'.join([stage, names.get(ident, str(ident))] + stack[::-1])
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write(self, path: Path):
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in sorted(self.counts.items()):
+                file.write(f'{stack} {count}\n')
+
+
+class Profiler:
+    def __init__(self, output_dir: Path, mode: str = 'all', interval: float = 0.005, top: int = 10):
+        if mode not in MODES:
+            raise ValueError(f'unknown profile mode {mode!r}, expected one of {MODES}')
+        self.output_dir = Path(output_dir)
+        self.mode = mode
+        self.top = top
+        self.stages = []
+        self.sampler = StackSampler(interval) if mode in ('cpu', 'all') else None
+        self._current = None
+        self._started = None
+
+    @property
+    def memory(self) -> bool:
+        return self.mode in ('memory', 'all')
+
+    def start(self):
+        global _active
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if self.sampler is not None:
+            self.sampler.start()
+        self._started = time.perf_counter()
+        _active = self
+        logger.info(f'profiling ({self.mode}) into {self.output_dir}')
+        return self
+
+    @contextmanager
+    def stage(self, name: str):
+        if self._current is not None:
+            # cProfile can't nest; the outer stage keeps the time
+            yield
+            return
+        self._current = name
+        if self.sampler is not None:
+            self.sampler.stage = name
+        profile = cProfile.Profile() if self.mode in ('cpu', 'all') else None
+        if self.memory:
+            # traced per stage: the end snapshot holds only what the stage allocated and kept
+            tracemalloc.start()
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            if self.sampler is not None:
+                self.sampler.stage = 'profiler'
+            record = {"stage": name, "wall_s": round(time.perf_counter() - wall, 3),
+                      "cpu_s": round(time.process_time() - cpu, 3)}
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot().filter_traces(_OWN_TRACES)
+                tracemalloc.stop()
+                record["peak_mb"] = round(peak / 1e6, 1)
+                record["retained_mb"] = round(current / 1e6, 1)
+                record["top_allocations"] = [
+                    {"site": str(stat.traceback[0]), "size_mb": round(stat.size / 1e6, 2), "count": stat.count}
+                    for stat in snapshot.statistics('lineno')[:self.top]]
+            if profile is not None:
+                record["profile"] = f'{len(self.stages) + 1:02d}_{name}.prof'
+                profile.dump_stats(self.output_dir / record["profile"])
+                # cProfile sees only this thread; work in thread pools shows up in stacks.collapsed
+                record["top_functions"] = self._top_functions(profile)
+            self.stages.append(record)
+            if self.sampler is not None:
+                self.sampler.stage = 'other'
+            self._current = None
+
+    def _top_functions(self, profile) -> list:
+        stats = pstats.Stats(profile, stream=io.StringIO())
+        rows = []
+        for (file_name, line, func), (_, calls, own, cumulative, _) in stats.stats.items():
+            rows.append({"function": f'{func} ({os.path.basename(file_name)}:{line})', "calls": calls,
+                         "own_s": round(own, 3), "cumulative_s": round(cumulative, 3)})
+        rows.sort(key=lambda r: -r['own_s'])
+        return rows[:self.top]
+
+    def stop(self) -> Path:
+        """Stop profiling, write the summary and the collapsed stacks; returns the summary path"""
+        global _active
+        _active = None
+        total = round(time.perf_counter() - self._started, 3)
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.sampler.write(self.output_dir / 'stacks.collapsed')
+        with open(self.output_dir / 'summary.json', 'w', encoding='utf-8') as file:
+            json.dump({"mode": self.mode, "total_wall_s": total, "stages": self.stages}, file, indent=2)
+        summary_path = self.output_dir / 'summary.txt'
+        with open(summary_path, 'w', encoding='utf-8') as file:
+            file.write(self.report(total))
+        return summary_path
+
+    def report(self, total: float) -> str:
+        lines = [f"{'stage':<20}{'wall s':>10}{'cpu s':>10}{'peak MB':>10}{'retained MB':>13}"]
+        for r in self.stages:
+            lines.append(f"{r['stage']:<20}{r['wall_s']:>10}{r['cpu_s']:>10}"
+                         f"{r.get('peak_mb', '-'):>10}{r.get('retained_mb', '-'):>13}")
+        staged = sum(r['wall_s'] for r in self.stages)
+        lines.append(f"{'(outside stages)':<20}{round(total - staged, 3):>10}")
+        lines.append(f"{'total':<20}{total:>10}")
+        for r in self.stages:
+            lines.append('')
+            lines.append(f"== {r['stage']}")
+            for f in r.get('top_functions', []):
+                lines.append(f"  {f['own_s']:>8}s own {f['cumulative_s']:>8}s cum {f['calls']:>9} calls  {f['function']}")
+            for a in r.get('top_allocations', []):
+                lines.append(f"  {a['size_mb']:>8} MB in {a['count']:>7} blocks  {a['site']}")
+        return '\n'.join(lines) + '\n'
+
+
+def add_profile_arguments(parser):
+    """--profile, --profile-dir, --profile-mode for a CLI's argparse parser"""
+    parser.add_argument('--profile', action='store_true',
+                        help='profile each stage (cProfile, sampled stacks, tracemalloc) and write a summary')
+    parser.add_argument('--profile-dir', type=str, default=None,
+                        help='where to write profiles (default: <outputs_dir>/profile/<timestamp>)')
+    parser.add_argument('--profile-mode', type=str, default='all', choices=MODES,
+                        help='cpu (cProfile + sampling), memory (tracemalloc) or all')
+
+
+@contextmanager
+def maybe_profile(args):
+    """Profile the with-block if args.profile was given, then print the summary table"""
+    if not getattr(args, 'profile', False):
+        yield None
+        return
+    from src.utils.settings import get_settings, resolve_path
+    output_dir = Path(args.profile_dir) if args.profile_dir else \
+        resolve_path(get_settings().paths.outputs_dir) / 'profile' / time.strftime('%Y%m%d-%H%M%S')
+    profiler = Profiler(output_dir, mode=args.profile_mode).start()
+    try:
+        yield profiler
+    finally:
+        summary = profiler.stop()
+        print(summary.read_text(encoding='utf-8'))
+        print(f'profiles, stacks.collapsed and summary written to {output_dir}')
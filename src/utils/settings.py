@@ -0,0 +1,225 @@
+"""
+Runtime settings, loaded once from configs/setting.yaml and overridable from the environment
+
+Every value can be overridden with FIN_<SECTION>__<FIELD>, e.g.
+
+    FIN_LLM__MODEL=llama3.2:1b
+    FIN_PIPELINE__ROW_LIMIT=50
+    FIN_SETTINGS_FILE=configs/prod.yaml
+
+OLLAMA_BASE_URL is still read as an alias of FIN_LLM__BASE_URL (which wins if both are set).
+
+Code should call get_settings() when it needs a value (not at import time), so that
+reload_settings() - exposed by the API as POST /settings/reload - takes effect without
+a restart.
+"""
+import os
+import threading
+from dataclasses import dataclass, field, fields, asdict
+from pathlib import Path
+from typing import Optional, get_type_hints
+from src.utils.logger import get_logger
+
+logger = get_logger('settings')
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_SETTINGS_FILE = PROJECT_ROOT / 'configs' / 'setting.yaml'
+ENV_PREFIX = 'FIN_'
+# older variable names -> (section, field); the FIN_ name takes precedence
+ENV_ALIASES = {'OLLAMA_BASE_URL': ('llm', 'base_url')}
+
+
+@dataclass
+class PathSettings:
+    raw_path: str = 'data/raw/Financial_data_final.xlsx'
+    processed_dir: str = 'data/processed'
+    outputs_dir: str = 'data/outputs'
+
+
+@dataclass
+class LLMSettings:
+    model: str = 'llama3.1:8b'              # final synthesis
+    small_model: str = 'llama3.2:1b'        # digests, drafts, test prompts
+    base_url: str = 'http://localhost:11434'
+    backends: str = ''                      # comma-separated Ollama URLs to balance across, '' = base_url only
+    affinity_weight: float = 2              # in-flight requests a backend may be ahead by and still win for having the model loaded
+    hedge_after: Optional[float] = None     # seconds before an interactive call is also sent to a second backend
+    request_timeout: float = 1800
+    interactive_timeout: float = 300
+    keep_alive: str = '30m'
+    max_concurrency: int = 1                # LLM calls in flight per process and backend
+    queue_depth: int = 8                    # waiting calls per priority class before rejecting/deferring
+    health_interval: float = 10             # seconds between background Ollama health polls
+    breaker_failures: int = 3               # consecutive connection errors/timeouts that open the circuit
+    breaker_cooldown: float = 30            # seconds calls fail fast once the circuit is open
+    latency_budget: Optional[float] = None  # seconds per call, None = no limit
+
+
+@dataclass
+class TokenSettings:
+    num_predict: int = 1024
+    min_num_ctx: int = 2048
+    max_num_ctx: int = 32768
+
+
+@dataclass
+class PipelineSettings:
+    row_limit: int = 100                    # rows per sheet sent to the LLM
+    workers: int = 4                        # sheets/workbooks processed in parallel
+    chunk_rows: int = 100_000               # rows per chunk for streamed reads/writes
+    artifact_format: str = 'csv'            # processed sheet format: csv | csv.zst | parquet
+    anomaly_top_n: int = 5                  # anomalous periods per sheet sent to the LLM, 0 = cross-sheet results only
+    anomaly_window: int = 30                # rolling window (rows) for z-score/change-point flags
+    anomaly_context_rows: int = 2           # rows shown before/after each anomalous period
+    prompt_format: str = 'compact'          # tables in prompts: compact (rounded, k/M units, short dates) | csv
+    sig_figs: int = 3                       # significant figures per column in compact tables
+    incremental_max_delta: float = 0.5      # --incremental runs in full when new rows exceed this share of the analyzed ones
+    incremental_max_merges: int = 6         # ... or after this many merged updates since the last full analysis
+
+
+@dataclass
+class CacheSettings:
+    dir: str = 'data/cache'
+    max_mb: int = 2048                      # size bound for on-disk caches
+    max_entries: int = 128
+    parse_cache: bool = True                # memory-mapped Arrow copies of parsed workbooks
+
+
+@dataclass
+class RetrievalSettings:
+    embedding_model: str = 'sentence-transformers/all-MiniLM-L6-v2'  # used only if downloaded, '' = hashing
+    top_k: int = 5                          # chunks put into a question prompt
+    chunk_rows: int = 30                    # sheet rows per chunk
+
+
+@dataclass
+class JobSettings:
+    backend: str = 'sqlite'                 # job queue backend: sqlite | memory (single process only)
+    db_path: str = 'data/jobs/jobs.sqlite'  # must be on storage every worker node can reach
+    dir: str = 'data/jobs'                  # uploaded workbooks and per-job outputs
+    lease_seconds: float = 120              # a job whose worker stops heartbeating is retried after this
+    heartbeat_seconds: float = 30
+    max_attempts: int = 3
+    retry_backoff: float = 10               # seconds before a failed job is retried, doubled per attempt
+    poll_interval: float = 2                # idle worker sleep between claims
+
+
+@dataclass
+class ApiSettings:
+    data_page_rows: int = 100_000           # GET /data rows per page when no limit is given
+    data_max_page_rows: int = 1_000_000     # largest limit GET /data accepts
+    gzip_min_bytes: int = 1024              # responses at least this big are gzipped for clients that accept it
+
+
+@dataclass
+class Settings:
+    paths: PathSettings = field(default_factory=PathSettings)
+    llm: LLMSettings = field(default_factory=LLMSettings)
+    tokens: TokenSettings = field(default_factory=TokenSettings)
+    pipeline: PipelineSettings = field(default_factory=PipelineSettings)
+    cache: CacheSettings = field(default_factory=CacheSettings)
+    retrieval: RetrievalSettings = field(default_factory=RetrievalSettings)
+    jobs: JobSettings = field(default_factory=JobSettings)
+    api: ApiSettings = field(default_factory=ApiSettings)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _coerce(value, type_):
+    """Convert a YAML/env value to the field's declared type"""
+    if type_ == Optional[float]:
+        if value is None or str(value).strip().lower() in ('', 'none', 'null'):
+            return None
+        return float(value)
+    if type_ is bool:
+        return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+    if type_ is int:
+        return int(float(value))
+    return type_(value)
+
+
+def _build_section(cls, values: dict, section: str):
+    hints = get_type_hints(cls)
+    kwargs = {}
+    for f in fields(cls):
+        value = values.get(f.name, f.default)
+        for alias, target in ENV_ALIASES.items():
+            if target == (section, f.name) and alias in os.environ:
+                value = os.environ[alias]
+        env_name = f'{ENV_PREFIX}{section.upper()}__{f.name.upper()}'
+        if env_name in os.environ:
+            value = os.environ[env_name]
+        try:
+            kwargs[f.name] = _coerce(value, hints[f.name])
+        except (TypeError, ValueError):
+            logger.warning(f'invalid value {value!r} for {section}.{f.name}, using default {f.default!r}')
+            kwargs[f.name] = f.default
+    unknown = set(values) - {f.name for f in fields(cls)}
+    if unknown:
+        logger.warning(f'unknown settings in section {section}: {sorted(unknown)}')
+    return cls(**kwargs)
+
+
+def load_settings(path: Path = None) -> Settings:
+    """Read the YAML file (missing file or PyYAML = defaults) and apply env overrides"""
+    path = Path(path or os.environ.get(f'{ENV_PREFIX}SETTINGS_FILE', DEFAULT_SETTINGS_FILE))
+    raw = {}
+    if path.exists():
+        try:
+            import yaml
+            with open(path, 'r', encoding='utf-8') as file:
+                raw = yaml.safe_load(file) or {}
+        except ImportError:
+            logger.warning('PyYAML is not installed, using default settings')
+    else:
+        logger.warning(f'settings file {path} not found, using defaults')
+
+    sections = {}
+    for f in fields(Settings):
+        sections[f.name] = _build_section(get_type_hints(Settings)[f.name], raw.get(f.name) or {}, f.name)
+    return Settings(**sections)
+
+
+_settings = None
+_lock = threading.Lock()
+_reload_hooks = []
+
+
+def get_settings() -> Settings:
+    """Process-wide settings, loaded on first use"""
+    global _settings
+    with _lock:
+        if _settings is None:
+            _settings = load_settings()
+        return _settings
+
+
+def reload_settings(path: Path = None) -> Settings:
+    """Re-read settings and notify everything registered with on_reload()"""
+    global _settings
+    new_settings = load_settings(path)
+    with _lock:
+        _settings = new_settings
+        hooks = list(_reload_hooks)
+    for hook in hooks:
+        try:
+            hook(new_settings)
+        except Exception as e:
+            logger.error(f'settings reload hook {hook.__qualname__} failed: {e}')
+    logger.info('settings reloaded')
+    return new_settings
+
+
+def on_reload(hook):
+    """Register hook(settings) to run after every reload_settings()"""
+    with _lock:
+        if hook not in _reload_hooks:
+            _reload_hooks.append(hook)
+    return hook
+
+
+def resolve_path(value: str) -> Path:
+    """Settings paths are relative to the project root unless absolute"""
+    path = Path(value)
+    return path if path.is_absolute() else PROJECT_ROOT / path
@@ -0,0 +1,59 @@
+import threading
+from concurrent.futures import Future
+from src.utils.logger import get_logger
+
+logger = get_logger('singleflight')
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution
+
+    The first caller for a key runs the function; callers arriving while it is still
+    running wait for it and get the same result (or the same exception). Nothing is
+    cached afterwards: the next call after completion runs again.
+    """
+
+    def __init__(self, name: str = 'singleflight'):
+        self.name = name
+        self._calls = {}     # key -> (Future, number of waiters)
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) once per key among concurrent callers
+
+        Returns:
+            tuple: (result, shared) where shared is True if this caller joined another's run
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call[1] += 1
+                future, leader = call[0], False
+            else:
+                future = Future()
+                self._calls[key] = [future, 0]
+                leader = True
+
+        if not leader:
+            logger.info(f'{self.name}: joining in-flight call {key[:12]}')
+            return future.result(), True
+
+        try:
+            result = fn(*args, **kwargs)
+            future.set_result(result)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                waiters = self._calls.pop(key)[1]
+            if waiters:
+                logger.info(f'{self.name}: call {key[:12]} served {waiters} duplicate request(s)')
+        return result, False
+
+    def in_flight(self) -> dict:
+        """key -> number of callers waiting on it"""
+        with self._lock:
+            return {key: call[1] for key, call in self._calls.items()}
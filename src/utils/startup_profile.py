@@ -0,0 +1,119 @@
+"""
+Import-time profile for the project's entry points
+
+Each module is imported in a fresh interpreter with `python -X importtime`, so the
+numbers are what a cold process actually pays. The check fails when an entry point
+goes over its budget or pulls in one of the heavy LLM libraries at import time.
+
+    python -m src.utils.startup_profile
+    python -m src.utils.startup_profile --module src.app --top 15
+    python -m src.utils.startup_profile --save data/outputs/startup_profile.json
+"""
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# entry point -> import budget in milliseconds
+ENTRY_POINTS = {
+    'src.app': 1500,
+    'src.llm.generate_insights': 500,
+    'src.ingestion.load_data2': 1000,
+    'workflow.pipeline2_fixed': 1500,
+}
+
+# must never be imported just by importing an entry point
+HEAVY_MODULES = ('llama_index', 'langchain', 'langchain_core', 'torch', 'transformers', 'sentence_transformers')
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+def profile_import(module: str) -> dict:
+    """
+    Import `module` in a clean interpreter and collect its import cost
+
+    Returns:
+        dict: total_ms, wall_ms, heavy (heavy top-level packages that got imported)
+        and slowest (list of (cumulative_ms, module) for the most expensive imports,
+        nested ones included)
+    """
+    code = (
+        f"import sys, json; import {module}; "
+        f"print(json.dumps(sorted({{m.split('.')[0] for m in sys.modules}})))"
+    )
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=PROJECT_ROOT, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f'importing {module} failed:\n{result.stderr[-2000:]}')
+
+    # stderr lines look like: "import time:       123 |       4567 |   package.sub"
+    self_us = 0
+    slowest = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        own, cumulative, name = int(parts[0]), int(parts[1]), parts[2].strip()
+        self_us += own
+        # skip the entry point itself (and its parent packages), they just repeat the total
+        if not (module == name or module.startswith(name + '.')):
+            slowest.append((round(cumulative / 1000, 1), name))
+    slowest.sort(reverse=True)
+
+    loaded = set(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {
+        'module': module,
+        'total_ms': round(self_us / 1000, 1),
+        'wall_ms': round(wall_ms, 1),
+        'heavy': sorted(loaded.intersection(HEAVY_MODULES)),
+        'slowest': slowest,
+    }
+
+
+def check(entry_points: dict = None, top: int = 5) -> list:
+    """Profile every entry point; returns one result dict per module with an `ok` flag"""
+    results = []
+    for module, budget_ms in (entry_points or ENTRY_POINTS).items():
+        profile = profile_import(module)
+        profile['budget_ms'] = budget_ms
+        profile['ok'] = profile['total_ms'] <= budget_ms and not profile['heavy']
+        profile['slowest'] = profile['slowest'][:top]
+        results.append(profile)
+    return results
+
+
+def print_report(results: list):
+    print(f"{'module':<32}{'import ms':>12}{'budget ms':>12}{'wall ms':>10}  status")
+    for r in results:
+        status = 'ok' if r['ok'] else 'FAIL'
+        print(f"{r['module']:<32}{r['total_ms']:>12}{r['budget_ms']:>12}{r['wall_ms']:>10}  {status}")
+        if r['heavy']:
+            print(f"    heavy modules imported: {', '.join(r['heavy'])}")
+        for ms, name in r['slowest']:
+            print(f"    {ms:>10} ms  {name}")
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='measure import-time startup cost of the entry points')
+    parser.add_argument('--module', type=str, default=None, help='profile only this module')
+    parser.add_argument('--budget-ms', type=float, default=None, help='budget for --module (default: its ENTRY_POINTS value)')
+    parser.add_argument('--top', type=int, default=5, help='number of slowest imports to show')
+    parser.add_argument('--save', type=str, default=None, help='write the results as JSON to this path')
+    args = parser.parse_args()
+
+    entry_points = ENTRY_POINTS
+    if args.module:
+        entry_points = {args.module: args.budget_ms or ENTRY_POINTS.get(args.module, 1000)}
+    results = check(entry_points, top=args.top)
+    print_report(results)
+    if args.save:
+        Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=4)
+    sys.exit(0 if all(r['ok'] for r in results) else 1)
@@ -1,9 +1,7 @@
 import streamlit as st
 import requests
 import json
-import pandas as pd
 from pathlib import Path
-import time
 
 # Configuration
 API_BASE_URL = "http://localhost:8000"
@@ -89,6 +87,46 @@ def get_summary():
         return None, str(e)
 
 
+@st.cache_data(ttl=60, show_spinner=False)
+def get_series_sheets():
+    """Processed sheets with their date range and metrics, from GET /data and GET /series/{sheet}"""
+    sheets = {}
+    response = requests.get(f"{API_BASE_URL}/data", timeout=10)
+    response.raise_for_status()
+    for sheet in response.json():
+        if not sheet['date_column']:
+            continue
+        info = requests.get(f"{API_BASE_URL}/series/{sheet['sheet']}", timeout=60)
+        if info.status_code == 200:
+            sheets[sheet['sheet']] = info.json()
+    return sheets
+
+
+@st.cache_data(ttl=300, max_entries=256, show_spinner=False)
+def get_series_points(sheet, metrics, start, end, width, method):
+    """Points downsampled by the API (GET /series/{sheet}), cached per sheet, metrics and zoom range"""
+    import pandas as pd
+    response = requests.get(f"{API_BASE_URL}/series/{sheet}", timeout=60,
+                            params={"metrics": ",".join(metrics), "from": start, "to": end, "width": width, "method": method})
+    response.raise_for_status()
+    data = response.json()
+    points = pd.DataFrame(data['points'], columns=['date', 'metric', 'value'])
+    points['date'] = pd.to_datetime(points['date'])
+    return points, data['rows']
+
+
+def display_metric_charts():
+    """Time-series charts of the processed sheets; the API downsamples them to the chart width"""
+    from src.utils.charts import metric_charts
+    st.markdown('<p class="section-header">📈 Metrics Over Time</p>', unsafe_allow_html=True)
+    try:
+        sheets = get_series_sheets()
+    except Exception as e:
+        st.markdown(f'<div class="error-box">❌ Could not load the processed sheets: {e}</div>', unsafe_allow_html=True)
+        return
+    metric_charts(sheets, get_series_points, key='dashboard')
+
+
 def display_executive_summary(data):
     """Display executive summary section"""
     st.markdown('<p class="section-header">📊 Executive Summary</p>', unsafe_allow_html=True)
@@ -291,10 +329,11 @@ def main():
         st.markdown("### LLM Response:")
         st.text_area("Response", summary_data['raw_response'], height=400)
         display_raw_response(summary_data)
+        display_metric_charts()
         return
     
     # Display all sections
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Overview", "⚠️ Risks & Opportunities", "🎯 Strategic Actions", "📄 Raw Data"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Overview", "⚠️ Risks & Opportunities", "🎯 Strategic Actions", "📈 Metrics", "📄 Raw Data"])
     
     with tab1:
         display_executive_summary(summary_data)
@@ -312,6 +351,9 @@ def main():
         display_strategic_actions(summary_data)
     
     with tab4:
+        display_metric_charts()
+    
+    with tab5:
         display_raw_response(summary_data)
     
     # Footer
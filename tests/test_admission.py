@@ -0,0 +1,82 @@
+import threading
+import time
+import pytest
+from src.llm.admission import AdmissionController, QueueFull
+
+
+def _wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out waiting for the controller'
+        time.sleep(0.005)
+
+
+def _status(controller, priority='batch'):
+    return controller.status()['classes'][priority]
+
+
+def test_deferred_batch_callers_keep_their_order():
+    controller = AdmissionController(slots=1, queue_depth=2)
+    release, order, threads = threading.Event(), [], []
+
+    def blocker():
+        with controller.admit('batch'):
+            release.wait()
+
+    def caller(name):
+        with controller.admit('batch'):
+            order.append(name)
+            time.sleep(0.01)
+
+    def start(target, *args):
+        thread = threading.Thread(target=target, args=args)
+        thread.start()
+        threads.append(thread)
+
+    start(blocker)
+    _wait_until(lambda: controller.status()['running'] == 1)
+    for i, name in enumerate(['b1', 'b2']):
+        start(caller, name)
+        _wait_until(lambda: _status(controller)['waiting'] == i + 1)
+    for i, name in enumerate(['b3', 'b4', 'b5']):
+        start(caller, name)
+        _wait_until(lambda: _status(controller)['waiting_deferred'] == i + 1)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == ['b1', 'b2', 'b3', 'b4', 'b5']
+    assert _status(controller)['deferred'] == 3
+
+
+def test_full_interactive_queue_rejects():
+    controller = AdmissionController(slots=1, queue_depth=0)
+    with controller.admit('interactive'):
+        with pytest.raises(QueueFull):
+            with controller.admit('interactive'):
+                pass
+    assert _status(controller, 'interactive')['rejected'] == 1
+
+
+def test_interactive_callers_go_first():
+    controller = AdmissionController(slots=1, queue_depth=4)
+    release, order, threads = threading.Event(), [], []
+
+    def blocker():
+        with controller.admit('batch'):
+            release.wait()
+
+    def caller(priority):
+        with controller.admit(priority):
+            order.append(priority)
+
+    threads.append(threading.Thread(target=blocker))
+    threads[-1].start()
+    _wait_until(lambda: controller.status()['running'] == 1)
+    for priority in ('batch', 'interactive'):
+        threads.append(threading.Thread(target=caller, args=(priority,)))
+        threads[-1].start()
+        _wait_until(lambda: _status(controller, priority)['waiting'] == 1)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == ['interactive', 'batch']
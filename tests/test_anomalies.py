@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.preprocessing.anomalies import summarize_anomalies, top_anomalies
+
+
+def _sheet(values):
+    return pd.DataFrame({'Date': pd.date_range('2024-01-01', periods=len(values)), 'Revenue': values})
+
+
+def test_spike_on_flat_series_is_found():
+    picks = top_anomalies(_sheet([100.0] * 40 + [1000.0] + [100.0] * 9), top_n=1)
+    assert [p['row'] for p in picks] == [40]
+    assert picks[0]['date'] == pd.Timestamp('2024-02-10')
+    assert np.isfinite(picks[0]['score'])
+
+
+def test_context_rows_follow_position_not_index():
+    df = _sheet([100.0] * 40 + [1000.0] + [100.0] * 9)
+    df.index = range(100, 150)
+    pick = top_anomalies(df, top_n=1, context_rows=2)[0]
+    assert pick['context']['Revenue'].tolist() == [100.0, 100.0, 1000.0, 100.0, 100.0]
+
+
+def test_summary_has_the_date_span():
+    text = summarize_anomalies({'P&L': _sheet([100.0] * 40 + [1000.0] + [100.0] * 9)})
+    assert 'Sheet: P&L (50 rows, 2024-01-01 to 2024-02-19)' in text
+    assert '#1 2024-02-10' in text
+
+
+@pytest.mark.parametrize('df', [
+    pd.DataFrame({'Updated_By': ['alice', 'bob', 'carol'], 'Revenue': [1.0, 2.0, 3.0]}),
+    pd.DataFrame({'Date': [None, None, None], 'Revenue': [1.0, 2.0, 3.0]}),
+], ids=['text-date-column', 'blank-date-column'])
+def test_summary_without_parseable_dates(df):
+    text = summarize_anomalies({'s': df})
+    assert f"Sheet: s (3 rows), columns: {list(df.columns)}" in text
@@ -0,0 +1,116 @@
+import json
+import time
+import pytest
+from workflow import worker as worker_module
+from workflow.job_queue import JobQueue, MemoryJobQueue, SQLiteJobQueue, QUEUED, RUNNING, SUCCEEDED, FAILED
+from workflow.worker import Worker
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_queue(request, tmp_path):
+    def make(**kwargs):
+        if request.param == 'memory':
+            return MemoryJobQueue(**kwargs)
+        return SQLiteJobQueue(tmp_path / 'jobs.sqlite', **kwargs)
+    return make
+
+
+def test_claim_complete(make_queue):
+    queue = make_queue()
+    job_id = queue.enqueue('analyze', {"workbook": "a.xlsx"})
+    job = queue.claim('w1')
+    assert job.id == job_id and job.attempts == 1 and job.payload == {"workbook": "a.xlsx"}
+    assert queue.claim('w2') is None
+    assert queue.complete(job_id, 'w1', {"ok": True})
+    assert queue.get(job_id).status == SUCCEEDED
+    assert queue.get(job_id).result == {"ok": True}
+
+
+def test_expired_lease_is_taken_over(make_queue):
+    queue = make_queue(lease_seconds=0.05)
+    job_id = queue.enqueue('analyze', {})
+    assert queue.claim('w1').attempts == 1
+    time.sleep(0.1)
+    job = queue.claim('w2')
+    assert job.id == job_id and job.worker == 'w2' and job.attempts == 2
+    # the first worker's late heartbeat and result no longer count
+    assert not queue.heartbeat(job_id, 'w1')
+    assert not queue.complete(job_id, 'w1', {"late": True})
+    assert queue.heartbeat(job_id, 'w2')
+    assert queue.get(job_id).status == RUNNING
+
+
+def test_heartbeat_keeps_the_lease(make_queue):
+    queue = make_queue(lease_seconds=0.2)
+    job_id = queue.enqueue('analyze', {})
+    queue.claim('w1')
+    for _ in range(3):
+        time.sleep(0.1)
+        assert queue.heartbeat(job_id, 'w1')
+    assert queue.claim('w2') is None
+
+
+def test_failed_attempts_retry_then_fail(make_queue):
+    queue = make_queue(max_attempts=2, retry_backoff=0.05)
+    job_id = queue.enqueue('analyze', {})
+    queue.claim('w1')
+    assert queue.fail(job_id, 'w1', 'boom')
+    assert queue.get(job_id).status == QUEUED
+    # backoff: not runnable right away
+    assert queue.claim('w1') is None
+    time.sleep(0.1)
+    assert queue.claim('w1').attempts == 2
+    assert queue.fail(job_id, 'w1', 'boom again')
+    job = queue.get(job_id)
+    assert job.status == FAILED and job.error == 'boom again'
+    assert queue.claim('w1') is None
+
+
+def test_expired_lease_on_last_attempt_fails(make_queue):
+    queue = make_queue(lease_seconds=0.05, max_attempts=1)
+    job_id = queue.enqueue('analyze', {})
+    queue.claim('w1')
+    time.sleep(0.1)
+    assert queue.claim('w2') is None
+    assert queue.get(job_id).status == FAILED
+
+
+def test_worker_runs_jobs_and_records_failures(make_queue, monkeypatch):
+    queue = make_queue(max_attempts=1)
+    monkeypatch.setitem(worker_module.HANDLERS, 'echo', lambda job: {"echo": job.payload['x']})
+    ok_id = queue.enqueue('echo', {"x": 1})
+    bad_id = queue.enqueue('unknown', {})
+    worker = Worker(queue=queue, name='w')
+    worker.run(once=True)
+    assert queue.get(ok_id).status == SUCCEEDED and queue.get(ok_id).result['echo'] == 1
+    assert queue.get(bad_id).status == FAILED and 'no handler' in queue.get(bad_id).error
+
+
+def test_analyze_jobs_use_batch_priority(make_queue, monkeypatch, tmp_path):
+    import workflow.pipeline2_fixed as pipeline
+    calls = []
+
+    def fake_pipeline(**kwargs):
+        calls.append(kwargs)
+        path = tmp_path / 'llm_output.json'
+        path.write_text(json.dumps({"executive_summary": "ok"}), encoding='utf-8')
+        return path
+
+    monkeypatch.setattr(pipeline, 'final_pipeline', fake_pipeline)
+    monkeypatch.setattr(worker_module, 'job_dir', lambda job_id: tmp_path / job_id)
+    queue = make_queue()
+    job_id = queue.enqueue('analyze', {"workbook": str(tmp_path / 'a.xlsx')})
+    Worker(queue=queue, name='w').run(once=True)
+    assert queue.get(job_id).status == SUCCEEDED
+    assert calls[0]['priority'] == 'batch' and calls[0]['resume'] is True
+
+
+def test_incomplete_backend_fails_on_creation():
+    class EnqueueOnly(JobQueue):
+        def enqueue(self, kind, payload, job_id=None, max_attempts=None):
+            return 'job'
+
+    with pytest.raises(TypeError, match='claim'):
+        EnqueueOnly()
+    with pytest.raises(TypeError):
+        JobQueue()
@@ -0,0 +1,13 @@
+import pandas as pd
+import pytest
+from src.ingestion.load_data2 import save_processed, read_sheet
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'csv.zst', 'parquet'])
+def test_save_processed_mixed_type_column(tmp_path, fmt):
+    df = pd.DataFrame({'Note': ['a', 1, 2.5, None], 'Amount': [1, 2, 3, 4]})
+    paths = save_processed({'Notes': df}, tmp_path, fmt=fmt, workers=1)
+    written = read_sheet(paths['Notes'])
+    assert written['Note'].tolist()[:3] == ['a', '1', '2.5']
+    assert pd.isna(written['Note'].iloc[3])
+    assert written['Amount'].tolist() == [1, 2, 3, 4]
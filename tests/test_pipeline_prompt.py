@@ -0,0 +1,13 @@
+import pandas as pd
+from workflow.pipeline2_fixed import sheet_overview
+
+
+def test_sheet_overview_without_parseable_dates():
+    sheets = {
+        'P&L': pd.DataFrame({'Date': pd.date_range('2024-01-01', periods=3), 'Revenue': [1.0, 2.0, 3.0]}),
+        'Log': pd.DataFrame({'Updated_By': ['alice', 'bob', 'carol'], 'Revenue': [1.0, 2.0, 3.0]}),
+    }
+    assert sheet_overview(sheets).splitlines() == [
+        "Sheet: P&L (3 rows, 2024-01-01 to 2024-01-03), columns: ['Date', 'Revenue']",
+        "Sheet: Log (3 rows), columns: ['Updated_By', 'Revenue']",
+    ]
@@ -0,0 +1,235 @@
+import csv
+import glob
+import json
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from src.utils.logger import get_logger
+from src.utils.settings import get_settings
+from src.utils.hashing import file_hash
+from src.llm.admission import admission_slots
+
+logger = get_logger('batch')
+
+"""batch mode: many workbooks -> process pool for ingestion/cleaning -> bounded LLM calls"""
+
+WORKBOOK_SUFFIXES = ('.xlsx', '.xls')
+CHECKPOINT_FILE = 'batch_checkpoint.jsonl'
+REPORT_FILE = 'batch_report.csv'
+REPORT_FIELDS = ['workbook', 'hash', 'status', 'error', 'prepare_seconds', 'queue_seconds', 'llm_seconds',
+                 'total_seconds', 'output', 'finished_at']
+
+
+def discover_workbooks(source: str) -> list:
+    """
+    Workbooks to process from a directory or a glob pattern
+
+    Args:
+        source: Directory (all .xlsx/.xls inside it) or glob such as "data/raw/**/*.xlsx"
+
+    Returns:
+        list: Sorted list of resolved workbook paths
+    """
+    path = Path(source)
+    if path.is_dir():
+        files = [p for p in path.iterdir() if p.suffix.lower() in WORKBOOK_SUFFIXES]
+    else:
+        files = [Path(p) for p in glob.glob(source, recursive=True)]
+    # skip Excel lock files (~$Book.xlsx)
+    files = [p.resolve() for p in files if p.is_file() and not p.name.startswith('~$')]
+    return sorted(set(files))
+
+
+def load_checkpoint(output_root: Path) -> dict:
+    """Completed items from a previous run: {workbook path: checkpoint record}"""
+    checkpoint_path = Path(output_root) / CHECKPOINT_FILE
+    done = {}
+    if not checkpoint_path.exists():
+        return done
+    with open(checkpoint_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # a crash mid-write leaves at most one torn line at the end
+                continue
+            done[record['workbook']] = record
+    return done
+
+
+class CheckpointWriter:
+    """Appends one JSON line per finished workbook, flushed so a crash loses nothing before it"""
+
+    def __init__(self, output_root: Path):
+        self.path = Path(output_root) / CHECKPOINT_FILE
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(record) + '\n')
+                file.flush()
+
+
+def workbook_output_dir(output_root: Path, workbook: Path, digest: str) -> Path:
+    # the hash suffix keeps same-named workbooks from different folders apart
+    return Path(output_root) / f"{workbook.stem.replace(' ', '_')}_{digest[:8]}"
+
+
+def prepare_workbook(workbook: str, out_dir: str) -> dict:
+    """
+    Ingestion + cleaning + KPI cube + prompt building for one workbook (runs in a worker process)
+
+    Returns:
+        dict: prompt and prepare_seconds
+    """
+    from workflow.pipeline2_fixed import load_and_clean_sheets, build_analysis_prompt
+    from src.preprocessing.rollups import build_rollups, CUBE_FILE
+
+    start = time.perf_counter()
+    out_dir = Path(out_dir)
+    all_dfs = load_and_clean_sheets(Path(workbook), out_dir / 'processed', out_dir)
+    build_rollups(all_dfs, out_dir / CUBE_FILE)
+    prompt = build_analysis_prompt(all_dfs)
+    return {"prompt": prompt, "prepare_seconds": round(time.perf_counter() - start, 3)}
+
+
+def analyze_prepared(prompt: str, out_dir: Path, latency_budget: float = None) -> dict:
+    """LLM call + saving the summary for one prepared workbook (runs on an LLM thread)"""
+    from workflow.pipeline2_fixed import final_generate_summary, save_summary
+    from src.llm.admission import last_timing
+
+    summary = final_generate_summary(prompt, latency_budget=latency_budget, priority='batch')
+    timing = last_timing()
+    output = save_summary(summary, out_dir)
+    return {"output": str(output), "queue_seconds": timing.get('queue_wait'), "llm_seconds": timing.get('inference')}
+
+
+def write_report(output_root: Path, records: list) -> Path:
+    report_path = Path(output_root) / REPORT_FILE
+    with open(report_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=REPORT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+    return report_path
+
+
+def run_batch(source: str, output_root: Path, workers: int = None, llm_concurrency: int = None,
+              resume: bool = True, latency_budget: float = None) -> dict:
+    """
+    Analyze every workbook matched by `source`
+
+    Ingestion/cleaning runs in a process pool, LLM calls in a thread pool bounded by
+    llm_concurrency. Each finished workbook is appended to batch_checkpoint.jsonl, so
+    a rerun with resume=True skips workbooks that already succeeded (and haven't changed).
+
+    Args:
+        source: Directory or glob of workbooks
+        output_root: Directory for per-workbook outputs, checkpoint and report
+        workers: Processes for ingestion/cleaning (default: pipeline.workers setting)
+        llm_concurrency: Batch LLM calls submitted at once (default: the admission slots,
+            llm.max_concurrency per backend); they queue behind interactive calls and at most
+            that many run at a time
+        resume: Skip workbooks already completed in the checkpoint
+        latency_budget: Seconds allowed per LLM call (None = no limit)
+
+    Returns:
+        dict: counts plus report and checkpoint paths
+    """
+    settings = get_settings()
+    workers = workers or settings.pipeline.workers
+    slots = admission_slots(settings)
+    llm_concurrency = llm_concurrency or slots
+    if llm_concurrency > slots:
+        logger.warning(f'llm_concurrency={llm_concurrency} but there are {slots} LLM slots: '
+                       f'extra batch calls will wait in the LLM queue')
+    output_root = Path(output_root)
+    output_root.mkdir(parents=True, exist_ok=True)
+
+    workbooks = discover_workbooks(source)
+    logger.info(f'found {len(workbooks)} workbooks in {source}')
+    previous = load_checkpoint(output_root) if resume else {}
+    checkpoint = CheckpointWriter(output_root)
+
+    records = {}
+    pending = []
+    for workbook in workbooks:
+        digest = file_hash(workbook)
+        done = previous.get(str(workbook))
+        if done and done.get('status') == 'success' and done.get('hash') == digest:
+            records[str(workbook)] = dict(done, status='skipped')
+            continue
+        pending.append((workbook, digest))
+    logger.info(f'{len(records)} already done, {len(pending)} to process '
+                f'(workers={workers}, llm_concurrency={llm_concurrency})')
+
+    def finish(record: dict):
+        record['finished_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        records[record['workbook']] = record
+        checkpoint.write(record)
+        logger.info(f"[{len(records)}/{len(workbooks)}] {record['status']}: {record['workbook']}")
+
+    def llm_stage(record: dict, prompt: str, started: float):
+        try:
+            record.update(analyze_prepared(prompt, Path(record['output']), latency_budget))
+            record['status'] = 'success'
+        except Exception as e:
+            record.update(status='failed', error=f'llm: {type(e).__name__}: {e}')
+        record['total_seconds'] = round(time.perf_counter() - started, 3)
+        finish(record)
+
+    # spawn (not fork): safe when called from a threaded server, and the same on Windows
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as processes, \
+            ThreadPoolExecutor(max_workers=llm_concurrency, thread_name_prefix='batch-llm') as llm_threads:
+        started = {}
+        futures = {}
+        for workbook, digest in pending:
+            out_dir = workbook_output_dir(output_root, workbook, digest)
+            record = {"workbook": str(workbook), "hash": digest, "output": str(out_dir), "error": ""}
+            started[str(workbook)] = time.perf_counter()
+            futures[processes.submit(prepare_workbook, str(workbook), str(out_dir))] = record
+
+        llm_futures = []
+        for future in as_completed(futures):
+            record = futures[future]
+            begin = started[record['workbook']]
+            try:
+                prepared = future.result()
+            except Exception as e:
+                record.update(status='failed', error=f'prepare: {type(e).__name__}: {e}',
+                              total_seconds=round(time.perf_counter() - begin, 3))
+                finish(record)
+                continue
+            record['prepare_seconds'] = prepared['prepare_seconds']
+            llm_futures.append(llm_threads.submit(llm_stage, record, prepared['prompt'], begin))
+        for future in llm_futures:
+            future.result()
+
+    ordered = [records[str(w)] for w in workbooks if str(w) in records]
+    report_path = write_report(output_root, ordered)
+    counts = {status: sum(1 for r in ordered if r['status'] == status)
+              for status in ('success', 'failed', 'skipped')}
+    logger.info(f'batch finished: {counts}, report at {report_path}')
+    return {"total": len(workbooks), **counts,
+            "report": str(report_path), "checkpoint": str(checkpoint.path)}
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='analyze a directory/glob of workbooks with a resumable checkpoint')
+    parser.add_argument('source', type=str, help='directory or glob, e.g. "data/raw/*.xlsx"')
+    parser.add_argument('--output', type=str, default=str(Path(get_settings().paths.outputs_dir) / 'batch'),
+                        help='directory for per-workbook outputs, checkpoint and report')
+    parser.add_argument('--workers', type=int, default=None, help='processes for ingestion/cleaning')
+    parser.add_argument('--llm-concurrency', type=int, default=None, help='LLM calls in flight')
+    parser.add_argument('--no-resume', action='store_true', help='ignore the checkpoint and redo every workbook')
+    parser.add_argument('--latency-budget', type=float, default=None, help='seconds allowed per LLM call')
+    args = parser.parse_args()
+
+    result = run_batch(args.source, Path(args.output), workers=args.workers,
+                       llm_concurrency=args.llm_concurrency, resume=not args.no_resume,
+                       latency_budget=args.latency_budget)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from src.utils.logger import get_logger
+from src.utils.hashing import text_hash
+
+logger = get_logger('stage checkpoints')
+
+"""per-stage checkpoints for final_pipeline, so a rerun with --resume starts at the first incomplete stage"""
+
+CHECKPOINT_DIR = '.checkpoints'
+MANIFEST = 'manifest.json'
+
+# bump a stage's version whenever its output changes meaning; older checkpoints then stop matching
+STAGE_VERSIONS = {
+    'clean': 1,       # steps 1-3: load, save raw sheets, clean
+    'rollups': 1,     # KPI rollup cube
+    'prompt': 2,      # steps 4-5: context + final prompt
+    'llm': 1,         # step 6: LLM response
+}
+
+
+def stage_key(stage: str, upstream: str, *params) -> str:
+    """Key of a stage run: the upstream key (the input hash for the first stage), the stage version and its parameters"""
+    return text_hash(stage, STAGE_VERSIONS[stage], upstream, *params)
+
+
+class StageCheckpoints:
+    """
+    Checkpoints under <output_dir>/.checkpoints/<stage>/
+
+    Each stage keeps only its latest checkpoint: a directory holding the stage's files
+    plus a manifest with its key and the side-effect files it produced (processed CSVs,
+    the rollup cube, ...). A checkpoint counts only if the key matches and those files
+    still exist, so deleting an output forces that stage to run again.
+    """
+
+    def __init__(self, output_dir: Path, resume: bool = False):
+        self.root = Path(output_dir) / CHECKPOINT_DIR
+        self.resume = resume
+
+    def load(self, stage: str, key: str):
+        """
+        Directory of a completed checkpoint for this key, if resuming and it is still valid
+
+        Returns:
+            Path or None
+        """
+        if not self.resume:
+            return None
+        entry = self.root / stage
+        try:
+            with open(entry / MANIFEST, 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if manifest.get('key') != key:
+            logger.info(f'{stage}: checkpoint is for different inputs or stage version, rerunning')
+            return None
+        missing = [p for p in manifest.get('outputs', []) if not Path(p).exists()]
+        if missing:
+            logger.info(f'{stage}: checkpoint outputs missing ({missing[0]}), rerunning')
+            return None
+        logger.info(f"{stage}: resuming from checkpoint of {manifest.get('created')}")
+        return entry
+
+    def save(self, stage: str, key: str, write=None, outputs: list = ()) -> Path:
+        """
+        Record a completed stage
+
+        Args:
+            stage: Stage name (a key of STAGE_VERSIONS)
+            key: stage_key() of this run
+            write: write(directory) storing the stage's results in the checkpoint directory (optional)
+            outputs: Files the stage produced elsewhere that must still exist to reuse it
+
+        Returns:
+            Path: The checkpoint directory
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        entry = self.root / stage
+        tmp_entry = self.root / f'.tmp-{stage}-{uuid.uuid4().hex}'
+        tmp_entry.mkdir()
+        if write is not None:
+            write(tmp_entry)
+        manifest = {"stage": stage, "version": STAGE_VERSIONS[stage], "key": key,
+                    "created": time.strftime('%Y-%m-%dT%H:%M:%S'), "outputs": [str(p) for p in outputs]}
+        with open(tmp_entry / MANIFEST, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=2)
+        # a directory can't be replaced atomically; a crash between the two steps just loses this checkpoint
+        if entry.exists():
+            shutil.rmtree(entry)
+        os.replace(tmp_entry, entry)
+        return entry
+
+    def status(self) -> dict:
+        """stage -> manifest of its checkpoint (stages without one are left out)"""
+        found = {}
+        for stage in STAGE_VERSIONS:
+            try:
+                with open(self.root / stage / MANIFEST, 'r', encoding='utf-8') as file:
+                    found[stage] = json.load(file)
+            except (OSError, json.JSONDecodeError):
+                continue
+        return found
@@ -0,0 +1,192 @@
+"""incremental re-analysis: the last structured summary, the date range it covered, and which rows arrived since"""
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+import pandas as pd
+from src.utils.logger import get_logger
+from src.utils.hashing import bytes_hash, text_hash
+from src.preprocessing.cross_sheet import find_date_column
+
+logger = get_logger('incremental')
+
+STATE_FILE = 'analysis_state.json'
+# bump when the stored state or the merge changes meaning; older states then force a full run
+STATE_VERSION = 1
+SUMMARY_FIELDS = ('executive_summary', 'risks', 'opportunities', 'actions')
+# metrics whose mean moved less than this (percent) are left out of the update prompt
+MIN_CHANGE_PCT = 5.0
+
+
+def _dates(df: pd.DataFrame, date_column: str) -> pd.Series:
+    return pd.to_datetime(df[date_column], errors='coerce')
+
+
+def history_hash(df: pd.DataFrame, date_column: str) -> str:
+    """
+    Hash of a sheet's rows that doesn't depend on how they were read
+
+    Dates are parsed and numbers compared as float64, so the same rows hash the same whether
+    they come from the cleaned CSV or from a parquet checkpoint.
+    """
+    canonical = {}
+    for col in df.columns:
+        if col == date_column:
+            canonical[col] = _dates(df, col)
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            canonical[col] = df[col].astype('float64')
+        else:
+            canonical[col] = df[col].astype(str)
+    hashed = pd.util.hash_pandas_object(pd.DataFrame(canonical), index=False).to_numpy()
+    return text_hash([str(c) for c in df.columns], bytes_hash(hashed.tobytes()))
+
+
+def coverage(all_dfs: dict) -> dict:
+    """
+    sheet -> date column, first/last date, rows and hash of the dated rows
+
+    Returns:
+        dict, or None if a sheet has no usable date column (such workbooks always run in full)
+    """
+    sheets = {}
+    for name, df in all_dfs.items():
+        date_column = find_date_column(df)
+        if date_column is None:
+            return None
+        dates = _dates(df, date_column)
+        if dates.isna().all():
+            return None
+        end = dates.max()
+        covered = df[dates <= end]
+        sheets[name] = {"date_column": str(date_column), "start": dates.min().isoformat(), "end": end.isoformat(),
+                        "rows": int(len(covered)), "hash": history_hash(covered, date_column)}
+    return sheets
+
+
+def load_state(output_dir: Path):
+    """State saved by the last successful analysis in output_dir; None if there is none"""
+    try:
+        with open(Path(output_dir) / STATE_FILE, 'r', encoding='utf-8') as file:
+            state = json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return state if state.get('version') == STATE_VERSION else None
+
+
+def structured_summary(response) -> dict:
+    """LLM response as a dict with executive_summary, risks, opportunities and actions; None otherwise"""
+    if isinstance(response, str):
+        try:
+            response = json.loads(response)
+        except json.JSONDecodeError:
+            return None
+    if not isinstance(response, dict) or any(name not in response for name in SUMMARY_FIELDS):
+        return None
+    return response
+
+
+def save_state(output_dir: Path, all_dfs: dict, summary: dict, params: str, merges: int = 0,
+               prompt_chars: int = None):
+    """
+    Record a structured summary and the data it covers (written atomically)
+
+    Args:
+        output_dir: Pipeline output directory
+        all_dfs: sheet_name -> cleaned DataFrame the summary was made from
+        summary: Parsed LLM summary
+        params: Key of the analysis settings; a different key forces a full run
+        merges: Incremental updates since the last full analysis
+        prompt_chars: Prompt size of the last full analysis, to report what a delta run saves
+    """
+    sheets = coverage(all_dfs)
+    if sheets is None:
+        logger.info('not saving analysis state: a sheet has no date column')
+        return
+    state = {"version": STATE_VERSION, "params": params, "merges": merges, "prompt_chars": prompt_chars,
+             "sheets": sheets, "summary": summary, "created": time.strftime('%Y-%m-%dT%H:%M:%S')}
+    path = Path(output_dir) / STATE_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(state, file, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+@dataclass
+class IncrementalPlan:
+    mode: str                       # full | unchanged | delta
+    reason: str = ''
+    state: dict = None
+    new_rows: dict = field(default_factory=dict)   # sheet -> rows dated after the stored coverage
+    since: str = None               # last date the stored summary covers
+    until: str = None               # last date of the new rows
+
+
+def plan_incremental(state: dict, all_dfs: dict, params: str, max_delta: float = 0.5, max_merges: int = 6) -> IncrementalPlan:
+    """
+    Decide how much of the analysis has to run again
+
+    A delta run needs the same settings and sheets as the stored state, and the stored rows must
+    be unchanged (same count and hash). The new rows must also stay under max_delta of the
+    history, and the summary must have been merged fewer than max_merges times. Otherwise the
+    whole analysis runs again.
+    """
+    if state is None:
+        return IncrementalPlan('full', 'no previous analysis state')
+    if state.get('params') != params:
+        return IncrementalPlan('full', 'analysis settings changed')
+    if set(state['sheets']) != set(all_dfs):
+        return IncrementalPlan('full', 'the workbook has different sheets')
+    if state.get('merges', 0) >= max_merges:
+        return IncrementalPlan('full', f"{state['merges']} incremental updates since the last full analysis")
+    new_rows, old_total, until = {}, 0, None
+    for name, df in all_dfs.items():
+        stored = state['sheets'][name]
+        date_column = stored['date_column']
+        if date_column not in df.columns:
+            return IncrementalPlan('full', f'{name}: date column {date_column!r} is gone')
+        dates = _dates(df, date_column)
+        end = pd.Timestamp(stored['end'])
+        covered = df[dates <= end]
+        if len(covered) != stored['rows'] or history_hash(covered, date_column) != stored['hash']:
+            return IncrementalPlan('full', f"{name}: rows up to {stored['end'][:10]} changed")
+        added = df[dates > end]
+        old_total += len(covered)
+        if len(added):
+            new_rows[name] = added
+            last = dates[dates > end].max()
+            until = last if until is None else max(until, last)
+    if not new_rows:
+        return IncrementalPlan('unchanged', 'no rows after the stored analysis', state=state)
+    added_total = sum(len(df) for df in new_rows.values())
+    if added_total > max_delta * old_total:
+        return IncrementalPlan('full', f'{added_total} new rows is more than {max_delta:.0%} of the {old_total} analyzed')
+    since = max(s['end'] for s in state['sheets'].values())
+    return IncrementalPlan('delta', f'{added_total} new rows', state=state, new_rows=new_rows,
+                           since=since, until=until.isoformat())
+
+
+def period_comparison(all_dfs: dict, new_rows: dict, min_change_pct: float = MIN_CHANGE_PCT) -> dict:
+    """
+    sheet -> metrics whose mean over the new rows moved by min_change_pct or more
+
+    The baseline is the same number of rows just before the new ones. Steady metrics are left
+    out, so the update prompt grows with what changed rather than with the number of columns.
+    Sheets with no such metric are left out too.
+    """
+    tables = {}
+    for name, added in new_rows.items():
+        df = all_dfs[name]
+        prior = df.drop(index=added.index).tail(len(added))
+        numeric = [c for c in added.columns if pd.api.types.is_numeric_dtype(added[c])]
+        if not numeric or prior.empty:
+            continue
+        new_mean, prior_mean = added[numeric].mean(), prior[numeric].mean()
+        change_pct = (new_mean - prior_mean) / prior_mean.abs().where(prior_mean != 0) * 100
+        moved = (change_pct.abs() >= min_change_pct) | ((prior_mean == 0) & (new_mean != 0))
+        if not moved.any():
+            continue
+        tables[name] = pd.DataFrame({"metric": new_mean.index[moved], "previous": prior_mean[moved].values,
+                                     "new_period": new_mean[moved].values, "change_pct": change_pct[moved].values})
+    return tables
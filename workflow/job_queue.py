@@ -0,0 +1,332 @@
+"""
+Durable job queue for analysis jobs
+
+The API enqueues jobs, and any number of worker processes (`python -m workflow.worker`)
+claim them. A claim is a lease: the worker must heartbeat before lease_seconds run out.
+If it dies, the lease expires and the next claim picks the job up again, up to
+max_attempts in total. Failed attempts are retried after retry_backoff seconds, doubled
+each time.
+
+Backends:
+- sqlite (default): one database file. WAL mode and BEGIN IMMEDIATE make claims safe
+  across processes. Workers on several nodes need the file on storage they all reach
+  (and whose locking SQLite trusts).
+- memory: a stand-in for a single process, for development and tests.
+
+Other backends can be added with register_backend(name, factory).
+"""
+import json
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from src.utils.logger import get_logger
+from src.utils.settings import get_settings, resolve_path
+
+logger = get_logger('job queue')
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    payload: dict
+    status: str = QUEUED
+    attempts: int = 0
+    max_attempts: int = 3
+    worker: str = None
+    lease_expires: float = None
+    available_at: float = 0.0
+    result: dict = None
+    error: str = None
+    created: float = field(default_factory=time.time)
+    updated: float = field(default_factory=time.time)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class JobQueue(ABC):
+    """
+    Interface every backend implements; all times are wall-clock seconds (time.time())
+
+    A backend missing one of the abstract methods fails when it is created, not in the middle of a job.
+    """
+
+    def __init__(self, lease_seconds: float = 120, max_attempts: int = 3, retry_backoff: float = 10):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+
+    @abstractmethod
+    def enqueue(self, kind: str, payload: dict, job_id: str = None, max_attempts: int = None) -> str:
+        """Add a job; returns its id"""
+
+    @abstractmethod
+    def claim(self, worker: str):
+        """Lease the oldest runnable job (queued, or running with an expired lease) to worker; None if there is none"""
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        """Extend the lease; False if the job is no longer this worker's (lease lost)"""
+
+    @abstractmethod
+    def complete(self, job_id: str, worker: str, result: dict) -> bool:
+        """Record the result; False if the job is no longer this worker's (lease lost)"""
+
+    @abstractmethod
+    def fail(self, job_id: str, worker: str, error: str) -> bool:
+        """Record a failed attempt: back to queued after the backoff, or failed for good after max_attempts"""
+
+    @abstractmethod
+    def get(self, job_id: str):
+        """The Job with this id; None if there is none"""
+
+    @abstractmethod
+    def counts(self) -> dict:
+        """status -> number of jobs"""
+
+    def _retry_at(self, attempts: int, now: float) -> float:
+        return now + self.retry_backoff * 2 ** max(0, attempts - 1)
+
+
+class MemoryJobQueue(JobQueue):
+    """In-process stand-in: same semantics, nothing survives a restart"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, kind: str, payload: dict, job_id: str = None, max_attempts: int = None) -> str:
+        job = Job(id=job_id or uuid.uuid4().hex, kind=kind, payload=payload,
+                  max_attempts=max_attempts or self.max_attempts)
+        with self._lock:
+            self._jobs[job.id] = job
+        return job.id
+
+    def claim(self, worker: str):
+        now = time.time()
+        with self._lock:
+            for job in sorted(self._jobs.values(), key=lambda j: j.created):
+                expired = job.status == RUNNING and job.lease_expires < now
+                if expired and job.attempts >= job.max_attempts:
+                    job.status, job.error, job.updated = FAILED, f'lease expired on {job.worker}', now
+                    continue
+                if (job.status == QUEUED and job.available_at <= now) or expired:
+                    job.status, job.worker, job.lease_expires = RUNNING, worker, now + self.lease_seconds
+                    job.attempts += 1
+                    job.updated = now
+                    return Job(**job.to_dict())
+        return None
+
+    def _owned(self, job_id: str, worker: str):
+        job = self._jobs.get(job_id)
+        return job if job is not None and job.status == RUNNING and job.worker == worker else None
+
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        with self._lock:
+            job = self._owned(job_id, worker)
+            if job is None:
+                return False
+            job.lease_expires = time.time() + self.lease_seconds
+            return True
+
+    def complete(self, job_id: str, worker: str, result: dict) -> bool:
+        with self._lock:
+            job = self._owned(job_id, worker)
+            if job is None:
+                return False
+            job.status, job.result, job.error, job.updated = SUCCEEDED, result, None, time.time()
+            return True
+
+    def fail(self, job_id: str, worker: str, error: str) -> bool:
+        now = time.time()
+        with self._lock:
+            job = self._owned(job_id, worker)
+            if job is None:
+                return False
+            job.error, job.updated, job.worker = error, now, None
+            if job.attempts >= job.max_attempts:
+                job.status = FAILED
+            else:
+                job.status, job.available_at = QUEUED, self._retry_at(job.attempts, now)
+            return True
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return Job(**job.to_dict()) if job else None
+
+    def counts(self) -> dict:
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    available_at REAL NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_runnable ON jobs (status, available_at, created);
+"""
+
+
+class SQLiteJobQueue(JobQueue):
+    def __init__(self, db_path: Path, **kwargs):
+        super().__init__(**kwargs)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # autocommit mode; write paths open their own BEGIN IMMEDIATE so two claims can't pick the same row
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _job(row) -> Job:
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return Job(**job)
+
+    def enqueue(self, kind: str, payload: dict, job_id: str = None, max_attempts: int = None) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute('INSERT INTO jobs (id, kind, payload, status, max_attempts, created, updated) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (job_id, kind, json.dumps(payload), QUEUED, max_attempts or self.max_attempts, now, now))
+        return job_id
+
+    def claim(self, worker: str):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute("UPDATE jobs SET status = ?, error = 'lease expired on ' || worker, updated = ? "
+                             "WHERE status = ? AND lease_expires < ? AND attempts >= max_attempts",
+                             (FAILED, now, RUNNING, now))
+                row = conn.execute('SELECT id FROM jobs WHERE (status = ? AND available_at <= ?) '
+                                   'OR (status = ? AND lease_expires < ?) ORDER BY created LIMIT 1',
+                                   (QUEUED, now, RUNNING, now)).fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    return None
+                conn.execute('UPDATE jobs SET status = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, '
+                             'updated = ? WHERE id = ?', (RUNNING, worker, now + self.lease_seconds, now, row['id']))
+                job = self._job(conn.execute('SELECT * FROM jobs WHERE id = ?', (row['id'],)).fetchone())
+                conn.execute('COMMIT')
+                return job
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def _update_owned(self, job_id: str, worker: str, assignments: str, params: tuple) -> bool:
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ? AND status = ? AND worker = ?',
+                                  params + (job_id, RUNNING, worker))
+            return cursor.rowcount == 1
+
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        return self._update_owned(job_id, worker, 'lease_expires = ?', (time.time() + self.lease_seconds,))
+
+    def complete(self, job_id: str, worker: str, result: dict) -> bool:
+        return self._update_owned(job_id, worker, 'status = ?, result = ?, error = NULL, updated = ?',
+                                  (SUCCEEDED, json.dumps(result), time.time()))
+
+    def fail(self, job_id: str, worker: str, error: str) -> bool:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = ? AND worker = ?',
+                                   (job_id, RUNNING, worker)).fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    return False
+                if row['attempts'] >= row['max_attempts']:
+                    conn.execute('UPDATE jobs SET status = ?, error = ?, worker = NULL, updated = ? WHERE id = ?',
+                                 (FAILED, error, now, job_id))
+                else:
+                    conn.execute('UPDATE jobs SET status = ?, error = ?, worker = NULL, available_at = ?, updated = ? '
+                                 'WHERE id = ?', (QUEUED, error, self._retry_at(row['attempts'], now), now, job_id))
+                conn.execute('COMMIT')
+                return True
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def get(self, job_id: str):
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def counts(self) -> dict:
+        with closing(self._connect()) as conn:
+            return {row['status']: row['n'] for row in
+                    conn.execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status')}
+
+
+def _sqlite_backend(settings) -> JobQueue:
+    return SQLiteJobQueue(resolve_path(settings.jobs.db_path), **_queue_options(settings))
+
+
+def _memory_backend(settings) -> JobQueue:
+    return MemoryJobQueue(**_queue_options(settings))
+
+
+def _queue_options(settings) -> dict:
+    return {"lease_seconds": settings.jobs.lease_seconds, "max_attempts": settings.jobs.max_attempts,
+            "retry_backoff": settings.jobs.retry_backoff}
+
+
+# backend name -> factory(settings) -> JobQueue
+BACKENDS = {'sqlite': _sqlite_backend, 'memory': _memory_backend}
+
+
+def register_backend(name: str, factory):
+    """Make factory(settings) available as jobs.backend = name"""
+    BACKENDS[name] = factory
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide queue for the configured jobs.backend"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            settings = get_settings()
+            try:
+                factory = BACKENDS[settings.jobs.backend]
+            except KeyError:
+                raise ValueError(f'unknown job queue backend {settings.jobs.backend!r}, expected one of {sorted(BACKENDS)}')
+            _queue = factory(settings)
+        return _queue
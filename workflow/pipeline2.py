@@ -26,13 +26,13 @@ def final_pipeline(raw_excel_path: Path, processed_path: Path, output_dir: Path)
     # return sheets
 
     # saving sheets
-    save_processed(sheets=sheets, output_dir=processed_dir)
+    processed_paths = save_processed(sheets=sheets, output_dir=processed_dir)
     
     # generating summaries
     summaries = {}
     all_dfs = {}
     for sheet_name in sheets:
-        input_csv = processed_dir / f"{sheet_name.replace(' ','_')}.csv"
+        input_csv = processed_paths[sheet_name]  # .csv, .csv.zst or .parquet per artifact_format
         output_csv = output_dirs / f"processed_{sheet_name.replace(' ', '_')}.csv"
         process_sheet(csv_path=input_csv, out_path=output_csv)
         
@@ -1,28 +1,57 @@
 import json
 from pathlib import Path
-from src.ingestion.load_data2 import load_excel_to_dfs, save_processed
+from src.ingestion.load_data2 import load_excel_to_dfs, save_processed, write_sheet, read_sheet
 from src.preprocessing.clean_transform import basic_cleaning, process_sheet
-from src.llm.prompt_template2 import build_summary_prompt
+from src.preprocessing.cross_sheet import summarize_cross_sheet
+from src.preprocessing.rollups import build_rollups, CUBE_FILE
+from src.preprocessing.anomalies import summarize_anomalies
+from src.llm.serialize import serialize_sheets, serialize_frame, count_tokens
+from src.llm.prompt_template2 import build_summary_prompt, build_digest_prompt, build_update_prompt
 from src.llm.generate_insights import call_llm, generate_summary
 import logging
 from src.utils.logger import get_logger
+from src.utils.settings import get_settings
+from src.utils.hashing import file_hash, text_hash
+from src.utils.singleflight import SingleFlight
+from src.utils.profiling import profile_stage, add_profile_arguments, maybe_profile
+from workflow.checkpoints import StageCheckpoints, stage_key
+from workflow.incremental import (load_state, save_state, plan_incremental, period_comparison, structured_summary,
+                                  IncrementalPlan, MIN_CHANGE_PCT)
 import pandas as pd
 
 logger = get_logger('pipeline')
 logger.info('pipeline file execution started')
 
-DEFAULT_RAW = Path('data/raw/Financial_data_final.xlsx')
+# identical analyses running at the same time share one run
+_analysis_flight = SingleFlight('analysis')
 
 """covering ingesting > preprocessing > LLM insights"""
 
-def final_pipeline(raw_excel_path: Path, processed_path: Path, output_dir: Path):
+def final_pipeline(raw_excel_path: Path, processed_path: Path, output_dir: Path,
+                   digest_sheets: bool = False, latency_budget: float = None, resume: bool = False,
+                   incremental: bool = False, priority: str = 'interactive'):
     """
     Complete data pipeline: ingestion -> preprocessing -> LLM analysis
     
+    Every stage leaves a checkpoint in <output_dir>/.checkpoints keyed by the workbook
+    hash, the stage version and the settings it used. With resume=True, stages whose
+    checkpoint matches are loaded instead of rerun, so retrying after a failed LLM call
+    costs only the LLM call.
+    
+    A structured summary is stored with the date range it covers (analysis_state.json).
+    With incremental=True, a workbook that only gained rows after that range gets one short
+    call updating the stored summary with the metrics that moved, instead of a full analysis.
+    
     Args:
         raw_excel_path: Path to raw Excel file
         processed_path: Directory for processed CSV files
         output_dir: Directory for final outputs
+        digest_sheets: Summarize each sheet with the small model first and send
+            only the digests to the final synthesis call
+        latency_budget: Seconds allowed per LLM call (None = no limit)
+        resume: Start at the first stage without a matching checkpoint
+        incremental: Re-analyze only rows added since the stored analysis when possible
+        priority: LLM admission class, 'interactive' or 'batch' (queued jobs)
         
     Returns:
         Path: Path to the saved summary JSON file
@@ -31,53 +60,292 @@ def final_pipeline(raw_excel_path: Path, processed_path: Path, output_dir: Path)
     output_dirs = Path(output_dir)
     output_dirs.mkdir(parents=True, exist_ok=True)
     processed_dir.mkdir(parents=True, exist_ok=True)
+    settings = get_settings()
+    pipeline_settings = settings.pipeline
+    checkpoints = StageCheckpoints(output_dirs, resume=resume)
+
+    # Steps 1-3: Load, save and clean all sheets
+    clean_key = stage_key('clean', file_hash(raw_excel_path), str(Path(processed_dir).resolve()),
+                          pipeline_settings.artifact_format)
+    entry = checkpoints.load('clean', clean_key)
+    if entry is not None:
+        with open(entry / 'sheets.json', 'r', encoding='utf-8') as file:
+            sheet_files = json.load(file)
+        all_dfs = {name: read_sheet(entry / file_name) for name, file_name in sheet_files.items()}
+    else:
+        all_dfs = load_and_clean_sheets(raw_excel_path, processed_dir, output_dirs)
+
+        def write_frames(directory: Path):
+            sheet_files = {}
+            for i, (name, df) in enumerate(all_dfs.items()):
+                write_sheet(df, directory / f'{i}.parquet', fmt='parquet')
+                sheet_files[name] = f'{i}.parquet'
+            with open(directory / 'sheets.json', 'w', encoding='utf-8') as file:
+                json.dump(sheet_files, file)
+
+        checkpoints.save('clean', clean_key, write_frames, outputs=[cleaned_csv_path(output_dirs, name) for name in all_dfs])
+    
+    # Materialize day..year rollups for GET /kpis
+    cube_path = output_dirs / CUBE_FILE
+    rollups_key = stage_key('rollups', clean_key)
+    if checkpoints.load('rollups', rollups_key) is None:
+        logger.info('Building KPI rollup cube...')
+        with profile_stage('rollups'):
+            build_rollups(all_dfs, cube_path)
+        checkpoints.save('rollups', rollups_key, outputs=[cube_path])
+    
+    # Incremental mode: reuse the stored analysis, or send the LLM only the rows added since it
+    params_key = incremental_params(digest_sheets)
+    if incremental:
+        plan = plan_incremental(load_state(output_dirs), all_dfs, params_key,
+                                max_delta=pipeline_settings.incremental_max_delta,
+                                max_merges=pipeline_settings.incremental_max_merges)
+        if plan.mode == 'unchanged':
+            logger.info('Incremental: no rows after the stored analysis, reusing it without an LLM call')
+            return save_summary(plan.state['summary'], output_dirs)
+        if plan.mode == 'delta':
+            update_prompt = build_incremental_prompt(plan, all_dfs)
+            full_chars = plan.state.get('prompt_chars')
+            if update_prompt is None:
+                logger.info(f'Incremental: {plan.reason}, no metric moved by {MIN_CHANGE_PCT:g}% or more; '
+                            'keeping the stored analysis without an LLM call')
+                save_state(output_dirs, all_dfs, plan.state['summary'], params_key,
+                           merges=plan.state.get('merges', 0) + 1, prompt_chars=full_chars)
+                return save_summary(plan.state['summary'], output_dirs)
+            if not full_chars or len(update_prompt) < full_chars:
+                return run_incremental(plan, update_prompt, all_dfs, params_key, output_dirs,
+                                       latency_budget=latency_budget, priority=priority)
+            plan.reason = f'the update prompt ({len(update_prompt)} characters) is no smaller than the full one ({full_chars})'
+        logger.info(f'Incremental: running the full analysis ({plan.reason})')
+    
+    # Steps 4-5: Build the context and the final prompt
+    prompt_key = stage_key('prompt', clean_key, digest_sheets, latency_budget if digest_sheets else None,
+                           settings.llm.small_model if digest_sheets else None, pipeline_settings.row_limit,
+                           pipeline_settings.anomaly_top_n, pipeline_settings.anomaly_window,
+                           pipeline_settings.anomaly_context_rows, pipeline_settings.prompt_format,
+                           pipeline_settings.sig_figs)
+    entry = checkpoints.load('prompt', prompt_key)
+    if entry is not None:
+        final_prompt = (entry / 'prompt.txt').read_text(encoding='utf-8')
+    else:
+        final_prompt = build_analysis_prompt(all_dfs, digest_sheets=digest_sheets, latency_budget=latency_budget,
+                                             output_dir=output_dirs, priority=priority)
+        checkpoints.save('prompt', prompt_key, lambda d: (d / 'prompt.txt').write_text(final_prompt, encoding='utf-8'),
+                         outputs=[output_dirs / 'sheet_digests.json'] if digest_sheets else [])
+    
+    # Step 6: Generate summary from LLM
+    llm_key = stage_key('llm', prompt_key, settings.llm.model, latency_budget)
+    entry = checkpoints.load('llm', llm_key)
+    if entry is not None:
+        summary = (entry / 'response.txt').read_text(encoding='utf-8')
+    else:
+        logger.info('Step 6: Generating comprehensive summary from LLM...')
+        try:
+            with profile_stage('llm'):
+                summary = final_generate_summary(final_prompt, latency_budget=latency_budget, priority=priority)
+            logger.info('✅ Summary generated successfully')
+            checkpoints.save('llm', llm_key, lambda d: (d / 'response.txt').write_text(summary, encoding='utf-8'))
+        except Exception as e:
+            logger.error(f'❌ LLM failed: {e} (rerun with --resume to retry only the LLM call)')
+            summary = {"error": str(e), "error_type": type(e).__name__}
+    
+    # Step 7: Save summary to JSON file, and remember it for the next incremental run
+    summary_path = save_summary(summary, output_dirs)
+    structured = structured_summary(summary)
+    if structured is not None:
+        save_state(output_dirs, all_dfs, structured, params_key, prompt_chars=len(final_prompt))
+    elif not isinstance(summary, dict):
+        logger.warning('Summary is not structured JSON, the next incremental run will be a full one')
+    return summary_path
+
+
+def incremental_params(digest_sheets: bool = False) -> str:
+    """Every setting that changes the analysis, apart from the workbook itself; stored summaries only merge under the same key"""
+    settings = get_settings()
+    pipeline_settings = settings.pipeline
+    return text_hash('incremental', digest_sheets, settings.llm.model, pipeline_settings.row_limit,
+                     pipeline_settings.anomaly_top_n, pipeline_settings.anomaly_window,
+                     pipeline_settings.anomaly_context_rows, pipeline_settings.prompt_format, pipeline_settings.sig_figs)
+
+
+def build_incremental_prompt(plan: IncrementalPlan, all_dfs: dict) -> str:
+    """
+    Prompt folding the new rows of a 'delta' plan into the stored summary
+
+    Only metrics whose mean moved by MIN_CHANGE_PCT or more are sent, with their mean over the
+    previous period of the same length.
+
+    Returns:
+        str, or None when no metric moved that much (the stored summary still holds)
+    """
+    pipeline_settings = get_settings().pipeline
+    compact_sig = pipeline_settings.sig_figs if pipeline_settings.prompt_format == 'compact' else None
+    with profile_stage('context'):
+        changes = period_comparison(all_dfs, plan.new_rows)
+    if not changes:
+        return None
+    covered_start = min(sheet['start'] for sheet in plan.state['sheets'].values())[:10]
+    since, until = plan.since[:10], plan.until[:10]
+    return build_update_prompt(plan.state['summary'], build_combined_df(changes, sig_figs=compact_sig),
+                               covered_start, since, since, until, MIN_CHANGE_PCT)
+
+
+def run_incremental(plan: IncrementalPlan, update_prompt: str, all_dfs: dict, params_key: str, output_dirs: Path,
+                    latency_budget: float = None, priority: str = 'interactive') -> Path:
+    """
+    Delta analysis: one LLM call updates the stored summary with the new period
+    
+    If the call fails or doesn't return the summary fields, the stored analysis is left as it
+    was, so the next run tries again.
+    
+    Args:
+        plan: A 'delta' plan from plan_incremental
+        update_prompt: build_incremental_prompt() of the plan
+        all_dfs: sheet_name -> cleaned DataFrame (all rows)
+        params_key: incremental_params() of this run
+        output_dirs: Directory for final outputs
+        latency_budget: Seconds allowed for the LLM call (None = no limit)
+        priority: LLM admission class, 'interactive' or 'batch'
+        
+    Returns:
+        Path: Path to the saved summary JSON file
+    """
+    state = plan.state
+    logger.info(f"Incremental: {plan.reason} after {plan.since[:10]}, update prompt {len(update_prompt)} characters "
+                f"vs {state.get('prompt_chars')} for the full analysis")
+    try:
+        with profile_stage('llm'):
+            updated = structured_summary(final_generate_summary(update_prompt, latency_budget=latency_budget,
+                                                                priority=priority))
+        if updated is None:
+            raise ValueError('updated summary is not structured JSON')
+    except Exception as e:
+        logger.error(f'❌ Incremental update failed: {e} (the stored analysis is unchanged)')
+        return save_summary({"error": str(e), "error_type": type(e).__name__}, output_dirs)
+    
+    # fields the model dropped keep their previous value
+    updated = {**state['summary'], **updated}
+    save_state(output_dirs, all_dfs, updated, params_key, merges=state.get('merges', 0) + 1,
+               prompt_chars=state.get('prompt_chars'))
+    return save_summary(updated, output_dirs)
+
+
+def cleaned_csv_path(output_dirs: Path, sheet_name: str) -> Path:
+    return Path(output_dirs) / f"processed_{sheet_name.replace(' ', '_')}.csv"
 
+
+def load_and_clean_sheets(raw_excel_path: Path, processed_dir: Path, output_dirs: Path) -> dict:
+    """
+    Steps 1-3 of the pipeline: load the workbook, save raw sheets, clean them
+    
+    Args:
+        raw_excel_path: Path to raw Excel file
+        processed_dir: Directory for processed CSV files
+        output_dirs: Directory for the cleaned CSV files
+        
+    Returns:
+        dict: sheet_name -> cleaned DataFrame (all rows; build_analysis_prompt samples them)
+    """
     # Step 1: Loading sheets
     logger.info('Step 1: Loading Excel sheets...')
-    sheets = load_excel_to_dfs(raw_excel_path)
+    with profile_stage('load'):
+        sheets = load_excel_to_dfs(raw_excel_path)
     logger.info(f'Loaded {len(sheets)} sheets: {list(sheets.keys())}')
 
     # Step 2: Saving sheets to processed directory
     logger.info('Step 2: Saving sheets to processed directory...')
-    save_processed(sheets=sheets, output_dir=processed_dir)
+    with profile_stage('save_processed'):
+        processed_paths = save_processed(sheets=sheets, output_dir=processed_dir)
     
     # Step 3: Processing and cleaning all sheets
     logger.info('Step 3: Processing and cleaning sheets...')
     all_dfs = {}
-    for sheet_name in sheets:
-        logger.info(f'Processing sheet: {sheet_name}')
-        input_csv = processed_dir / f"{sheet_name.replace(' ','_')}.csv"
-        # ✅ Fixed: Use output_dirs instead of output_dir
-        output_csv = output_dirs / f"processed_{sheet_name.replace(' ', '_')}.csv"
-        
-        # Clean and transform the data
-        process_sheet(csv_path=input_csv, out_path=output_csv)
-        
-        # ✅ Fixed: Limit rows to reduce token usage and prevent timeout
-        df = pd.read_csv(output_csv).head(100)  # Use first 100 rows
-        all_dfs[sheet_name] = df
-        logger.info(f'Loaded {len(df)} rows from {sheet_name}')
+    with profile_stage('clean'):
+        for sheet_name in sheets:
+            logger.info(f'Processing sheet: {sheet_name}')
+            input_csv = processed_paths[sheet_name]
+            # ✅ Fixed: Use output_dirs instead of output_dir
+            output_csv = cleaned_csv_path(output_dirs, sheet_name)
+            
+            # Clean and transform the data
+            process_sheet(csv_path=input_csv, out_path=output_csv)
+            
+            df = pd.read_csv(output_csv)
+            all_dfs[sheet_name] = df
+            logger.info(f'Loaded {len(df)} rows from {sheet_name}')
+    return all_dfs
+
+
+def build_analysis_prompt(all_dfs: dict, digest_sheets: bool = False, latency_budget: float = None,
+                          output_dir: Path = None, priority: str = 'interactive') -> str:
+    """
+    Steps 4-5 of the pipeline: sheet context + cross-sheet metrics -> final prompt
     
+    Cross-sheet ratios are computed on the full sheets. Raw rows are limited to the
+    pipeline.anomaly_top_n most anomalous periods per sheet (with a few rows of
+    context). With anomaly_top_n = 0, the cross-sheet results replace the raw rows and
+    each sheet gets a one-line overview. The first pipeline.row_limit rows are sent only
+    when there are no cross-sheet results.
+    
+    Args:
+        all_dfs: sheet_name -> cleaned DataFrame
+        digest_sheets: Digest each sheet with the small model instead of sending raw rows
+        latency_budget: Seconds allowed per digest call (None = no limit)
+        output_dir: Where to keep sheet_digests.json for the retrieval index (optional)
+        priority: LLM admission class of the digest calls
+        
+    Returns:
+        str: Final prompt for the synthesis call
+    """
     # Step 4: Combine all sheets into single context
     logger.info('Step 4: Combining all sheets into single context...')
-    combined_context = build_combined_df(all_dfs)
-    logger.info(f'Combined context size: {len(combined_context)} characters')
+    pipeline_settings = get_settings().pipeline
+    # ✅ Fixed: Limit rows to reduce token usage and prevent timeout
+    sampled = {name: df.head(pipeline_settings.row_limit) for name, df in all_dfs.items()}
+    compact_sig = pipeline_settings.sig_figs if pipeline_settings.prompt_format == 'compact' else None
+    with profile_stage('cross_sheet'):
+        cross_sheet = summarize_cross_sheet(all_dfs)
+    with profile_stage('context'):
+        if digest_sheets:
+            digest_path = Path(output_dir) / 'sheet_digests.json' if output_dir else None
+            combined_context = build_sheet_digests(sampled, latency_budget=latency_budget, output_path=digest_path,
+                                                   priority=priority)
+        elif pipeline_settings.anomaly_top_n > 0:
+            combined_context = summarize_anomalies(all_dfs, top_n=pipeline_settings.anomaly_top_n,
+                                                   window=pipeline_settings.anomaly_window,
+                                                   context_rows=pipeline_settings.anomaly_context_rows,
+                                                   sig_figs=compact_sig)
+        elif cross_sheet:
+            combined_context = sheet_overview(all_dfs)
+        else:
+            combined_context = build_combined_df(sampled, sig_figs=compact_sig)
+    logger.info(f'Combined context size: {len(combined_context)} characters, cross-sheet metrics: {len(cross_sheet)} characters')
     
     # Step 5: Build final prompt
     logger.info('Step 5: Building final prompt for LLM...')
-    final_prompt = build_summary_prompt(combined_context)
+    final_prompt = build_summary_prompt(combined_context, cross_sheet=cross_sheet)
     logger.info(f'Final prompt size: {len(final_prompt)} characters')
+    return final_prompt
+
+
+def sheet_overview(dataframes_dict: dict) -> str:
+    """One line per sheet: rows, date span and columns, for prompts whose numbers come from elsewhere"""
+    from src.preprocessing.cross_sheet import date_span
+    return "\n".join(f"Sheet: {sheet_name} ({len(df)} rows{date_span(df)}), columns: {list(df.columns)}"
+                     for sheet_name, df in dataframes_dict.items())
+
+
+def save_summary(summary, output_dirs: Path) -> Path:
+    """
+    Step 7 of the pipeline: write the LLM summary (str or dict) to llm_output.json
     
-    # Step 6: Generate summary from LLM
-    logger.info('Step 6: Generating comprehensive summary from LLM...')
-    try:
-        summary = final_generate_summary(final_prompt)
-        logger.info('✅ Summary generated successfully')
-    except Exception as e:
-        logger.error(f'❌ LLM failed: {e}')
-        summary = {"error": str(e), "error_type": type(e).__name__}
-    
-    # Step 7: Save summary to JSON file
+    Args:
+        summary: Raw LLM response text or an already built dict
+        output_dirs: Directory for final outputs
+        
+    Returns:
+        Path: Path to the saved summary JSON file
+    """
     logger.info('Step 7: Saving summary to JSON file...')
     summaries_path = output_dirs / "llm_output.json"
     summaries_path.parent.mkdir(parents=True, exist_ok=True)
@@ -110,19 +378,25 @@ def final_pipeline(raw_excel_path: Path, processed_path: Path, output_dir: Path)
     return summaries_path
 
 
-def build_combined_df(dataframes_dict: dict) -> str:
+def build_combined_df(dataframes_dict: dict, sig_figs: int = None) -> str:
     """
     Convert all DataFrames into a single combined string with proper formatting
     
     Args:
         dataframes_dict: Dictionary with sheet_name as key and DataFrame as value
+        sig_figs: Serialize compactly (significant figures, k/M units, short dates)
+            instead of full-precision CSV
         
     Returns:
         str: Combined context string with all financial data
     """
-    all_context = []
     logger.info('Building combined context from all sheets...')
-    
+    if sig_figs:
+        combined_text = serialize_sheets(dataframes_dict, sig=sig_figs)
+        logger.info(f'Combined context created: {len(combined_text)} characters, ~{count_tokens(combined_text)} tokens')
+        return combined_text
+
+    all_context = []
     for sheet_name, df in dataframes_dict.items():
         all_context.append("=" * 60)
         all_context.append(f"Sheet: {sheet_name}")
@@ -140,49 +414,157 @@ def build_combined_df(dataframes_dict: dict) -> str:
     return combined_text
 
 
-def final_generate_summary(prompt: str, model: str = 'llama3.1:8b'):
+def build_sheet_digests(dataframes_dict: dict, latency_budget: float = None, output_path: Path = None,
+                        priority: str = 'interactive') -> str:
+    """
+    Summarize every sheet separately (routed to the small model) and combine the digests
+    
+    Args:
+        dataframes_dict: Dictionary with sheet_name as key and DataFrame as value
+        latency_budget: Seconds allowed per digest call (None = no limit)
+        output_path: Also save {sheet_name: digest} as JSON here (optional)
+        priority: LLM admission class, 'interactive' or 'batch'
+        
+    Returns:
+        str: Combined context string with one digest per sheet
+    """
+    all_context = []
+    digests = {}
+    pipeline_settings = get_settings().pipeline
+    for sheet_name, df in dataframes_dict.items():
+        logger.info(f'Digesting sheet: {sheet_name}')
+        if pipeline_settings.prompt_format == 'compact':
+            table = serialize_frame(df, sig=pipeline_settings.sig_figs)
+        else:
+            table = df.to_csv(index=False)
+        digest_prompt = build_digest_prompt(sheet_name, table)
+        digest = call_llm(prompt=digest_prompt, task='digest', latency_budget=latency_budget, priority=priority)
+        digests[sheet_name] = digest.strip()
+        all_context.append("=" * 60)
+        all_context.append(f"Sheet: {sheet_name} ({len(df)} rows, columns: {list(df.columns)})")
+        all_context.append("=" * 60)
+        all_context.append(digest.strip())
+        all_context.append("")
+    combined_text = '\n'.join(all_context)
+    logger.info(f'Sheet digests created: {len(combined_text)} characters')
+    if output_path is not None:
+        with open(output_path, 'w', encoding='utf-8') as file:
+            json.dump(digests, file, indent=4, ensure_ascii=False)
+    return combined_text
+
+
+def final_generate_summary(prompt: str, model: str = None, latency_budget: float = None,
+                           priority: str = 'interactive'):
     """
     Generate comprehensive financial summary using LLM
     
     Args:
         prompt: The formatted prompt with all financial data
-        model: LLM model to use (default: llama3.1:8b)
+        model: LLM model to use (default: llm.model setting, llama3.1:8b)
+        latency_budget: Seconds allowed for the call; the router may fall back
+            to a smaller model or a shorter context to meet it
+        priority: Admission class, 'interactive' or 'batch'
         
     Returns:
         str: LLM response text
     """
+    model = model or get_settings().llm.model
     logger.info(f'Calling LLM model: {model}')
     logger.info(f'Prompt length: {len(prompt)} characters')
     
     # Call LLM with the prompt
-    llm_response = call_llm(prompt=prompt, model=model)
+    llm_response = call_llm(prompt=prompt, model=model, task='synthesis', latency_budget=latency_budget,
+                            priority=priority)
     
-    logger.info(f'Response generated successfully: {len(llm_response)} characters')
-    logger.debug(f'Response preview: {llm_response[:200]}...')
+    logger.info('Response generated successfully: %d characters', len(llm_response))
+    logger.debug('Response preview: %.200s...', llm_response)
     
     return llm_response
 
 
+def analysis_key(workbook_path: Path, digest_sheets: bool = False, latency_budget: float = None,
+                 model: str = None) -> str:
+    """Workbook content hash + every parameter that changes the analysis"""
+    settings = get_settings()
+    pipeline_settings = settings.pipeline
+    return text_hash('analysis', file_hash(workbook_path), digest_sheets, latency_budget,
+                     model or settings.llm.model, pipeline_settings.row_limit, pipeline_settings.anomaly_top_n,
+                     pipeline_settings.anomaly_window, pipeline_settings.anomaly_context_rows,
+                     pipeline_settings.prompt_format, pipeline_settings.sig_figs)
+
+
+def _run_analysis(workbook_path: Path, digest_sheets: bool, latency_budget: float, model: str) -> dict:
+    import tempfile
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        all_dfs = load_and_clean_sheets(workbook_path, temp_dir / 'processed', temp_dir / 'output')
+        prompt = build_analysis_prompt(all_dfs, digest_sheets=digest_sheets, latency_budget=latency_budget)
+    response = final_generate_summary(prompt, model=model, latency_budget=latency_budget)
+    try:
+        analysis = json.loads(response)
+    except json.JSONDecodeError:
+        analysis = {"raw_response": response}
+    return {"analysis": analysis, "sheets": list(all_dfs)}
+
+
+def analyze_workbook(workbook_path: Path, digest_sheets: bool = False, latency_budget: float = None,
+                     model: str = None) -> dict:
+    """
+    Steps 1-6 for one workbook, with concurrent identical requests coalesced
+    
+    Requests for the same workbook bytes and parameters that arrive while an analysis
+    is running wait for it instead of starting their own parse + LLM run.
+    
+    Args:
+        workbook_path: Path to the Excel file
+        digest_sheets: Digest each sheet with the small model first
+        latency_budget: Seconds allowed per LLM call (None = no limit)
+        model: LLM model (default: llm.model setting)
+        
+    Returns:
+        dict: analysis (parsed LLM JSON or raw_response), sheets, and shared
+            (True if this request joined another one's run)
+    """
+    key = analysis_key(workbook_path, digest_sheets, latency_budget, model)
+    result, shared = _analysis_flight.do(key, _run_analysis, Path(workbook_path), digest_sheets, latency_budget, model)
+    return {**result, "shared": shared}
+
+
 if __name__ == "__main__":
     import argparse
     
+    settings = get_settings()
     parser = argparse.ArgumentParser(description='Final comprehensive financial analysis pipeline')
-    parser.add_argument('--raw', type=str, default=str(DEFAULT_RAW), 
+    parser.add_argument('--raw', type=str, default=settings.paths.raw_path, 
                        help='Path to raw Excel file')
-    parser.add_argument('--processed', type=str, default='data/processed',
+    parser.add_argument('--processed', type=str, default=settings.paths.processed_dir,
                        help='Directory for processed CSV files')
-    parser.add_argument('--output', type=str, default='data/outputs',
+    parser.add_argument('--output', type=str, default=settings.paths.outputs_dir,
                        help='Directory for final outputs')
+    parser.add_argument('--digest-sheets', action='store_true',
+                       help='Digest each sheet with the small model before the final synthesis')
+    parser.add_argument('--latency-budget', type=float, default=None,
+                       help='Seconds allowed per LLM call (router degrades model/context to fit)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Reuse stage checkpoints from a previous run and start at the first incomplete stage')
+    parser.add_argument('--incremental', action='store_true',
+                       help='If the workbook only gained rows since the last analysis, summarize just those and merge')
+    add_profile_arguments(parser)
     
     args = parser.parse_args()
     
     try:
         # Run the pipeline
-        result_path = final_pipeline(
-            raw_excel_path=Path(args.raw),
-            processed_path=Path(args.processed),
-            output_dir=Path(args.output)
-        )
+        with maybe_profile(args):
+            result_path = final_pipeline(
+                raw_excel_path=Path(args.raw),
+                processed_path=Path(args.processed),
+                output_dir=Path(args.output),
+                digest_sheets=args.digest_sheets,
+                latency_budget=args.latency_budget,
+                resume=args.resume,
+                incremental=args.incremental
+            )
         
         # Print success message
         print("\n" + "=" * 60)
@@ -1,7 +1,6 @@
 from src.ingestion.load_data import load_dataset
-from src.llm.prompt_template import prompt
+from src.llm import prompt_template
 # from src.llm.final_app import generate_insights
-from langchain_core.output_parsers import StrOutputParser
 
 
 def pipeline():
@@ -39,7 +38,7 @@ def pipeline():
         
         # Format the prompt with data
         # Using format_prompt() which returns PromptValue (compatible with LangChain chains)
-        final_prompt = prompt.format_prompt(data=data_json)
+        final_prompt = prompt_template.prompt.format_prompt(data=data_json)
         
         # When you uncomment the LLM code, the chain will work like this:
         # llm = generate_insights()
@@ -75,7 +74,7 @@ def pipeline_with_string_output():
         data_json = df.to_json(orient='records', date_format='iso')
         
         # Using format() which returns a string
-        final_prompt_str = prompt.format(data=data_json)
+        final_prompt_str = prompt_template.build_prompt(data_json)
         
         return final_prompt_str
         
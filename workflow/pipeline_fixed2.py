@@ -1,7 +1,6 @@
 from src.ingestion.load_data import load_dataset
-from src.llm.prompt_template import prompt
+from src.llm import prompt_template
 # from src.llm.final_app import generate_insights
-from langchain_core.output_parsers import StrOutputParser
 from src.utils.logger import get_logger
 
 logging = get_logger('pipeline_fixed')
@@ -12,7 +11,7 @@ def pipeline_function():
         if dataset.empty or len(dataset) == 0:
             raise ValueError('No data found')
         dataset_json = dataset.to_json(orient='records', date_format='iso')
-        final_prompt = prompt.format_prompt(data=dataset_json) # this is compatible with LLM chain and the input is expected in the same manner
+        final_prompt = prompt_template.prompt.format_prompt(data=dataset_json) # this is compatible with LLM chain and the input is expected in the same manner
         return final_prompt
     except FileNotFoundError as e:
         print(f'data file not found. Error {e}')
@@ -30,7 +29,7 @@ def pipeline_function_str():
             raise ValueError('No data found')
         df = dataset[0]
         df = df.to_json(orient='records', date_format='iso')
-        final_prompt = prompt.format(data=df)
+        final_prompt = prompt_template.build_prompt(df)
         return final_prompt
     except FileNotFoundError as e:
         print(f'File not found {e}')
@@ -0,0 +1,120 @@
+"""queue worker: claims analysis jobs, keeps their lease alive while running them, records the result"""
+import json
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+from src.utils.logger import get_logger
+from src.utils.settings import get_settings, resolve_path
+from workflow.job_queue import get_job_queue
+
+logger = get_logger('worker')
+
+
+def job_dir(job_id: str) -> Path:
+    """Per-job directory under jobs.dir (uploaded workbook, processed sheets, outputs, checkpoints)"""
+    return resolve_path(get_settings().jobs.dir) / job_id
+
+
+def handle_analyze(job) -> dict:
+    """
+    Run final_pipeline for an 'analyze' job
+
+    resume=True: a retry after a crash or an LLM failure reuses the stage checkpoints of the
+    earlier attempt, so it usually costs only the LLM call. Its LLM calls queue as batch work,
+    behind the apps and /analyze, instead of taking (and being rejected from) interactive slots.
+    """
+    from workflow.pipeline2_fixed import final_pipeline
+
+    base = job_dir(job.id)
+    output_path = final_pipeline(raw_excel_path=Path(job.payload['workbook']), processed_path=base / 'processed',
+                                 output_dir=base / 'output', digest_sheets=job.payload.get('digest_sheets', False),
+                                 latency_budget=job.payload.get('latency_budget'), resume=True, priority='batch')
+    with open(output_path, 'r', encoding='utf-8') as file:
+        summary = json.load(file)
+    if 'error_type' in summary:
+        # final_pipeline saves LLM errors instead of raising; here they should use up an attempt
+        raise RuntimeError(f"LLM failed: {summary['error_type']}: {summary.get('error')}")
+    return {"output": str(output_path), "analysis": summary}
+
+
+# job kind -> handler(job) -> result dict
+HANDLERS = {'analyze': handle_analyze}
+
+
+class Worker:
+    def __init__(self, queue=None, name: str = None):
+        self.queue = queue or get_job_queue()
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Finish the current job, then exit"""
+        self._stop.set()
+
+    def _heartbeat(self, job, done: threading.Event, lost: threading.Event):
+        interval = get_settings().jobs.heartbeat_seconds
+        while not done.wait(interval):
+            if not self.queue.heartbeat(job.id, self.name):
+                logger.warning(f'{self.name}: lost the lease on job {job.id}')
+                lost.set()
+                return
+
+    def run_one(self) -> bool:
+        """Claim and run one job; False if nothing was runnable"""
+        job = self.queue.claim(self.name)
+        if job is None:
+            return False
+        logger.info(f'{self.name}: running {job.kind} job {job.id} (attempt {job.attempts}/{job.max_attempts})')
+        done, lost = threading.Event(), threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(job, done, lost), name=f'heartbeat-{job.id[:8]}', daemon=True)
+        beat.start()
+        start = time.perf_counter()
+        try:
+            handler = HANDLERS.get(job.kind)
+            if handler is None:
+                raise ValueError(f'no handler for job kind {job.kind!r}')
+            result = handler(job)
+            result['seconds'] = round(time.perf_counter() - start, 3)
+            recorded = self.queue.complete(job.id, self.name, result)
+            logger.info(f'{self.name}: job {job.id} succeeded in {result["seconds"]}s')
+        except Exception as e:
+            logger.exception(f'{self.name}: job {job.id} failed')
+            recorded = self.queue.fail(job.id, self.name, f'{type(e).__name__}: {e}')
+        finally:
+            done.set()
+            beat.join()
+        if not recorded or lost.is_set():
+            # the lease expired and another worker took the job over; its outcome counts, not ours
+            logger.warning(f'{self.name}: result of job {job.id} discarded, the lease was lost')
+        return True
+
+    def run(self, once: bool = False):
+        """Claim jobs until stopped (or until the queue is empty, with once=True)"""
+        logger.info(f'worker {self.name} started')
+        while not self._stop.is_set():
+            if self.run_one():
+                continue
+            if once:
+                break
+            self._stop.wait(get_settings().jobs.poll_interval)
+        logger.info(f'worker {self.name} stopped')
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='run queued analysis jobs; start as many as you like, on any node sharing the queue')
+    parser.add_argument('--once', action='store_true', help='exit when no job is runnable instead of polling')
+    parser.add_argument('--name', type=str, default=None, help='worker name shown in job records (default host:pid)')
+    args = parser.parse_args()
+
+    worker = Worker(name=args.name)
+    # SIGTERM/Ctrl+C: finish the running job, then exit
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    try:
+        worker.run(once=args.once)
+    except KeyboardInterrupt:
+        worker.stop()